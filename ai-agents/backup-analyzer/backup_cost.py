@@ -0,0 +1,353 @@
+"""
+Backup Cost - Coste de backup de los PVCs según su tamaño real y su churn
+
+El tamaño de cada PVC sale de ``status.capacity.storage`` (o de
+``spec.resources.requests.storage`` si aún no está enlazado), con las
+cantidades de Kubernetes parseadas de verdad (``500M``, ``10Gi``, ``1Ti``,
+``1.5e9``...). Los snapshots de disco de Azure son incrementales: el
+primero guarda el disco completo y cada uno de los siguientes solo los
+bloques que cambiaron desde el anterior. Ese churn diario se estima por
+PVC a partir de su histórico de tamaños más una tasa base de reescritura.
+El histórico vive en memoria (sirve dentro de un proceso ``--watch``); solo
+se guarda en disco si se indica un fichero (``--history``), y solo cuando
+cambia el tamaño de algún PVC.
+
+Con la retención y la frecuencia del análisis, el volumen guardado en cada
+tier (snapshot operacional, vault, archive) se calcula para todos los PVCs
+en una sola pasada vectorizada (numpy si está instalado y el lote lo
+compensa) y se agrega por namespace. Con un inventario vivo,
+``PvcCostIndex`` guarda el coste de cada PVC y solo recalcula el del que
+cambió; el total es la suma de esas entradas.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from cluster_snapshot import PvcRecord
+
+# optional_numpy y NUMPY_MIN_BATCH viven en ai-agents/pricing (se importan al estimar)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "pricing"))
+
+GIB = 1024 ** 3
+DAY = 86400.0
+# Tamaño supuesto para un PVC sin capacidad ni request legibles (estimación histórica)
+DEFAULT_PVC_GIB = 10.0
+# Fracción del disco que se reescribe al día aunque el tamaño no cambie
+BASELINE_DAILY_CHURN = 0.05
+MAX_HISTORY_SAMPLES = 60
+# Muestras más próximas que esto sustituyen a la anterior en vez de añadirse
+MIN_SAMPLE_INTERVAL = 3600.0
+
+SNAPSHOTS_PER_DAY = {"weekly": 1 / 7, "daily": 1.0, "twice-daily": 2.0}
+
+_SUFFIXES = {
+    "Ki": 2 ** 10, "Mi": 2 ** 20, "Gi": 2 ** 30, "Ti": 2 ** 40, "Pi": 2 ** 50, "Ei": 2 ** 60,
+    "n": 1e-9, "u": 1e-6, "m": 1e-3, "": 1.0,
+    "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "P": 1e15, "E": 1e18,
+}
+_QUANTITY = re.compile(r"^([+-]?(?:\d+\.?\d*|\.\d+))(?:[eE]([+-]?\d+)|(Ki|Mi|Gi|Ti|Pi|Ei|[numkMGTPE]))?$")
+
+
+def parse_quantity(quantity: str) -> float:
+    """Valor de una cantidad de Kubernetes (``10Gi`` -> 10737418240.0)
+
+    Admite sufijos binarios (Ki..Ei), decimales (n, u, m, k..E) y notación
+    exponencial (``1.5e9``). Lanza ValueError si no es una cantidad válida.
+    """
+    match = _QUANTITY.match(quantity.strip())
+    if match is None:
+        raise ValueError(f"cantidad de Kubernetes inválida: {quantity!r}")
+    number, exponent, suffix = match.groups()
+    if exponent is not None:
+        return float(number) * 10 ** int(exponent)
+    return float(number) * _SUFFIXES[suffix or ""]
+
+
+@lru_cache(maxsize=4096)
+def _quantity_bytes(quantity: str) -> Optional[float]:
+    # En una flota se repiten pocos tamaños distintos (10Gi, 128Gi...)
+    try:
+        return parse_quantity(quantity)
+    except ValueError:
+        return None
+
+
+def pvc_bytes(pvc: PvcRecord) -> Optional[float]:
+    """Capacidad real del PVC (o lo solicitado si aún no tiene), None si no se conoce"""
+    for quantity in (pvc.capacity, pvc.requested):
+        if quantity:
+            size = _quantity_bytes(quantity)
+            if size is not None:
+                return size
+    return None
+
+
+class RetentionTier(NamedTuple):
+    name: str
+    max_age_days: float         # los puntos de restauración más antiguos pasan al siguiente tier
+    price_per_gb_month: float
+
+
+# Precios aproximados de lista (USD por GB-mes); ajustar al price sheet del contrato
+DEFAULT_TIERS: Tuple[RetentionTier, ...] = (
+    RetentionTier("snapshot", 7, 0.05),
+    RetentionTier("vault-standard", 30, 0.025),
+    RetentionTier("vault-archive", float("inf"), 0.0045),
+)
+
+
+class PvcHistory:
+    """Histórico de tamaños por PVC (``namespace/nombre`` -> [[epoch, bytes], ...])
+
+    El agente añade la capacidad observada en cada análisis cuando cambia;
+    si un exportador de métricas escribe el uso real (p. ej.
+    ``kubelet_volume_stats_used_bytes``) en el mismo formato, el churn
+    sale del uso y no solo de las ampliaciones del disco. Sin ``path`` el
+    histórico solo vive en memoria.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.samples: Dict[str, List[List[float]]] = {}
+        # Última vez que se vio cada PVC (sin tamaño nuevo no se añade muestra ni se escribe)
+        self._seen: Dict[str, float] = {}
+        self._churn: Dict[str, Tuple[float, float]] = {}   # daily_churn memorizado: (visto, valor)
+        self._dirty = False
+        if self.path is not None and self.path.exists():
+            try:
+                self.samples = json.loads(self.path.read_text())
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Histórico de PVCs ilegible ({self.path}): {e}")
+
+    def observe(self, key: str, size: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._seen[key] = now
+        samples = self.samples.setdefault(key, [])
+        if samples and samples[-1][1] == size:
+            return  # mismo tamaño: el periodo observado se alarga sin tocar el fichero
+        if samples and now - samples[-1][0] < MIN_SAMPLE_INTERVAL:
+            samples.pop()
+        samples.append([now, size])
+        del samples[:-MAX_HISTORY_SAMPLES]
+        self._dirty = True
+
+    def prune(self, keys: Iterable[str]):
+        """Olvida los PVCs que ya no existen"""
+        keep = set(keys)
+        for key in [key for key in self.samples if key not in keep]:
+            self.forget(key)
+
+    def forget(self, key: str):
+        """Olvida un PVC eliminado"""
+        self._seen.pop(key, None)
+        self._churn.pop(key, None)
+        if self.samples.pop(key, None) is not None:
+            self._dirty = True
+
+    def daily_churn(self, key: str, baseline: float = BASELINE_DAILY_CHURN) -> float:
+        """Fracción del disco que cambia al día: ``baseline`` + variación media del tamaño"""
+        samples = self.samples.get(key) or []
+        seen = self._seen.get(key, samples[-1][0] if samples else 0.0)
+        memo = self._churn.get(key)
+        if memo is None or memo[0] != seen:
+            memo = self._churn[key] = (seen, self._growth(samples, seen))
+        return min(1.0, baseline + memo[1])
+
+    @staticmethod
+    def _growth(samples: List[List[float]], until: float) -> float:
+        """Variación media diaria hasta ``until`` (la última vez que se vio el PVC)"""
+        if len(samples) < 2 or not samples[-1][1]:
+            return 0.0
+        moved = sum(abs(b[1] - a[1]) for a, b in zip(samples, samples[1:]))
+        days = (max(until, samples[-1][0]) - samples[0][0]) / DAY
+        return moved / days / samples[-1][1] if days > 0 else 0.0
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_suffix(".tmp")
+        partial.write_text(json.dumps(self.samples, separators=(",", ":")))
+        os.replace(partial, self.path)
+        self._dirty = False
+
+
+@dataclass
+class CostBreakdown:
+    total: float                                                  # USD/mes de todos los PVCs
+    by_namespace: Dict[str, float] = field(default_factory=dict)  # de mayor a menor
+    by_tier: Dict[str, float] = field(default_factory=dict)
+    stored_gb: float = 0.0                                        # GB guardados entre todos los tiers
+    unsized: int = 0                                              # PVCs con DEFAULT_PVC_GIB
+
+
+class PvcCost(NamedTuple):
+    namespace: str
+    tier_gb: Tuple[float, ...]   # GB guardados en cada tier (el snapshot completo en el primero)
+    unsized: bool                # sin capacidad legible: DEFAULT_PVC_GIB
+
+
+def tier_days(retention_days: float, tiers: Sequence[RetentionTier]) -> List[float]:
+    """Días de la ventana de retención que caen en cada tier"""
+    days, start = [], 0.0
+    for tier in tiers:
+        days.append(max(0.0, float(min(retention_days, tier.max_age_days)) - start))
+        start = max(start, tier.max_age_days)
+    return days
+
+
+class BackupCostModel:
+    """Coste mensual de los snapshots incrementales de muchos PVCs a la vez"""
+
+    def __init__(self, tiers: Sequence[RetentionTier] = DEFAULT_TIERS,
+                 history: Optional[PvcHistory] = None):
+        self.tiers = tuple(tiers)
+        self.history = history
+
+    def estimate(self, pvcs: Iterable[PvcRecord], retention_days: float,
+                 frequency: str = "daily") -> CostBreakdown:
+        """Desglose del coste para una retención (días) y frecuencia de snapshots
+
+        Por PVC: el snapshot completo más, en cada tier, los incrementales de
+        sus días de retención (churn por snapshot × tamaño × snapshots).
+        """
+        per_day = SNAPSHOTS_PER_DAY.get(frequency, 1.0)
+        namespaces: Dict[str, int] = {}
+        codes, sizes, churn = [], [], []
+        unsized = 0
+        now = time.time()
+        for pvc in pvcs:
+            size, daily, no_size = self._inputs(pvc, now)
+            unsized += no_size
+            codes.append(namespaces.setdefault(pvc.namespace, len(namespaces)))
+            sizes.append(size)
+            churn.append(daily)
+
+        from pricing_catalog import NUMPY_MIN_BATCH, optional_numpy
+
+        days = tier_days(retention_days, self.tiers)
+        # GB guardados por PVC y tier (el snapshot completo cuenta en el primero)
+        prices = [tier.price_per_gb_month for tier in self.tiers]
+        np = optional_numpy() if len(sizes) >= NUMPY_MIN_BATCH else None
+        if np is not None:
+            size = np.asarray(sizes, dtype=np.float64)
+            per_snapshot = np.minimum(1.0, np.asarray(churn, dtype=np.float64) / per_day)
+            stored = np.outer(size * per_snapshot * per_day, np.asarray(days))   # PVC × tier
+            stored[:, 0] += size
+            cost = stored @ np.asarray(prices)
+            by_ns = np.bincount(np.asarray(codes, dtype=np.int64), weights=cost,
+                                minlength=len(namespaces)).tolist()
+            by_tier = (stored.sum(axis=0) * np.asarray(prices)).tolist()
+            stored_gb = float(stored.sum())
+        else:
+            by_ns = [0.0] * len(namespaces)
+            tier_gb = [0.0] * len(self.tiers)
+            for code, size, daily in zip(codes, sizes, churn):
+                for position, gb in enumerate(_tier_gb(size, daily, per_day, days)):
+                    tier_gb[position] += gb
+                    by_ns[code] += gb * prices[position]
+            by_tier = [gb * price for gb, price in zip(tier_gb, prices)]
+            stored_gb = sum(tier_gb)
+
+        return self._result(zip(namespaces, by_ns), by_tier, stored_gb, unsized)
+
+    def pvc_cost(self, pvc: PvcRecord, retention_days: float, frequency: str = "daily") -> PvcCost:
+        """GB guardados por tier de un solo PVC (lo que suma ``breakdown``)"""
+        size, daily, unsized = self._inputs(pvc, time.time())
+        per_day = SNAPSHOTS_PER_DAY.get(frequency, 1.0)
+        return PvcCost(pvc.namespace,
+                       tuple(_tier_gb(size, daily, per_day, tier_days(retention_days, self.tiers))),
+                       unsized)
+
+    def breakdown(self, costs: Iterable[PvcCost]) -> CostBreakdown:
+        """Desglose de un conjunto de costes por PVC"""
+        prices = [tier.price_per_gb_month for tier in self.tiers]
+        by_ns: Dict[str, float] = {}
+        tier_gb = [0.0] * len(self.tiers)
+        unsized = 0
+        for cost in costs:
+            by_ns[cost.namespace] = by_ns.get(cost.namespace, 0.0) + sum(
+                gb * price for gb, price in zip(cost.tier_gb, prices))
+            for position, gb in enumerate(cost.tier_gb):
+                tier_gb[position] += gb
+            unsized += cost.unsized
+        by_tier = [gb * price for gb, price in zip(tier_gb, prices)]
+        return self._result(by_ns.items(), by_tier, sum(tier_gb), unsized)
+
+    def _inputs(self, pvc: PvcRecord, now: float) -> Tuple[float, float, bool]:
+        """(GiB, churn diario, sin tamaño) de un PVC; anota su tamaño en el histórico"""
+        size = pvc_bytes(pvc)
+        history = self.history
+        if history is not None:
+            key = f"{pvc.namespace}/{pvc.name}"
+            if size is not None:
+                history.observe(key, size, now)
+            churn = history.daily_churn(key)
+        else:
+            churn = BASELINE_DAILY_CHURN
+        if size is None:
+            return DEFAULT_PVC_GIB, churn, True
+        return size / GIB, churn, False
+
+    def _result(self, by_ns: Iterable[Tuple[str, float]], by_tier: Sequence[float],
+                stored_gb: float, unsized: int) -> CostBreakdown:
+        ranked = sorted(by_ns, key=lambda item: item[1], reverse=True)
+        return CostBreakdown(
+            total=round(sum(value for _, value in ranked), 2),
+            by_namespace={name: round(value, 2) for name, value in ranked},
+            by_tier={tier.name: round(value, 2) for tier, value in zip(self.tiers, by_tier)},
+            stored_gb=round(stored_gb, 1),
+            unsized=unsized,
+        )
+
+
+def _tier_gb(size: float, daily_churn: float, per_day: float, days: Sequence[float]) -> List[float]:
+    """GB guardados en cada tier por un PVC de ``size`` GiB"""
+    incremental = size * min(1.0, daily_churn / per_day) * per_day
+    return [incremental * span + (size if position == 0 else 0.0)
+            for position, span in enumerate(days)]
+
+
+class PvcCostIndex:
+    """Coste de backup por PVC (``namespace/nombre``) mantenido cambio a cambio
+
+    Con un inventario vivo cada alta, cambio o baja de un PVC recalcula
+    solo su entrada; el desglose es la suma de las entradas. La retención
+    y la frecuencia dependen del tamaño del cluster: si cambian, se
+    recalculan todas.
+    """
+
+    def __init__(self, model: BackupCostModel):
+        self.model = model
+        self._pvcs: Dict[str, PvcRecord] = {}
+        self._costs: Dict[str, PvcCost] = {}
+        self._policy: Optional[Tuple[float, str]] = None   # (retención, frecuencia) de _costs
+
+    def __len__(self) -> int:
+        return len(self._pvcs)
+
+    def update(self, key: str, pvc: Optional[PvcRecord]):
+        """Aplica un cambio del inventario (None = PVC eliminado)"""
+        if pvc is None:
+            self._pvcs.pop(key, None)
+            self._costs.pop(key, None)
+            if self.model.history is not None:
+                self.model.history.forget(key)
+            return
+        self._pvcs[key] = pvc
+        if self._policy is not None:
+            self._costs[key] = self.model.pvc_cost(pvc, *self._policy)
+
+    def breakdown(self, retention_days: float, frequency: str = "daily") -> CostBreakdown:
+        policy = (retention_days, frequency)
+        if policy != self._policy:
+            self._policy = policy
+            self._costs = {key: self.model.pvc_cost(pvc, *policy) for key, pvc in self._pvcs.items()}
+        return self.model.breakdown(self._costs.values())
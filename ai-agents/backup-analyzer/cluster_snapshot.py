@@ -0,0 +1,271 @@
+"""
+Cluster Snapshot - Lectura concurrente y en streaming de los recursos que analiza el agente
+
+Cada ``kubectl get`` paga el arranque de kubectl, la lectura del kubeconfig
+y el discovery del API. En lugar de encadenar un proceso por tipo de
+recurso, todos los listados se lanzan a la vez: la latencia del snapshot
+es la del listado más lento y no la suma. El snapshot se guarda durante
+``ttl`` segundos y lo reutilizan todas las etapas del análisis.
+
+El JSON de cada listado no se carga entero: los elementos de ``items`` se
+decodifican de uno en uno mientras kubectl escribe y de cada uno solo se
+guardan los campos que usa el análisis, en registros con ``__slots__``.
+La memoria crece con el número de registros, no con el tamaño del JSON.
+Con ``chunk_size`` kubectl pide las listas al API por páginas
+(``--chunk-size``).
+"""
+
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# json_stream vive en orchestration/ (compartido con el runner de IaC)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "orchestration"))
+
+from json_stream import iter_array_items
+
+
+class Record:
+    """Base de los registros: solo slots, comparables y legibles"""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class PvcRecord(Record):
+    # requested: spec.resources.requests.storage; capacity: status.capacity.storage
+    __slots__ = ("namespace", "name", "storage_class", "requested", "volume_name", "phase",
+                 "capacity")
+
+
+class WorkloadRecord(Record):
+    # claims: PVCs montados por la plantilla de pods (o por el pod)
+    # owner: controlador que lo gestiona ("ReplicaSet/web-5d9f"), "" si ninguno
+    # claim_templates: volumeClaimTemplates de un StatefulSet
+    __slots__ = ("kind", "namespace", "name", "claims", "owner", "claim_templates")
+
+
+class NamespaceRecord(Record):
+    __slots__ = ("name", "phase")
+
+
+def _metadata(item: Dict) -> Dict:
+    return item.get("metadata") or {}
+
+
+def _intern(value) -> str:
+    return sys.intern(value) if isinstance(value, str) else ""
+
+
+def _pvc(item: Dict) -> PvcRecord:
+    metadata = _metadata(item)
+    spec = item.get("spec") or {}
+    status = item.get("status") or {}
+    requests = (spec.get("resources") or {}).get("requests") or {}
+    return PvcRecord(_intern(metadata.get("namespace")), metadata.get("name", ""),
+                     _intern(spec.get("storageClassName")), _intern(requests.get("storage")),
+                     spec.get("volumeName", ""), _intern(status.get("phase")),
+                     _intern((status.get("capacity") or {}).get("storage")))
+
+
+def _pod_claims(pod_spec: Dict, pod_name: str = "") -> Tuple[str, ...]:
+    """PVCs que monta un pod; los volúmenes ``ephemeral`` solo con ``pod_name``
+
+    Un volumen efímero crea el PVC ``<pod>-<volumen>``, así que solo se
+    conoce su nombre en pods reales y no en plantillas.
+    """
+    claims = []
+    for volume in pod_spec.get("volumes") or []:
+        if "persistentVolumeClaim" in volume:
+            claims.append(volume["persistentVolumeClaim"].get("claimName", ""))
+        elif "ephemeral" in volume and pod_name:
+            claims.append(f"{pod_name}-{volume.get('name', '')}")
+    return tuple(claims)
+
+
+def _controller(metadata: Dict) -> str:
+    for ref in metadata.get("ownerReferences") or []:
+        if ref.get("controller"):
+            return sys.intern(f"{ref.get('kind', '')}/{ref.get('name', '')}")
+    return ""
+
+
+def _workload(kind: str, pod_spec_path: Tuple[str, ...]) -> Callable[[Dict], WorkloadRecord]:
+    """Extractor de un controlador cuya plantilla de pods está en ``pod_spec_path``"""
+    kind = sys.intern(kind)
+
+    def extract(item: Dict) -> WorkloadRecord:
+        metadata = _metadata(item)
+        name = metadata.get("name", "")
+        node = item
+        for step in pod_spec_path:
+            node = node.get(step) or {}
+        templates = ()
+        if kind == "StatefulSet":
+            templates = tuple(_metadata(template).get("name", "") for template in
+                              (item.get("spec") or {}).get("volumeClaimTemplates") or [])
+        return WorkloadRecord(kind, _intern(metadata.get("namespace")), name,
+                              _pod_claims(node, name if kind == "Pod" else ""),
+                              _controller(metadata), templates)
+
+    return extract
+
+
+_TEMPLATE = ("spec", "template", "spec")
+
+
+def _namespace(item: Dict) -> NamespaceRecord:
+    return NamespaceRecord(_metadata(item).get("name", ""),
+                           _intern((item.get("status") or {}).get("phase")))
+
+
+class KindSpec(NamedTuple):
+    resource: str                         # nombre para ``kubectl get``
+    namespaced: bool
+    extract: Callable[[Dict], Record]    # objeto del API -> registro compacto
+    api_path: str                         # colección en el API (para ``kubectl get --raw``)
+
+
+# Tipo del análisis -> cómo listarlo y qué guardar de cada objeto
+KINDS: Dict[str, KindSpec] = {
+    "pvcs": KindSpec("persistentvolumeclaims", True, _pvc, "/api/v1/persistentvolumeclaims"),
+    "deployments": KindSpec("deployments", True, _workload("Deployment", _TEMPLATE),
+                            "/apis/apps/v1/deployments"),
+    "statefulsets": KindSpec("statefulsets", True, _workload("StatefulSet", _TEMPLATE),
+                             "/apis/apps/v1/statefulsets"),
+    "daemonsets": KindSpec("daemonsets", True, _workload("DaemonSet", _TEMPLATE),
+                           "/apis/apps/v1/daemonsets"),
+    "replicasets": KindSpec("replicasets", True, _workload("ReplicaSet", _TEMPLATE),
+                            "/apis/apps/v1/replicasets"),
+    "jobs": KindSpec("jobs", True, _workload("Job", _TEMPLATE), "/apis/batch/v1/jobs"),
+    "cronjobs": KindSpec("cronjobs", True,
+                         _workload("CronJob", ("spec", "jobTemplate") + _TEMPLATE),
+                         "/apis/batch/v1/cronjobs"),
+    "pods": KindSpec("pods", True, _workload("Pod", ("spec",)), "/api/v1/pods"),
+    "namespaces": KindSpec("namespaces", False, _namespace, "/api/v1/namespaces"),
+}
+
+
+def object_key(item: Dict) -> str:
+    """``namespace/nombre`` (o solo el nombre si el objeto no es namespaced)"""
+    metadata = _metadata(item)
+    namespace = metadata.get("namespace")
+    return f"{namespace}/{metadata.get('name', '')}" if namespace else metadata.get("name", "")
+
+
+def parse_list(stream, kind: str) -> List[Record]:
+    """Registros de un ``kubectl get -o json`` leído de forma incremental"""
+    extract = KINDS[kind].extract
+    return [extract(item) for item in iter_array_items(stream, "items") if isinstance(item, dict)]
+
+
+@dataclass
+class ClusterSnapshot:
+    resources: Dict[str, List[Record]]                      # tipo -> registros
+    errors: Dict[str, str] = field(default_factory=dict)     # tipo -> error (lista vacía en resources)
+    timings: Dict[str, float] = field(default_factory=dict)  # tipo -> segundos del listado
+    elapsed: float = 0.0                                     # segundos del snapshot completo
+    taken_at: float = 0.0                                    # time.monotonic() al terminar
+
+    def items(self, kind: str) -> List[Record]:
+        return self.resources.get(kind, [])
+
+    @property
+    def slowest(self) -> Optional[Tuple[str, float]]:
+        if not self.timings:
+            return None
+        kind = max(self.timings, key=self.timings.get)
+        return kind, self.timings[kind]
+
+
+class SnapshotCollector:
+    """Lista varios tipos de recurso en paralelo y memoriza el resultado"""
+
+    def __init__(self, kinds: Optional[Sequence[str]] = None, kubectl: str = "kubectl",
+                 context: Optional[str] = None, ttl: float = 60.0,
+                 request_timeout: Optional[str] = None, chunk_size: Optional[int] = None):
+        self.kinds = list(kinds or KINDS)
+        self.kubectl = kubectl
+        self.context = context
+        self.ttl = ttl
+        self.request_timeout = request_timeout
+        self.chunk_size = chunk_size
+        self._snapshot: Optional[ClusterSnapshot] = None
+
+    def command(self, kind: str) -> List[str]:
+        spec = KINDS[kind]
+        cmd = [self.kubectl, "get", spec.resource, "-o", "json"]
+        if spec.namespaced:
+            cmd.insert(3, "--all-namespaces")
+        if self.chunk_size is not None:
+            cmd.append(f"--chunk-size={self.chunk_size}")
+        if self.context:
+            cmd += ["--context", self.context]
+        if self.request_timeout:
+            cmd += ["--request-timeout", self.request_timeout]
+        return cmd
+
+    def snapshot(self, refresh: bool = False) -> ClusterSnapshot:
+        """Snapshot vigente (uno nuevo si no hay, ha caducado o ``refresh``)"""
+        cached = self._snapshot
+        if cached is not None and not refresh and time.monotonic() - cached.taken_at < self.ttl:
+            return cached
+        self._snapshot = self._collect()
+        return self._snapshot
+
+    def _collect(self) -> ClusterSnapshot:
+        from concurrent.futures import ThreadPoolExecutor
+
+        started = time.perf_counter()
+        snapshot = ClusterSnapshot(resources={})
+        # Un hilo por listado: cada uno lee y decodifica el output de su kubectl
+        with ThreadPoolExecutor(max_workers=len(self.kinds) or 1,
+                                thread_name_prefix="kubectl-get") as pool:
+            for kind, (records, error, seconds) in zip(self.kinds, pool.map(self._list, self.kinds)):
+                snapshot.resources[kind] = records
+                snapshot.timings[kind] = seconds
+                if error:
+                    snapshot.errors[kind] = error
+        snapshot.elapsed = time.perf_counter() - started
+        snapshot.taken_at = time.monotonic()
+        return snapshot
+
+    def _list(self, kind: str) -> Tuple[List[Record], Optional[str], float]:
+        import tempfile
+
+        started = time.perf_counter()
+        with tempfile.TemporaryFile(mode="w+") as stderr:
+            try:
+                process = subprocess.Popen(self.command(kind), text=True,
+                                           stdout=subprocess.PIPE, stderr=stderr)
+            except OSError as e:
+                return [], str(e), time.perf_counter() - started
+            try:
+                records = parse_list(process.stdout, kind)
+                process.stdout.read()  # drenar lo que quede tras el array
+                error = None
+            except ValueError as e:
+                records, error = [], f"JSON inválido: {e}"
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+
+            if returncode != 0:
+                stderr.seek(0)
+                records, error = [], stderr.read().strip() or f"exit {returncode}"
+        return records, error, time.perf_counter() - started
+
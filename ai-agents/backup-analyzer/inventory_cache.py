@@ -0,0 +1,286 @@
+"""
+Inventory Cache - Inventario local del cluster mantenido con list + watch
+
+Para ejecutar el agente de backup como proceso de larga duración: cada
+tipo de recurso se lista una vez (por páginas, con ``kubectl get --raw``)
+y después se sigue con un watch desde el ``resourceVersion`` del listado.
+Los eventos ADDED/MODIFIED/DELETED actualizan el inventario y se entregan
+a los suscriptores solo si cambia el registro compacto, así que el
+análisis se recalcula únicamente para los objetos afectados.
+
+Si el API responde 410 Gone (el resourceVersion ya no está en su ventana)
+se vuelve a listar. Cada ``resync_period`` segundos se hace un relist
+completo que corrige cualquier deriva: los objetos que difieren se
+entregan como cambios y los demás no generan trabajo.
+"""
+
+import json
+import re
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from cluster_snapshot import KINDS, Record, object_key
+from json_stream import iter_array_items
+
+RESYNC_PERIOD = 600.0
+WATCH_TIMEOUT = 300       # segundos que el API mantiene abierto cada watch
+LIST_PAGE_SIZE = 500
+RETRY_DELAY = 5.0
+# La cabecera de una lista (kind, apiVersion, metadata) precede a "items"
+_LIST_HEAD_BYTES = 8192
+
+_RESOURCE_VERSION = re.compile(r'"resourceVersion"\s*:\s*"([^"]*)"')
+_CONTINUE = re.compile(r'"continue"\s*:\s*"([^"]*)"')
+_EXPIRED = ("410", "Expired", "too old resource version")
+
+# (tipo, clave, registro anterior, registro nuevo); None = no existía / eliminado
+ChangeListener = Callable[[str, str, Optional[Record], Optional[Record]], None]
+
+
+class ResourceVersionExpired(Exception):
+    """El watch no puede continuar desde ese resourceVersion: hay que volver a listar"""
+
+
+class _HeadRecorder:
+    """Envuelve un stream y guarda sus primeros caracteres (metadata de la lista)"""
+
+    def __init__(self, stream, limit: int = _LIST_HEAD_BYTES):
+        self.stream = stream
+        self.limit = limit
+        self.head = ""
+
+    def read(self, size: int = -1) -> str:
+        chunk = self.stream.read(size)
+        if len(self.head) < self.limit:
+            self.head += chunk[:self.limit - len(self.head)]
+        return chunk
+
+
+def _list_metadata(head: str) -> Tuple[str, str]:
+    """(resourceVersion, continue) de la cabecera de una lista del API"""
+    end = head.find('"items"')
+    head = head if end < 0 else head[:end]
+    version = _RESOURCE_VERSION.search(head)
+    token = _CONTINUE.search(head)
+    return (version.group(1) if version else "", token.group(1) if token else "")
+
+
+class Informer:
+    """List + watch de un tipo de recurso sobre el InventoryCache"""
+
+    def __init__(self, kind: str, cache: "InventoryCache"):
+        self.kind = kind
+        self.spec = KINDS[kind]
+        self.cache = cache
+        self.resource_version = ""
+        self.listed_at = 0.0
+        self.synced = threading.Event()
+        self._process: Optional[subprocess.Popen] = None
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                self.relist()
+                while not stop.is_set():
+                    remaining = self.listed_at + self.cache.resync_period - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.watch(min(self.cache.watch_timeout, max(1, int(remaining))))
+            except ResourceVersionExpired:
+                continue
+            except (OSError, RuntimeError, ValueError) as e:
+                if stop.is_set():
+                    return
+                self.cache._record_error(self.kind, str(e))
+                stop.wait(RETRY_DELAY)
+
+    def relist(self):
+        """Lista completa (paginada) y sustitución del inventario del tipo"""
+        fresh: Dict[str, Record] = {}
+        token = ""
+        while True:
+            query = f"limit={self.cache.page_size}" + (f"&continue={quote(token)}" if token else "")
+            with self._raw(f"{self.spec.api_path}?{query}") as stdout:
+                recorder = _HeadRecorder(stdout)
+                for item in iter_array_items(recorder, "items"):
+                    if isinstance(item, dict):
+                        fresh[object_key(item)] = self.spec.extract(item)
+            version, token = _list_metadata(recorder.head)
+            if not token:
+                break
+        self.resource_version = version
+        self.listed_at = time.monotonic()
+        self.cache._replace(self.kind, fresh)
+        self.synced.set()
+
+    def watch(self, timeout: int):
+        """Sigue los cambios desde ``resource_version`` hasta que el API cierra el watch"""
+        query = (f"watch=1&allowWatchBookmarks=true&timeoutSeconds={timeout}"
+                 f"&resourceVersion={quote(self.resource_version)}")
+        with self._raw(f"{self.spec.api_path}?{query}") as stdout:
+            for line in stdout:
+                if line.strip():
+                    self._handle(json.loads(line))
+
+    def _handle(self, event: Dict):
+        kind = event.get("type")
+        obj = event.get("object") or {}
+        if kind == "ERROR":
+            if obj.get("code") == 410:
+                raise ResourceVersionExpired(obj.get("message", ""))
+            raise RuntimeError(f"watch de {self.kind}: {obj.get('message', obj)}")
+
+        version = (obj.get("metadata") or {}).get("resourceVersion")
+        if kind in ("ADDED", "MODIFIED"):
+            self.cache._apply(self.kind, object_key(obj), self.spec.extract(obj))
+        elif kind == "DELETED":
+            self.cache._apply(self.kind, object_key(obj), None)
+        if version:
+            self.resource_version = version
+
+    def _raw(self, path: str) -> "_RawRequest":
+        return _RawRequest(self, self.cache.kubectl_command(["get", "--raw", path]))
+
+    def terminate(self):
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+
+class _RawRequest:
+    """Proceso ``kubectl get --raw``: stdout en streaming, errores al cerrar"""
+
+    def __init__(self, informer: Informer, cmd: List[str]):
+        self.informer = informer
+        self.cmd = cmd
+
+    def __enter__(self):
+        import tempfile
+
+        self.stderr = tempfile.TemporaryFile(mode="w+")
+        self.process = subprocess.Popen(self.cmd, text=True, stdout=subprocess.PIPE,
+                                        stderr=self.stderr)
+        self.informer._process = self.process
+        return self.process.stdout
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is not None:
+                self.process.kill()
+            self.process.stdout.close()
+            returncode = self.process.wait()
+            self.informer._process = None
+            if exc_type is None and returncode != 0:
+                self.stderr.seek(0)
+                error = self.stderr.read().strip() or f"exit {returncode}"
+                if any(marker in error for marker in _EXPIRED):
+                    raise ResourceVersionExpired(error)
+                raise RuntimeError(error)
+        finally:
+            self.stderr.close()
+        return False
+
+
+class InventoryCache:
+    """Registros compactos de varios tipos, al día mediante un Informer por tipo
+
+    Los suscriptores reciben cada cambio con el lock del inventario tomado:
+    quien consulte el inventario (o el estado derivado de los suscriptores)
+    debe hacerlo dentro de ``with cache.lock``.
+    """
+
+    def __init__(self, kinds: Optional[Sequence[str]] = None, kubectl: str = "kubectl",
+                 context: Optional[str] = None, page_size: int = LIST_PAGE_SIZE,
+                 resync_period: float = RESYNC_PERIOD, watch_timeout: int = WATCH_TIMEOUT):
+        self.kinds = list(kinds or KINDS)
+        self.kubectl = kubectl
+        self.context = context
+        self.page_size = page_size
+        self.resync_period = resync_period
+        self.watch_timeout = watch_timeout
+        self.lock = threading.RLock()
+        self.stores: Dict[str, Dict[str, Record]] = {kind: {} for kind in self.kinds}
+        self.errors: Dict[str, str] = {}
+        self.generation = 0   # aumenta con cada cambio entregado
+        self._listeners: List[ChangeListener] = []
+        self._informers = {kind: Informer(kind, self) for kind in self.kinds}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def kubectl_command(self, args: List[str]) -> List[str]:
+        cmd = [self.kubectl, *args]
+        if self.context:
+            cmd += ["--context", self.context]
+        return cmd
+
+    def subscribe(self, listener: ChangeListener):
+        """Registra un suscriptor; recibe como altas los objetos que ya hay"""
+        with self.lock:
+            self._listeners.append(listener)
+            for kind, store in self.stores.items():
+                for key, record in store.items():
+                    listener(kind, key, None, record)
+
+    def start(self):
+        for kind, informer in self._informers.items():
+            thread = threading.Thread(target=informer.run, args=(self._stop,),
+                                      name=f"informer-{kind}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait_synced(self, timeout: Optional[float] = None) -> bool:
+        """Espera al primer listado completo de todos los tipos"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for informer in self._informers.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not informer.synced.wait(remaining):
+                return False
+        return True
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        for informer in self._informers.values():
+            informer.terminate()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def views(self) -> Dict[str, "object"]:
+        """Vista viva de los registros por tipo (consultar dentro de ``with lock``)"""
+        return {kind: store.values() for kind, store in self.stores.items()}
+
+    def _apply(self, kind: str, key: str, record: Optional[Record]):
+        with self.lock:
+            store = self.stores[kind]
+            old = store.get(key)
+            if old == record:
+                return
+            if record is None:
+                del store[key]
+            else:
+                store[key] = record
+            self._notify(kind, key, old, record)
+
+    def _replace(self, kind: str, fresh: Dict[str, Record]):
+        """Sustituye el inventario de un tipo tras un listado (entrega solo las diferencias)"""
+        with self.lock:
+            store = self.stores[kind]
+            for key in [key for key in store if key not in fresh]:
+                self._notify(kind, key, store.pop(key), None)
+            for key, record in fresh.items():
+                old = store.get(key)
+                if old != record:
+                    store[key] = record
+                    self._notify(kind, key, old, record)
+            self.errors.pop(kind, None)
+
+    def _notify(self, kind: str, key: str, old: Optional[Record], new: Optional[Record]):
+        self.generation += 1
+        for listener in self._listeners:
+            listener(kind, key, old, new)
+
+    def _record_error(self, kind: str, error: str):
+        with self.lock:
+            self.errors[kind] = error
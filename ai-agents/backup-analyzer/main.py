@@ -3,11 +3,22 @@
 Backup AI Agent - Gestión inteligente de backups para AKS
 """
 
-import json
-import subprocess
+import contextlib
 import datetime
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from backup_cost import BackupCostModel, CostBreakdown, PvcCostIndex, PvcHistory
+from cluster_snapshot import ClusterSnapshot, Record, SnapshotCollector
+from pvc_index import WORKLOAD_KINDS, PvcIndex
+
+# El inventario con watch solo se usa en modo --watch
+if TYPE_CHECKING:
+    from inventory_cache import InventoryCache
 
 @dataclass
 class BackupRecommendation:
@@ -16,29 +27,48 @@ class BackupRecommendation:
     estimated_cost: float
     critical_resources: List[str]
     excluded_namespaces: List[str]
+    cost_by_namespace: Dict[str, float] = field(default_factory=dict)
+    cost_by_tier: Dict[str, float] = field(default_factory=dict)
 
 class BackupAIAgent:
-    def __init__(self):
-        self.cost_per_gb_month = 0.05  # Azure snapshot cost
+    def __init__(self, collector: Optional[SnapshotCollector] = None,
+                 inventory: Optional["InventoryCache"] = None,
+                 history: Optional[PvcHistory] = None):
         self.vault_base_cost = 5.0     # Backup vault base cost
+        # Coste por tamaño real de cada PVC, churn según su histórico y tiers de retención
+        self.cost_model = BackupCostModel(history=history if history is not None else PvcHistory())
+        # Un único snapshot (listados en paralelo) compartido por todas las etapas
+        self.collector = collector or SnapshotCollector()
+        self.last_snapshot: Optional[ClusterSnapshot] = None
+        # Con un inventario vivo (list + watch) el índice PVC -> workload, las
+        # etiquetas y el coste de los PVCs se mantienen por objeto, solo para los que cambian
+        self.inventory = inventory
+        self.pvc_index: Optional[PvcIndex] = None
+        self.pvc_costs: Optional[PvcCostIndex] = None
+        self._pvc_labels: Dict[str, str] = {}
+        if inventory is not None:
+            self.pvc_index = PvcIndex()
+            self.pvc_costs = PvcCostIndex(self.cost_model)
+            inventory.subscribe(self._on_inventory_change)
         
     def analyze_cluster_for_backup(self) -> BackupRecommendation:
         """Analiza el cluster y recomienda estrategia de backup"""
         
-        # Obtener información del cluster
-        cluster_info = self._get_cluster_info()
-        
-        # Análisis IA de criticidad
-        critical_resources = self._identify_critical_resources(cluster_info)
-        
-        # Calcular frecuencia óptima
-        frequency = self._calculate_optimal_frequency(cluster_info)
-        
-        # Calcular retención
-        retention = self._calculate_retention_policy(cluster_info)
-        
-        # Estimar costos
-        estimated_cost = self._estimate_backup_costs(cluster_info)
+        with self.inventory.lock if self.inventory is not None else contextlib.nullcontext():
+            # Obtener información del cluster
+            cluster_info = self._get_cluster_info()
+            
+            # Análisis IA de criticidad
+            critical_resources = self._identify_critical_resources(cluster_info)
+            
+            # Calcular frecuencia óptima
+            frequency = self._calculate_optimal_frequency(cluster_info)
+            
+            # Calcular retención
+            retention = self._calculate_retention_policy(cluster_info)
+            
+            # Estimar costos
+            costs = self._estimate_backup_costs(cluster_info, frequency, retention)
         
         # Namespaces a excluir
         excluded_namespaces = ["kube-system", "kube-public", "gatekeeper-system"]
@@ -46,76 +76,71 @@ class BackupAIAgent:
         return BackupRecommendation(
             frequency=frequency,
             retention_days=retention,
-            estimated_cost=estimated_cost,
+            estimated_cost=round(self.vault_base_cost + costs.total, 2),
             critical_resources=critical_resources,
-            excluded_namespaces=excluded_namespaces
+            excluded_namespaces=excluded_namespaces,
+            cost_by_namespace=costs.by_namespace,
+            cost_by_tier=costs.by_tier
         )
     
     def _get_cluster_info(self) -> Dict:
-        """Obtiene información del cluster"""
-        try:
-            # Obtener PVCs
-            pvcs_result = subprocess.run(
-                ["kubectl", "get", "pvc", "--all-namespaces", "-o", "json"],
-                capture_output=True, text=True
-            )
-            
-            # Obtener deployments
-            deployments_result = subprocess.run(
-                ["kubectl", "get", "deployments", "--all-namespaces", "-o", "json"],
-                capture_output=True, text=True
-            )
-            
-            # Obtener namespaces
-            namespaces_result = subprocess.run(
-                ["kubectl", "get", "namespaces", "-o", "json"],
-                capture_output=True, text=True
-            )
-            
-            return {
-                "pvcs": json.loads(pvcs_result.stdout) if pvcs_result.returncode == 0 else {"items": []},
-                "deployments": json.loads(deployments_result.stdout) if deployments_result.returncode == 0 else {"items": []},
-                "namespaces": json.loads(namespaces_result.stdout) if namespaces_result.returncode == 0 else {"items": []}
-            }
-        except Exception as e:
-            print(f"Error obteniendo info del cluster: {e}")
-            return {"pvcs": {"items": []}, "deployments": {"items": []}, "namespaces": {"items": []}}
+        """Obtiene información del cluster (PVCs, workloads, pods y namespaces)
+        
+        Los listados se hacen a la vez y el resultado se reutiliza mientras
+        el snapshot esté vigente; un tipo que no se pudo listar queda vacío.
+        Cada tipo es una lista de registros compactos (PvcRecord,
+        WorkloadRecord, NamespaceRecord), no el JSON de kubectl. Con un
+        inventario vivo se devuelven sus vistas, sin listar nada.
+        """
+        if self.inventory is not None:
+            return self.inventory.views()
+        
+        snapshot = self.collector.snapshot()
+        self.last_snapshot = snapshot
+        failures: Dict[str, List[str]] = {}
+        for kind, error in snapshot.errors.items():
+            failures.setdefault(error, []).append(kind)
+        for error, kinds in failures.items():
+            print(f"Error obteniendo info del cluster ({', '.join(kinds)}): {error}")
+        return snapshot.resources
     
     def _identify_critical_resources(self, cluster_info: Dict) -> List[str]:
-        """Identifica recursos críticos que necesitan backup"""
-        critical = []
+        """Identifica recursos críticos que necesitan backup
         
+        Todos los PVCs y los workloads que los usan, de cualquier tipo
+        (Deployment, StatefulSet, DaemonSet, CronJob/Job o pod suelto),
+        según el índice PVC -> workload.
+        """
+        if self.inventory is not None:
+            # Mantenidos por _on_inventory_change
+            pvc_labels = list(self._pvc_labels.values())
+        else:
+            self.pvc_index = PvcIndex.build(cluster_info)
+            pvc_labels = [self._pvc_label(pvc) for pvc in cluster_info["pvcs"]]
+        return [*pvc_labels, *map(str, self.pvc_index.critical_workloads())]
+    
+    @staticmethod
+    def _pvc_label(record: Record) -> str:
         # PVCs son siempre críticos
-        for pvc in cluster_info["pvcs"]["items"]:
-            name = pvc["metadata"]["name"]
-            namespace = pvc["metadata"]["namespace"]
-            critical.append(f"PVC: {namespace}/{name}")
-        
-        # Deployments con datos persistentes
-        for deployment in cluster_info["deployments"]["items"]:
-            name = deployment["metadata"]["name"]
-            namespace = deployment["metadata"]["namespace"]
-            
-            # Verificar si tiene volúmenes persistentes
-            spec = deployment.get("spec", {})
-            template = spec.get("template", {})
-            pod_spec = template.get("spec", {})
-            volumes = pod_spec.get("volumes", [])
-            
-            has_persistent_volume = any(
-                "persistentVolumeClaim" in volume for volume in volumes
-            )
-            
-            if has_persistent_volume:
-                critical.append(f"Deployment: {namespace}/{name}")
-        
-        return critical
+        return f"PVC: {record.namespace}/{record.name}"
+    
+    def _on_inventory_change(self, kind: str, key: str, old: Optional[Record],
+                             new: Optional[Record]):
+        """Actualiza el índice, las etiquetas y el coste solo con el objeto que cambió"""
+        if kind == "pvcs":
+            if new is not None:
+                self._pvc_labels[key] = self._pvc_label(new)
+            else:
+                self._pvc_labels.pop(key, None)
+            self.pvc_costs.update(key, new)
+        if kind == "pvcs" or kind in WORKLOAD_KINDS:
+            self.pvc_index.update(old, new)
     
     def _calculate_optimal_frequency(self, cluster_info: Dict) -> str:
         """Calcula frecuencia óptima de backup"""
         
-        pvc_count = len(cluster_info["pvcs"]["items"])
-        deployment_count = len(cluster_info["deployments"]["items"])
+        pvc_count = len(cluster_info["pvcs"])
+        deployment_count = len(cluster_info["deployments"])
         
         # Lógica IA para frecuencia
         if pvc_count == 0 and deployment_count <= 2:
@@ -128,7 +153,7 @@ class BackupAIAgent:
     def _calculate_retention_policy(self, cluster_info: Dict) -> int:
         """Calcula política de retención óptima"""
         
-        pvc_count = len(cluster_info["pvcs"]["items"])
+        pvc_count = len(cluster_info["pvcs"])
         
         # Lógica IA para retención
         if pvc_count == 0:
@@ -138,22 +163,30 @@ class BackupAIAgent:
         else:
             return 14  # Más datos críticos
     
-    def _estimate_backup_costs(self, cluster_info: Dict) -> float:
-        """Estima costos mensuales de backup"""
-        
-        # Costo base del vault
-        total_cost = self.vault_base_cost
-        
-        # Estimar tamaño de datos (aproximado)
-        pvc_count = len(cluster_info["pvcs"]["items"])
-        estimated_gb_per_pvc = 10  # Estimación conservadora
-        
-        total_gb = pvc_count * estimated_gb_per_pvc
-        snapshot_cost = total_gb * self.cost_per_gb_month
+    def _estimate_backup_costs(self, cluster_info: Dict, frequency: str,
+                               retention: int) -> CostBreakdown:
+        """Estima costos mensuales de backup de los PVCs (sin el vault)
         
-        total_cost += snapshot_cost
+        Usa la capacidad de cada PVC y su churn histórico; el histórico se
+        actualiza con lo observado en este análisis y solo se guarda si
+        cambió. Con un inventario vivo se suman los costes por PVC que
+        mantiene _on_inventory_change.
+        """
+        history = self.cost_model.history
+        if self.pvc_costs is not None:
+            costs = self.pvc_costs.breakdown(retention, frequency)
+        else:
+            pvcs = cluster_info["pvcs"]
+            costs = self.cost_model.estimate(pvcs, retention, frequency)
+            if history is not None and pvcs:  # sin PVCs (o sin listado) no se olvida nada
+                history.prune(f"{pvc.namespace}/{pvc.name}" for pvc in pvcs)
         
-        return round(total_cost, 2)
+        if history is not None:
+            try:
+                history.save()  # no escribe nada si no hubo cambios
+            except OSError as e:
+                print(f"⚠️  No se pudo guardar el histórico de PVCs: {e}")
+        return costs
     
     def generate_backup_strategy(self) -> Dict:
         """Genera estrategia completa de backup"""
@@ -171,6 +204,7 @@ class BackupAIAgent:
                 "retention_days": recommendation.retention_days,
                 "estimated_monthly_cost": recommendation.estimated_cost,
                 "critical_resources_count": len(recommendation.critical_resources),
+                "cost_by_tier": recommendation.cost_by_tier,
                 "excluded_namespaces": recommendation.excluded_namespaces
             },
             "schedule": {
@@ -184,6 +218,7 @@ class BackupAIAgent:
                 "snapshot_frequency": recommendation.frequency
             },
             "critical_resources": recommendation.critical_resources,
+            "cost_by_namespace": recommendation.cost_by_namespace,
             "recommendations": [
                 f"Backup {recommendation.frequency} a las {optimal_hour:02d}:00 UTC",
                 f"Retener por {recommendation.retention_days} días",
@@ -195,14 +230,7 @@ class BackupAIAgent:
         
         return strategy
 
-def main():
-    """Ejecutar análisis de backup con IA"""
-    
-    print("🤖 Backup AI Agent - Analizando cluster...")
-    
-    agent = BackupAIAgent()
-    strategy = agent.generate_backup_strategy()
-    
+def _print_strategy(strategy: Dict):
     print(f"\n📊 Estrategia de Backup IA:")
     print(f"   Frecuencia: {strategy['ai_analysis']['frequency']}")
     print(f"   Retención: {strategy['ai_analysis']['retention_days']} días")
@@ -217,6 +245,14 @@ def main():
     for rec in strategy['recommendations']:
         print(f"   • {rec}")
     
+    if strategy['cost_by_namespace']:
+        print(f"\n💰 Coste por Namespace:")
+        for namespace, cost in list(strategy['cost_by_namespace'].items())[:5]:
+            print(f"   • {namespace}: ${cost}/mes")
+        
+        if len(strategy['cost_by_namespace']) > 5:
+            print(f"   ... y {len(strategy['cost_by_namespace']) - 5} más")
+    
     if strategy['critical_resources']:
         print(f"\n🔒 Recursos Críticos Detectados:")
         for resource in strategy['critical_resources'][:5]:  # Mostrar primeros 5
@@ -225,5 +261,77 @@ def main():
         if len(strategy['critical_resources']) > 5:
             print(f"   ... y {len(strategy['critical_resources']) - 5} más")
 
+def _watch(args):
+    """Proceso de larga duración: inventario con list + watch y análisis incremental"""
+    import time
+    from inventory_cache import LIST_PAGE_SIZE, InventoryCache
+    
+    inventory = InventoryCache(context=args.context, page_size=args.chunk_size or LIST_PAGE_SIZE,
+                               resync_period=args.resync)
+    agent = BackupAIAgent(inventory=inventory,
+                          history=PvcHistory(args.history) if args.history else None)
+    inventory.start()
+    print("👀 Backup AI Agent - Inventario del cluster con watch (Ctrl+C para salir)")
+    
+    try:
+        while not inventory.wait_synced(timeout=30):
+            for kind, error in inventory.errors.items():
+                print(f"   ⚠️  {kind}: {error}", flush=True)
+        
+        last_generation = None
+        while True:
+            if inventory.generation != last_generation:
+                last_generation = inventory.generation
+                started = time.perf_counter()
+                strategy = agent.generate_backup_strategy()
+                elapsed = (time.perf_counter() - started) * 1000
+                analysis = strategy["ai_analysis"]
+                print(f"\n🔄 {datetime.datetime.now():%H:%M:%S} estrategia recalculada en {elapsed:.1f}ms "
+                      f"(cambio #{last_generation}): {analysis['frequency']}, "
+                      f"{analysis['retention_days']} días, ${analysis['estimated_monthly_cost']}/mes, "
+                      f"{analysis['critical_resources_count']} recursos críticos", flush=True)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n👋 Deteniendo informers...")
+    finally:
+        inventory.stop()
+
+def main():
+    """Ejecutar análisis de backup con IA"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Backup AI Agent - estrategia de backup para AKS")
+    parser.add_argument("--chunk-size", type=int,
+                        help="Pedir las listas al API en páginas de N objetos (kubectl --chunk-size)")
+    parser.add_argument("--context", help="Contexto de kubeconfig")
+    parser.add_argument("--history", type=Path,
+                        help="Guardar el histórico de tamaños de los PVCs en este fichero JSON "
+                             "(por defecto solo en memoria)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Mantener un inventario con list + watch y recalcular al cambiar el cluster")
+    parser.add_argument("--resync", type=float, default=600.0,
+                        help="Con --watch: segundos entre relistados completos")
+    parser.add_argument("--interval", type=float, default=5.0,
+                        help="Con --watch: segundos entre comprobaciones de cambios")
+    args = parser.parse_args()
+    
+    if args.watch:
+        _watch(args)
+        return
+    
+    print("🤖 Backup AI Agent - Analizando cluster...")
+    
+    agent = BackupAIAgent(SnapshotCollector(context=args.context, chunk_size=args.chunk_size),
+                          history=PvcHistory(args.history) if args.history else None)
+    strategy = agent.generate_backup_strategy()
+    
+    snapshot = agent.last_snapshot
+    if snapshot is not None and snapshot.slowest and len(snapshot.errors) < len(snapshot.resources):
+        kind, seconds = snapshot.slowest
+        print(f"   📸 Snapshot: {len(snapshot.resources)} listados en paralelo en {snapshot.elapsed:.2f}s "
+              f"(el más lento: {kind}, {seconds:.2f}s)")
+    
+    _print_strategy(strategy)
+
 if __name__ == "__main__":
     main()
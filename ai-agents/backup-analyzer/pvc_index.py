@@ -0,0 +1,205 @@
+"""
+PVC Index - Relación PVC -> workloads que lo usan, con búsquedas por hash
+
+Un PVC lo puede montar:
+
+  - la plantilla de pods de un Deployment, DaemonSet, Job o CronJob
+    (``persistentVolumeClaim.claimName``)
+  - un StatefulSet a través de ``volumeClaimTemplates``: sus PVCs se llaman
+    ``<plantilla>-<statefulset>-<ordinal>``
+  - un pod concreto, incluidos los volúmenes ``ephemeral`` (``<pod>-<volumen>``)
+
+Los pods se atribuyen a su controlador siguiendo ``ownerReferences``
+(Pod -> ReplicaSet -> Deployment, Pod -> Job -> CronJob); un pod sin
+controlador cuenta como workload propio. Cada alta o baja es O(1) en
+diccionarios (por namespace, por claim, por prefijo de StatefulSet y por
+dueño), así que construir el índice es O(pods + pvcs) y se puede mantener
+al día evento a evento desde el InventoryCache.
+"""
+
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from cluster_snapshot import PvcRecord, Record, WorkloadRecord
+
+# Tipos del análisis que se indexan como consumidores de PVCs
+WORKLOAD_KINDS = ("deployments", "statefulsets", "daemonsets", "replicasets",
+                  "jobs", "cronjobs", "pods")
+
+# Orden de presentación de los workloads
+_KIND_ORDER = {kind: position for position, kind in enumerate(
+    ("StatefulSet", "Deployment", "DaemonSet", "CronJob", "Job", "ReplicaSet", "Pod"))}
+# Saltos máximos al subir por ownerReferences (Pod -> ReplicaSet -> Deployment)
+_MAX_OWNER_DEPTH = 4
+
+
+class WorkloadRef(NamedTuple):
+    kind: str
+    namespace: str
+    name: str
+
+    def __str__(self) -> str:
+        return f"{self.kind}: {self.namespace}/{self.name}"
+
+
+def _statefulset_prefix(claim: str) -> Optional[str]:
+    """``<plantilla>-<statefulset>`` si el claim tiene forma de PVC de StatefulSet"""
+    prefix, _, ordinal = claim.rpartition("-")
+    return prefix if prefix and ordinal.isdigit() else None
+
+
+def _bucket(index: Dict, namespace: str, key: str) -> Dict:
+    return index.setdefault(namespace, {}).setdefault(key, {})
+
+
+def _discard(index: Dict, namespace: str, key: str, member):
+    keys = index.get(namespace)
+    if keys is None or key not in keys:
+        return
+    keys[key].pop(member, None)
+    if not keys[key]:
+        del keys[key]
+        if not keys:
+            del index[namespace]
+
+
+class PvcIndex:
+    """Índice PVC <-> workload por namespace, claim y workload"""
+
+    def __init__(self):
+        self._pvcs: Dict[str, Dict[str, PvcRecord]] = {}             # ns -> nombre -> PVC
+        self._consumers: Dict[str, Dict[str, Dict[WorkloadRef, None]]] = {}  # ns -> claim -> refs
+        self._claims_of: Dict[WorkloadRef, Tuple[str, ...]] = {}      # solo los que montan algo
+        # StatefulSets: ns -> "<plantilla>-<sts>" -> sts, y PVCs existentes por ese prefijo
+        self._templates: Dict[str, Dict[str, Dict[WorkloadRef, None]]] = {}
+        self._templates_of: Dict[WorkloadRef, Tuple[str, ...]] = {}
+        self._pvc_prefixes: Dict[str, Dict[str, Dict[str, None]]] = {}
+        # ownerReferences: hijo -> controlador y controlador -> hijos
+        self._owner: Dict[WorkloadRef, WorkloadRef] = {}
+        self._children: Dict[WorkloadRef, Dict[WorkloadRef, None]] = {}
+
+    @classmethod
+    def build(cls, resources: Mapping[str, Iterable[Record]]) -> "PvcIndex":
+        """Índice de los registros por tipo de un snapshot o inventario"""
+        index = cls()
+        for record in resources.get("pvcs", ()):
+            index.add(record)
+        for kind in WORKLOAD_KINDS:
+            for record in resources.get(kind, ()):
+                index.add(record)
+        return index
+
+    # --- Mantenimiento -------------------------------------------------------
+
+    def add(self, record: Record):
+        if isinstance(record, PvcRecord):
+            self._pvcs.setdefault(record.namespace, {})[record.name] = record
+            prefix = _statefulset_prefix(record.name)
+            if prefix:
+                _bucket(self._pvc_prefixes, record.namespace, prefix)[record.name] = None
+        elif isinstance(record, WorkloadRecord):
+            if record.kind == "Pod" and not record.claims:
+                return  # la mayoría de pods: no aportan nada y nunca son dueños de otros
+            ref = WorkloadRef(record.kind, record.namespace, record.name)
+            if record.claims:
+                self._claims_of[ref] = record.claims
+                for claim in record.claims:
+                    _bucket(self._consumers, record.namespace, claim)[ref] = None
+            if record.claim_templates:
+                prefixes = tuple(f"{template}-{record.name}" for template in record.claim_templates)
+                self._templates_of[ref] = prefixes
+                for prefix in prefixes:
+                    _bucket(self._templates, record.namespace, prefix)[ref] = None
+            if record.owner:
+                kind, _, name = record.owner.partition("/")
+                owner = WorkloadRef(kind, record.namespace, name)
+                self._owner[ref] = owner
+                self._children.setdefault(owner, {})[ref] = None
+
+    def remove(self, record: Record):
+        if isinstance(record, PvcRecord):
+            pvcs = self._pvcs.get(record.namespace)
+            if pvcs is not None:
+                pvcs.pop(record.name, None)
+                if not pvcs:
+                    del self._pvcs[record.namespace]
+            prefix = _statefulset_prefix(record.name)
+            if prefix:
+                _discard(self._pvc_prefixes, record.namespace, prefix, record.name)
+        elif isinstance(record, WorkloadRecord):
+            ref = WorkloadRef(record.kind, record.namespace, record.name)
+            for claim in self._claims_of.pop(ref, ()):
+                _discard(self._consumers, record.namespace, claim, ref)
+            for prefix in self._templates_of.pop(ref, ()):
+                _discard(self._templates, record.namespace, prefix, ref)
+            owner = self._owner.pop(ref, None)
+            if owner is not None:
+                children = self._children.get(owner)
+                if children is not None:
+                    children.pop(ref, None)
+                    if not children:
+                        del self._children[owner]
+
+    def update(self, old: Optional[Record], new: Optional[Record]):
+        """Aplica un cambio del inventario (None = alta o baja)"""
+        if old is not None:
+            self.remove(old)
+        if new is not None:
+            self.add(new)
+
+    # --- Consultas -----------------------------------------------------------
+
+    def resolve(self, ref: WorkloadRef) -> WorkloadRef:
+        """Controlador de más arriba (Pod -> ReplicaSet -> Deployment)"""
+        for _ in range(_MAX_OWNER_DEPTH):
+            owner = self._owner.get(ref)
+            if owner is None:
+                break
+            ref = owner
+        return ref
+
+    def workloads_for_claim(self, namespace: str, claim: str) -> List[WorkloadRef]:
+        """Workloads (ya resueltos a su controlador) que usan un PVC"""
+        found = {self.resolve(ref): None
+                 for ref in self._consumers.get(namespace, {}).get(claim, ())}
+        prefix = _statefulset_prefix(claim)
+        if prefix:
+            for ref in self._templates.get(namespace, {}).get(prefix, ()):
+                found[self.resolve(ref)] = None
+        return list(found)
+
+    def claims_for_workload(self, ref: WorkloadRef) -> List[str]:
+        """PVCs de un workload, incluidos los de sus pods y sus volumeClaimTemplates"""
+        claims: Dict[str, None] = {}
+        pending = [ref]
+        while pending:
+            current = pending.pop()
+            claims.update(dict.fromkeys(self._claims_of.get(current, ())))
+            for prefix in self._templates_of.get(current, ()):
+                claims.update(self._pvc_prefixes.get(current.namespace, {}).get(prefix, {}))
+            pending.extend(self._children.get(current, ()))
+        return list(claims)
+
+    def namespace(self, namespace: str) -> Dict[str, List[WorkloadRef]]:
+        """Claims del namespace (existan o solo se referencien) -> workloads"""
+        claims = dict.fromkeys(self._pvcs.get(namespace, ()))
+        claims.update(dict.fromkeys(self._consumers.get(namespace, ())))
+        return {claim: self.workloads_for_claim(namespace, claim) for claim in claims}
+
+    def pvcs(self) -> Iterable[PvcRecord]:
+        for pvcs in self._pvcs.values():
+            yield from pvcs.values()
+
+    def unused_claims(self) -> List[PvcRecord]:
+        """PVCs que no monta ningún workload"""
+        return [pvc for pvc in self.pvcs() if not self.workloads_for_claim(pvc.namespace, pvc.name)]
+
+    def critical_workloads(self) -> List[WorkloadRef]:
+        """Workloads con datos persistentes, ordenados por tipo, namespace y nombre
+
+        Recorre solo los objetos que montan PVCs o tienen volumeClaimTemplates,
+        no todos los pods del cluster.
+        """
+        found = {self.resolve(ref): None for ref in self._claims_of}
+        found.update((self.resolve(ref), None) for ref in self._templates_of)
+        return sorted(found, key=lambda ref: (_KIND_ORDER.get(ref.kind, len(_KIND_ORDER)),
+                                              ref.namespace, ref.name))
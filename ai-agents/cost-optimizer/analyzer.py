@@ -3,11 +3,15 @@
 Cost Optimizer Agent - Optimización automática de costos con IA
 """
 
-import json
-import requests
+import sys
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-from typing import Dict, List
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "pricing"))
+
+from pricing_catalog import DEFAULT_REGION, load_catalog
 
 @dataclass
 class CostAnalysis:
@@ -17,7 +21,9 @@ class CostAnalysis:
     recommendations: List[str]
 
 class CostOptimizerAgent:
-    def __init__(self):
+    def __init__(self, price_sheet: Optional[str] = None, region: str = DEFAULT_REGION):
+        self.pricing = load_catalog(price_sheet)
+        self.region = region
         self.cost_thresholds = {
             "dev": 50.0,      # $50/month max para dev
             "staging": 200.0,  # $200/month max para staging  
@@ -101,14 +107,8 @@ class CostOptimizerAgent:
     def _calculate_savings(self, current_vm: str, recommended_vm: str) -> float:
         """Calcula ahorros potenciales"""
         
-        vm_costs = {
-            "Standard_B1s": 15.0,
-            "Standard_B2s": 30.0,
-            "Standard_D2_v2": 70.0
-        }
-        
-        current_cost = vm_costs.get(current_vm, 30.0)
-        recommended_cost = vm_costs.get(recommended_vm, 30.0)
+        current_cost, recommended_cost = self.pricing.monthly_costs(
+            [current_vm, recommended_vm], [1, 1], self.region)
         
         return max(0, current_cost - recommended_cost)
     
@@ -0,0 +1,335 @@
+"""
+Orchestrator Daemon - Despliegues sin intervención vía API HTTP local
+
+Las peticiones se guardan en una cola persistente (SQLite) y las ejecuta
+un pool acotado de workers. Nunca corren dos despliegues del mismo entorno
+a la vez (el entorno se reclama en la misma transacción que el trabajo);
+entornos distintos avanzan en paralelo hasta el límite global. Solo un
+daemon puede usar cada fichero de cola (lo impide un lock junto a él): al
+arrancar, los trabajos que estaban en curso vuelven a la cola.
+
+``tool`` es opcional: si se indica, sustituye a la herramienta que elegiría
+el análisis; ``subscription_id`` vacío usa la suscripción por defecto del
+orquestador.
+
+API (TCP en 127.0.0.1 o socket Unix):
+  POST /deployments        {"environment", "project_name", "tool"?, "subscription_id"?}
+  GET  /deployments/<id>   estado y resultado de un trabajo
+  GET  /queue              trabajos pendientes y en curso
+  GET  /metrics            métricas para Prometheus (profundidad de cola, latencias)
+  GET  /healthz
+"""
+
+import fcntl
+import json
+import os
+import socketserver
+import sqlite3
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+METRIC_PREFIX = "aks_orchestrator"
+TOOLS = ("terraform", "tofu", "terragrunt")
+_LATENCY_WINDOW = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    environment     TEXT NOT NULL,
+    project_name    TEXT NOT NULL,
+    tool            TEXT NOT NULL,
+    subscription_id TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    result          TEXT,
+    error           TEXT,
+    enqueued_at     REAL NOT NULL,
+    started_at      REAL,
+    finished_at     REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, id);
+"""
+
+
+class JobQueue:
+    """Cola persistente de despliegues con exclusión por entorno"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Devolver a la cola lo que estaba "en curso" solo es seguro si no hay otro daemon
+        self._lock_file = open(self.path.with_name(self.path.name + ".lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"otro daemon ya está usando la cola {self.path}") from None
+        self._local = threading.local()
+        db = self._connect()
+        db.executescript(_SCHEMA)
+        # Trabajos interrumpidos por una parada del daemon vuelven a la cola
+        db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                   (QUEUED, RUNNING))
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def put(self, environment: str, project_name: str, tool: str, subscription_id: str) -> int:
+        cursor = self._connect().execute(
+            "INSERT INTO jobs (environment, project_name, tool, subscription_id, status, enqueued_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (environment, project_name, tool, subscription_id, QUEUED, time.time()))
+        return cursor.lastrowid
+
+    def claim(self) -> Optional[Dict]:
+        """Toma el trabajo más antiguo cuyo entorno no tiene otro en curso
+
+        Búsqueda y reclamación van en una transacción ``IMMEDIATE``: el
+        entorno ocupado se decide con lo que hay en SQLite, no en memoria.
+        """
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND environment NOT IN"
+                " (SELECT environment FROM jobs WHERE status = ?) ORDER BY id LIMIT 1",
+                (QUEUED, RUNNING)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                           (RUNNING, time.time(), row["id"]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    def complete(self, job_id: int, status: str, result: Optional[Dict] = None,
+                 error: Optional[str] = None):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error,
+             time.time(), job_id))
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def pending(self) -> List[Dict]:
+        rows = self._connect().execute(
+            "SELECT id, environment, project_name, tool, status, enqueued_at, started_at"
+            " FROM jobs WHERE status IN (?, ?) ORDER BY id", (QUEUED, RUNNING)).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class OrchestratorDaemon:
+    """Pool de workers que consume la cola
+
+    ``deploy(job)`` ejecuta un trabajo y devuelve el dict de resultado del
+    orquestador; un ``status`` distinto de success/unchanged cuenta como
+    fallo.
+    """
+
+    def __init__(self, queue: JobQueue, deploy: Callable[[Dict], Dict], workers: int = 4):
+        self.queue = queue
+        self.deploy = deploy
+        self.workers = max(1, workers)
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self._wait_seconds: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._run_seconds: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._finished: Dict[str, int] = {}
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"orchestrator-worker-{number}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, environment: str, project_name: str, tool: str = "",
+               subscription_id: str = "") -> int:
+        job_id = self.queue.put(environment, project_name, tool, subscription_id)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def _next_job(self) -> Optional[Dict]:
+        with self._wakeup:
+            while not self._stopping:
+                job = self.queue.claim()
+                if job is not None:
+                    return job
+                # Despertar periódico por si otro proceso encoló directamente en SQLite
+                self._wakeup.wait(timeout=5.0)
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            started = time.time()
+            try:
+                result = self.deploy(job)
+                status = DONE if result.get("status") in ("success", "unchanged") else FAILED
+                self.queue.complete(job["id"], status, result=result)
+            except Exception as e:
+                status = FAILED
+                self.queue.complete(job["id"], status, error=str(e))
+            finally:
+                with self._wakeup:
+                    self._wakeup.notify_all()  # el entorno queda libre para otro trabajo
+            with self._stats_lock:
+                self._wait_seconds.append(job["started_at"] - job["enqueued_at"])
+                self._run_seconds.append(time.time() - started)
+                self._finished[status] = self._finished.get(status, 0) + 1
+
+    def metrics_text(self) -> str:
+        counts = self.queue.counts()
+        with self._stats_lock:
+            waits = sorted(self._wait_seconds)
+            runs = sorted(self._run_seconds)
+            finished = dict(self._finished)
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_queue_depth Trabajos en cola o en curso",
+            f"# TYPE {METRIC_PREFIX}_queue_depth gauge",
+            f'{METRIC_PREFIX}_queue_depth{{status="queued"}} {counts.get(QUEUED, 0)}',
+            f'{METRIC_PREFIX}_queue_depth{{status="running"}} {counts.get(RUNNING, 0)}',
+            f"# HELP {METRIC_PREFIX}_workers Límite global de despliegues simultáneos",
+            f"# TYPE {METRIC_PREFIX}_workers gauge",
+            f"{METRIC_PREFIX}_workers {self.workers}",
+            f"# HELP {METRIC_PREFIX}_jobs_finished_total Trabajos terminados desde el arranque",
+            f"# TYPE {METRIC_PREFIX}_jobs_finished_total counter",
+        ]
+        for status in (DONE, FAILED):
+            lines.append(f'{METRIC_PREFIX}_jobs_finished_total{{status="{status}"}} {finished.get(status, 0)}')
+        for name, samples, help_text in (
+                ("queue_wait_seconds", waits, "Espera en cola hasta empezar"),
+                ("run_seconds", runs, "Duración de la ejecución")):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text} (ventana de {_LATENCY_WINDOW})")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} summary")
+            for quantile in (0.5, 0.95, 0.99):
+                value = samples[min(len(samples) - 1, int(quantile * len(samples)))] if samples else 0
+                lines.append(f'{METRIC_PREFIX}_{name}{{quantile="{quantile}"}} {value}')
+            lines.append(f"{METRIC_PREFIX}_{name}_sum {sum(samples)}")
+            lines.append(f"{METRIC_PREFIX}_{name}_count {len(samples)}")
+        return "\n".join(lines) + "\n"
+
+
+def _handler_for(daemon: OrchestratorDaemon):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "aks-orchestrator"
+
+        def log_message(self, format, *args):
+            pass  # Sin log por petición: la cola y /metrics ya registran la actividad
+
+        def _send(self, status: int, body: Any, content_type: str = "application/json"):
+            payload = body if isinstance(body, bytes) else (
+                body.encode() if isinstance(body, str) else json.dumps(body, default=str).encode())
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._send(200, daemon.metrics_text(), "text/plain; version=0.0.4")
+            elif self.path == "/queue":
+                self._send(200, daemon.queue.pending())
+            elif self.path.startswith("/deployments/"):
+                job_id = self.path.rsplit("/", 1)[-1]
+                job = daemon.queue.get(int(job_id)) if job_id.isdigit() else None
+                self._send(200 if job else 404, job or {"error": "not found"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/deployments":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                environment = request["environment"]
+                project_name = request["project_name"]
+                tool = request.get("tool") or ""
+                if tool not in ("", *TOOLS):
+                    raise ValueError(f"tool must be one of {', '.join(TOOLS)}")
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {"error": f"invalid request: {e}"})
+                return
+            job_id = daemon.submit(environment, project_name, tool,
+                                   request.get("subscription_id") or "")
+            self._send(202, {"id": job_id, "status": QUEUED})
+
+    return Handler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)  # BaseHTTPRequestHandler espera (host, port)
+
+
+def serve(daemon: OrchestratorDaemon, host: str = "127.0.0.1", port: int = 8787,
+          socket_path: Optional[str] = None):
+    """Arranca los workers y atiende la API hasta Ctrl+C"""
+    handler = _handler_for(daemon)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, handler)
+        os.chmod(socket_path, 0o660)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        where = f"http://{host}:{server.server_address[1]}"
+
+    daemon.start()
+    print(f"🛰️  AI Orchestrator daemon escuchando en {where} ({daemon.workers} workers)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo daemon (los trabajos en curso vuelven a la cola al reiniciar)")
+    finally:
+        server.server_close()
+        daemon.stop(timeout=1.0)
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
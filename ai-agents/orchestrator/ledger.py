@@ -0,0 +1,182 @@
+"""
+Deployment Ledger - Registro local (SQLite) de despliegues del orquestador
+
+Cada despliegue guarda su huella de inputs (herramienta, entorno, proyecto,
+variables y digest del árbol de módulos), tiempos y resultado. Un índice
+único parcial garantiza que solo haya una ejecución ``running`` por huella:
+una petición duplicada que llega mientras otra está en vuelo se engancha a
+esa ejecución y comparte su resultado en lugar de lanzar un segundo apply.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from stack_fingerprint import module_tree_digest
+
+RUNNING = "running"
+ABANDONED = "abandoned"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    project     TEXT NOT NULL,
+    tool        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    host        TEXT NOT NULL,
+    pid         INTEGER NOT NULL,
+    inputs      TEXT NOT NULL,
+    result      TEXT,
+    started_at  REAL NOT NULL,
+    finished_at REAL,
+    duration    REAL
+);
+CREATE INDEX IF NOT EXISTS ix_deployments_environment ON deployments (environment, started_at);
+CREATE INDEX IF NOT EXISTS ix_deployments_project ON deployments (project, started_at);
+CREATE INDEX IF NOT EXISTS ix_deployments_fingerprint ON deployments (fingerprint, started_at);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_deployments_running
+    ON deployments (fingerprint) WHERE status = 'running';
+"""
+
+
+def deployment_fingerprint(tool: str, environment: str, project: str,
+                           variables: Dict, stack_dir: Path) -> str:
+    """Huella de los inputs de un despliegue (independiente del state)"""
+    digest = hashlib.sha256()
+    for part in (tool, environment, project,
+                 json.dumps(variables, sort_keys=True, default=str),
+                 module_tree_digest(stack_dir) if Path(stack_dir).is_dir() else "<missing>"):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DeploymentLedger:
+    def __init__(self, path: Path, stale_after: float = 6 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Ejecuciones "running" de otra máquina sin terminar tras este tiempo se dan por perdidas
+        self.stale_after = stale_after
+        self.host = socket.gethostname()
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def begin(self, fingerprint: str, environment: str, project: str, tool: str,
+              inputs: Dict) -> Tuple[int, bool]:
+        """Abre una ejecución; devuelve ``(id, owner)``
+
+        ``owner`` es False si ya había una ejecución en vuelo con la misma
+        huella: ``id`` es entonces la de esa ejecución (usar ``wait``).
+        """
+        db = self._connect()
+        while True:
+            try:
+                cursor = db.execute(
+                    "INSERT INTO deployments (fingerprint, environment, project, tool, status,"
+                    " host, pid, inputs, started_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fingerprint, environment, project, tool, RUNNING, self.host, os.getpid(),
+                     json.dumps(inputs, sort_keys=True, default=str), time.time()))
+                return cursor.lastrowid, True
+            except sqlite3.IntegrityError:
+                running = self._running(fingerprint)
+                if running is None:
+                    continue  # terminó entre el INSERT y la consulta
+                if self._is_alive(running):
+                    return running["id"], False
+                self._abandon(running["id"])
+
+    def finish(self, deployment_id: int, status: str, result: Dict):
+        finished = time.time()
+        self._connect().execute(
+            "UPDATE deployments SET status = ?, result = ?, finished_at = ?,"
+            " duration = ? - started_at WHERE id = ?",
+            (status, json.dumps(result, sort_keys=True, default=str), finished, finished,
+             deployment_id))
+
+    def wait(self, deployment_id: int, poll: float = 0.5,
+             timeout: Optional[float] = None) -> Optional[Dict]:
+        """Espera a que termine una ejecución (None si su dueño murió o vence el timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            row = self.get(deployment_id)
+            if row is None:
+                return None
+            if row["status"] != RUNNING:
+                return None if row["status"] == ABANDONED else row
+            if not self._is_alive(row):
+                self._abandon(deployment_id)
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def get(self, deployment_id: int) -> Optional[Dict]:
+        row = self._connect().execute("SELECT * FROM deployments WHERE id = ?",
+                                      (deployment_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def history(self, environment: Optional[str] = None, project: Optional[str] = None,
+                fingerprint: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Últimas ejecuciones, filtradas por entorno/proyecto/huella (usa los índices)"""
+        clauses, params = [], []
+        for column, value in (("environment", environment), ("project", project),
+                              ("fingerprint", fingerprint)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT * FROM deployments {where} ORDER BY started_at DESC LIMIT ?",
+            (*params, limit)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def _running(self, fingerprint: str) -> Optional[sqlite3.Row]:
+        return self._connect().execute(
+            "SELECT * FROM deployments WHERE fingerprint = ? AND status = ?",
+            (fingerprint, RUNNING)).fetchone()
+
+    def _is_alive(self, row) -> bool:
+        if row["host"] == self.host:
+            return _pid_alive(row["pid"])
+        return time.time() - row["started_at"] < self.stale_after
+
+    def _abandon(self, deployment_id: int):
+        self._connect().execute(
+            "UPDATE deployments SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (ABANDONED, time.time(), deployment_id, RUNNING))
+
+    @staticmethod
+    def _as_dict(row: sqlite3.Row) -> Dict:
+        record = dict(row)
+        record["inputs"] = json.loads(record["inputs"])
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
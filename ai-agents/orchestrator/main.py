@@ -5,18 +5,46 @@ Soporta Terraform, OpenTofu, Terragrunt con optimización IA
 """
 
 import json
+import os
 import subprocess
 import datetime
+import sys
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Sequence, Tuple, Union
 from pathlib import Path
 
+# Componentes compartidos con orchestration/multi-tool-runner.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "orchestration"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "pricing"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pricing_catalog import DEFAULT_REGION, load_catalog
+from sizing import SizingEngine, WorkloadRequirements
+
+# Los componentes de ejecución (ledger SQLite, caches, state) se importan al
+# usarse: el análisis, ``--help`` y el cliente del daemon no los necesitan
+if TYPE_CHECKING:
+    from init_cache import InitCache
+    from ledger import DeploymentLedger
+    from plan_artifacts import PlanArtifactStore
+    from plan_changes import ChangeIndex
+    from rate_limit import RateLimitPool
+    from state_inventory import StateDiff
+    from tool_probe import ToolProbeCache
+
+CACHE_DIR = Path(os.environ.get("AKS_IAC_CACHE_DIR", Path.home() / ".cache" / "aks-iac"))
+
+# Código de salida de ``plan -detailed-exitcode`` cuando hay cambios
+PLAN_HAS_CHANGES = 2
+
 @dataclass
 class DeploymentContext:
     tool: str  # terraform, tofu, terragrunt
     environment: str
     project_name: str
     subscription_id: str
+    requirements: Optional[WorkloadRequirements] = None  # vCPU/memoria/pods del workload
     
 @dataclass
 class AIRecommendation:
@@ -26,19 +54,63 @@ class AIRecommendation:
     estimated_cost: float
     confidence: float
 
+# Lista de contextos o tabla columnar {"environment": [...], "project_name": [...], ...}
+ContextBatch = Union[Sequence[DeploymentContext], Mapping[str, Sequence]]
+
 class AIOrchestrator:
-    def __init__(self, project_root: str):
+    def __init__(self, project_root: str, price_sheet: Optional[str] = None,
+                 region: str = DEFAULT_REGION, now: Optional[datetime.datetime] = None,
+                 ledger_path: Optional[str] = None, remote_state_diff: bool = False):
         self.project_root = Path(project_root)
-        self.current_hour = datetime.datetime.now().hour
+        self.current_hour = (now or datetime.datetime.now()).hour
+        self.pricing = load_catalog(price_sheet)
+        self.region = region
+        self._sizing: Optional[SizingEngine] = None
+        self.ledger_path = Path(ledger_path) if ledger_path else CACHE_DIR / "ledger.sqlite"
+        # Con backend remoto el diff del state cuesta dos ``show -json`` por apply
+        self.remote_state_diff = remote_state_diff
+    
+    @cached_property
+    def init_cache(self) -> "InitCache":
+        from init_cache import InitCache
+        return InitCache(CACHE_DIR)
+    
+    @cached_property
+    def plan_artifacts(self) -> "PlanArtifactStore":
+        from plan_artifacts import PlanArtifactStore
+        return PlanArtifactStore(CACHE_DIR)
+    
+    @cached_property
+    def tool_probe(self) -> "ToolProbeCache":
+        from tool_probe import ToolProbeCache
+        return ToolProbeCache(CACHE_DIR / "tool-probe.json")
+    
+    @cached_property
+    def rate_limiter(self) -> "RateLimitPool":
+        """Pool del proceso: los workers del daemon reparten los mismos buckets de ARM"""
+        from rate_limit import shared_pool
+        return shared_pool()
+    
+    @cached_property
+    def ledger(self) -> "DeploymentLedger":
+        from ledger import DeploymentLedger
+        return DeploymentLedger(self.ledger_path)
+        
+    def analyze_context(self, context: DeploymentContext,
+                        at: Optional[datetime.datetime] = None) -> AIRecommendation:
+        """Análisis IA del contexto de despliegue
         
-    def analyze_context(self, context: DeploymentContext) -> AIRecommendation:
-        """Análisis IA del contexto de despliegue"""
+        ``at`` fija el momento de evaluación (por defecto, el de creación del
+        orquestador) para que el resultado sea reproducible.
+        """
+        
+        hour = at.hour if at is not None else self.current_hour
         
         # AI Logic: Selección de herramienta
         tool_selection = self._select_optimal_tool(context)
         
         # AI Logic: Optimización de recursos
-        vm_size, node_count = self._optimize_resources(context)
+        vm_size, node_count = self._optimize_resources(context, hour)
         
         # AI Logic: Predicción de costos
         estimated_cost = self._predict_cost(vm_size, node_count)
@@ -51,6 +123,53 @@ class AIOrchestrator:
             confidence=0.85
         )
     
+    def analyze_contexts(self, contexts: ContextBatch,
+                         at: Optional[datetime.datetime] = None) -> List[AIRecommendation]:
+        """Análisis IA de una flota de contextos en una sola pasada
+        
+        Acepta una lista de DeploymentContext o una tabla columnar con al
+        menos la columna ``environment``. Herramienta y sizing dependen solo
+        del entorno y de la franja horaria, así que se calculan una vez por
+        entorno distinto; el coste de todos los contextos se obtiene con una
+        única llamada al catálogo de precios. Coste lineal en el número de
+        contextos.
+        """
+        
+        environments = self._column(contexts, "environment")
+        requirements = self._column(contexts, "requirements")
+        keys = list(zip(environments, requirements))
+        hour = at.hour if at is not None else self.current_hour
+        
+        plans: Dict[Tuple[str, Optional[WorkloadRequirements]], Tuple[str, str, int]] = {}
+        for environment, workload in set(keys):
+            context = DeploymentContext(tool="", environment=environment, project_name="",
+                                        subscription_id="", requirements=workload)
+            vm_size, node_count = self._optimize_resources(context, hour)
+            plans[(environment, workload)] = (self._select_optimal_tool(context), vm_size, node_count)
+        
+        rows = [plans[key] for key in keys]
+        costs = self.pricing.monthly_costs([row[1] for row in rows], [row[2] for row in rows],
+                                           self.region)
+        
+        return [
+            AIRecommendation(
+                tool_selection=tool_selection,
+                vm_size=vm_size,
+                node_count=node_count,
+                estimated_cost=cost,
+                confidence=0.85
+            )
+            for (tool_selection, vm_size, node_count), cost in zip(rows, costs)
+        ]
+    
+    @staticmethod
+    def _column(contexts: ContextBatch, name: str) -> List:
+        if isinstance(contexts, Mapping):
+            if name not in contexts:
+                return [None] * len(contexts["environment"])
+            return list(contexts[name])
+        return [getattr(context, name) for context in contexts]
+    
     def _select_optimal_tool(self, context: DeploymentContext) -> str:
         """IA selecciona la mejor herramienta según contexto"""
         
@@ -62,10 +181,23 @@ class AIOrchestrator:
         else:
             return "terragrunt"  # Enterprise features para prod
     
-    def _optimize_resources(self, context: DeploymentContext) -> tuple:
-        """IA optimiza recursos según patrones"""
+    def _optimize_resources(self, context: DeploymentContext, hour: Optional[int] = None) -> tuple:
+        """IA optimiza recursos según patrones
         
-        is_off_hours = self.current_hour < 9 or self.current_hour > 18
+        Con ``context.requirements`` se busca la SKU y el número de nodos más
+        baratos que los cumplen; sin requisitos se usan los perfiles por
+        entorno y franja horaria.
+        """
+        
+        if context.requirements is not None:
+            if self._sizing is None:
+                self._sizing = SizingEngine(self.pricing, region=self.region)
+            best = self._sizing.search(context.requirements).best
+            if best is not None:
+                return best.vm_size, best.node_count
+        
+        hour = self.current_hour if hour is None else hour
+        is_off_hours = hour < 9 or hour > 18
         
         if context.environment == "dev":
             if is_off_hours:
@@ -76,19 +208,18 @@ class AIOrchestrator:
             return "Standard_D2_v2", 2  # Producción
     
     def _predict_cost(self, vm_size: str, node_count: int) -> float:
-        """IA predice costos mensuales"""
-        
-        cost_map = {
-            "Standard_B1s": 15.0,
-            "Standard_B2s": 30.0,
-            "Standard_D2_v2": 70.0
-        }
+        """IA predice costos mensuales (catálogo de precios por SKU y región)"""
         
-        base_cost = cost_map.get(vm_size, 30.0)
-        return base_cost * node_count
+        return self.pricing.monthly_cost(vm_size, node_count, self.region)
     
     def execute_deployment(self, context: DeploymentContext, recommendation: AIRecommendation) -> Dict:
-        """Ejecuta despliegue con recomendaciones IA"""
+        """Ejecuta despliegue con recomendaciones IA
+        
+        Cada ejecución queda registrada en el ledger. Si ya hay una en vuelo
+        con la misma huella de inputs, se espera a que termine y se devuelve
+        su resultado (``deduplicated: True``) en lugar de aplicar dos veces.
+        """
+        from ledger import deployment_fingerprint
         
         env_dir = self.project_root / "environments" / context.environment
         
@@ -100,79 +231,265 @@ class AIOrchestrator:
             "vm_size": recommendation.vm_size
         }
         
+        tool = recommendation.tool_selection
+        fingerprint = deployment_fingerprint(tool, context.environment, context.project_name,
+                                             tf_vars, env_dir)
+        
+        while True:
+            deployment_id, owner = self.ledger.begin(fingerprint, context.environment,
+                                                     context.project_name, tool, tf_vars)
+            if owner:
+                break
+            shared = self.ledger.wait(deployment_id)
+            if shared is not None:
+                return {**shared["result"], "deployment_id": deployment_id, "deduplicated": True}
+            # El proceso dueño murió sin terminar: reintentar como dueño
+        
+        try:
+            result = self._deploy(context, recommendation, env_dir, tf_vars)
+        except Exception as e:
+            self.ledger.finish(deployment_id, "failed", {"status": "failed", "error": str(e)})
+            raise
+        
+        self.ledger.finish(deployment_id, result["status"], result)
+        return {**result, "deployment_id": deployment_id, "deduplicated": False}
+    
+    def _deploy(self, context: DeploymentContext, recommendation: AIRecommendation,
+                env_dir: Path, tf_vars: Dict) -> Dict:
+        from plan_changes import ChangeIndex
+        
         # Ejecutar con herramienta seleccionada
-        result = self._run_iac_tool(
+        result, status, state_changes = self._run_iac_tool(
             tool=recommendation.tool_selection,
             working_dir=env_dir,
-            variables=tf_vars
+            variables=tf_vars,
+            environment=context.environment
         )
         
-        return {
-            "status": "success" if result.returncode == 0 else "failed",
+        changes = ChangeIndex.from_lines(result.stdout.splitlines())
+        
+        deployment = {
+            "status": status,
             "tool_used": recommendation.tool_selection,
-            "resources_created": self._extract_resources(result.stdout),
+            "resources_created": self._extract_resources(result.stdout, changes, state_changes),
+            "changes": changes.counts(),
             "estimated_cost": recommendation.estimated_cost,
             "actual_config": {
                 "vm_size": recommendation.vm_size,
                 "node_count": recommendation.node_count
             }
         }
+        if state_changes is not None:
+            deployment["state_changes"] = {
+                "added": [resource.address for resource in state_changes.added],
+                "changed": [resource.address for resource in state_changes.changed],
+                "removed": [resource.address for resource in state_changes.removed],
+            }
+        return deployment
+    
+    def _run_iac_tool(self, tool: str, working_dir: Path, variables: Dict,
+                      environment: str = ""
+                      ) -> Tuple[subprocess.CompletedProcess, str, Optional["StateDiff"]]:
+        """Ejecuta herramienta IaC seleccionada
+        
+        Devuelve el resultado del último proceso, el estado (``success``,
+        ``failed`` o ``unchanged``) y el diff del state antes/después del
+        apply (None si no hubo apply o el state no se pudo leer). Antes de
+        aplicar se ejecuta ``plan -detailed-exitcode``: si no hay cambios no se hace apply, y
+        el veredicto se recuerda por huella de inputs + serial del state
+        para que las siguientes reconciliaciones idénticas no ejecuten nada.
+        """
+        from var_files import var_file
+        
+        environment = environment or working_dir.name
+        env = self.init_cache.tool_env()
+        
+        def run(cmd: List[str]) -> subprocess.CompletedProcess:
+            return subprocess.run(cmd, cwd=working_dir, env=env, capture_output=True, text=True)
+        
+        if tool not in ("terraform", "tofu", "terragrunt"):
+            raise ValueError(f"Unsupported tool: {tool}")
+        
+        # Terragrunt hace su propio init
+        if tool != "terragrunt":
+            tool_version = self.tool_probe.probe([tool])[tool].get("version", "")
+            if not self.init_cache.is_fresh(tool, working_dir, version=tool_version):
+                init_result = run([tool, "init", "-input=false"])
+                if init_result.returncode != 0:
+                    return init_result, "failed", None
+                self.init_cache.record(tool, working_dir, version=tool_version)
+        
+        # Variables tipadas en un .auto.tfvars.json (antes de la huella: forma parte de los inputs);
+        # solo existe mientras dura el plan/apply
+        with var_file(working_dir, variables):
+            return self._plan_and_apply(run, tool, working_dir, variables, environment, env)
     
-    def _run_iac_tool(self, tool: str, working_dir: Path, variables: Dict) -> subprocess.CompletedProcess:
-        """Ejecuta herramienta IaC seleccionada"""
+    def _plan_and_apply(self, run, tool: str, working_dir: Path, variables: Dict,
+                        environment: str, env: Dict[str, str]
+                        ) -> Tuple[subprocess.CompletedProcess, str, Optional["StateDiff"]]:
+        """Plan ``-detailed-exitcode`` y apply del plan guardado (ver ``_run_iac_tool``)"""
+        from plan_artifacts import state_serial
+        from state_inventory import StateTracker
+        
+        serial = state_serial(tool, working_dir, env)
+        key = self._plan_key(tool, working_dir, variables, serial)
+        if key and self.plan_artifacts.is_unchanged(environment, key):
+            return subprocess.CompletedProcess([tool, "plan"], 0,
+                                               "No changes (input fingerprint and state serial unchanged).\n",
+                                               ""), "unchanged", None
         
-        # Cambiar al directorio de trabajo
-        original_cwd = Path.cwd()
+        artifact = self.plan_artifacts.reserve(environment, key or "unkeyed")
+        plan_result = self._run_arm(run, [tool, "plan", "-input=false", "-detailed-exitcode",
+                                          f"-out={artifact}"], environment, variables)
         
+        if plan_result.returncode == 0:
+            self.plan_artifacts.discard(artifact)
+            if key:
+                self.plan_artifacts.mark_unchanged(environment, key)
+            return plan_result, "unchanged", None
+        if plan_result.returncode != PLAN_HAS_CHANGES:
+            self.plan_artifacts.discard(artifact)
+            return plan_result, "failed", None
+        
+        # Se aplica exactamente el plan revisado (ya lleva variables)
+        tracker = StateTracker(tool, working_dir, env, remote=self.remote_state_diff)
+        tracker.begin(serial)
         try:
-            import os
-            os.chdir(working_dir)
-            
-            # Comandos según herramienta
-            if tool == "terraform":
-                cmd = ["terraform", "init"]
-                subprocess.run(cmd, check=True)
-                
-                cmd = ["terraform", "apply", "-auto-approve"]
-                for key, value in variables.items():
-                    cmd.extend(["-var", f"{key}={value}"])
-                    
-            elif tool == "tofu":
-                cmd = ["tofu", "init"]
-                subprocess.run(cmd, check=True)
-                
-                cmd = ["tofu", "apply", "-auto-approve"]
-                for key, value in variables.items():
-                    cmd.extend(["-var", f"{key}={value}"])
-                    
-            elif tool == "terragrunt":
-                cmd = ["terragrunt", "apply", "-auto-approve"]
-                
-            return subprocess.run(cmd, capture_output=True, text=True)
-            
+            # Sin reintento: tras un apply parcial el plan guardado queda obsoleto
+            apply_result = self._run_arm(run, [tool, "apply", "-input=false", "-json", str(artifact)],
+                                         environment, variables, retries=0)
         finally:
-            os.chdir(original_cwd)
+            self.plan_artifacts.discard(artifact)
+        if apply_result.returncode != 0:
+            return apply_result, "failed", None
+        
+        return apply_result, "success", tracker.finish()
     
-    def _extract_resources(self, output: str) -> List[str]:
-        """Extrae recursos creados del output"""
+    def _run_arm(self, run, cmd: List[str], environment: str, variables: Dict,
+                 retries: Optional[int] = None) -> subprocess.CompletedProcess:
+        """Ejecuta una fase que habla con ARM con permiso del pool de rate limit
+        
+        El permiso es de la suscripción y la región del despliegue; si el
+        output muestra throttling el pool aplica el backoff y la fase se
+        repite (hasta ``retries`` veces) cuando vuelve a haber permiso.
+        """
+        from rate_limit import THROTTLE_RETRIES, with_parallelism
+        
+        scope = (str(variables.get("subscription_id", "")), self.region)
+        retries = THROTTLE_RETRIES if retries is None else retries
+        for attempt in range(retries + 1):
+            with self.rate_limiter.acquire(environment, *scope) as permit:
+                result = run(with_parallelism(cmd, self.rate_limiter.parallelism(*scope)))
+                for line in (result.stderr + result.stdout).splitlines() if permit.keys else ():
+                    if permit.observe(line):
+                        break
+            if result.returncode in (0, PLAN_HAS_CHANGES) or not permit.throttled:
+                break
+        return result
+    
+    def _plan_key(self, tool: str, working_dir: Path, variables: Dict,
+                  serial: str) -> Optional[str]:
+        """Huella de herramienta, configuración, variables y serial del state
+        
+        Sin state todavía (primer despliegue) no hay huella: siempre se planifica.
+        """
+        if not serial:
+            return None
+        tool_version = self.tool_probe.probe([tool])[tool].get("version", "")
+        return self.plan_artifacts.key(tool, tool_version, working_dir, variables, serial)
+    
+    def _extract_resources(self, output: str, changes: Optional["ChangeIndex"] = None,
+                           state_changes: Optional["StateDiff"] = None) -> List[str]:
+        """Extrae recursos creados
+        
+        Con el diff del state se listan los recursos reales que aparecieron;
+        si no, los registros tipados de la salida ``-json`` y, como último
+        respaldo, el escaneo de texto para versiones sin soporte de ``-json``.
+        """
+        if state_changes is not None:
+            return [resource.address for resource in state_changes.added]
+        if changes is None:
+            from plan_changes import ChangeIndex
+            changes = ChangeIndex.from_lines(output.splitlines())
+        if len(changes):
+            return [record.address for record in changes.by_action("create")]
+        
         resources = []
         for line in output.split('\n'):
             if 'created' in line and 'azurerm_' in line:
                 resources.append(line.strip())
         return resources
 
+DEFAULT_PROJECT_ROOT = os.environ.get("AKS_IAC_PROJECT_ROOT", "/home/giovanemere/edtech/azure-aks-iac")
+DEFAULT_SUBSCRIPTION = "617fad55-504d-42d2-ba0e-267e8472a399"
+
+def _run_daemon(argv: List[str]):
+    """Modo daemon: API local + cola persistente, sin confirmaciones"""
+    import argparse
+    import dataclasses
+    from daemon import JobQueue, OrchestratorDaemon, serve
+    
+    parser = argparse.ArgumentParser(prog="main.py daemon",
+                                     description="AI Orchestrator en modo daemon")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--socket", help="Escuchar en un socket Unix en lugar de TCP")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Despliegues simultáneos como máximo (uno por entorno)")
+    parser.add_argument("--queue", default=str(CACHE_DIR / "daemon-queue.sqlite"),
+                        help="Fichero SQLite de la cola persistente")
+    parser.add_argument("--project-root", default=DEFAULT_PROJECT_ROOT)
+    parser.add_argument("--remote-state-diff", action="store_true",
+                        help="Leer el state remoto antes/después de apply para listar los cambios")
+    args = parser.parse_args(argv)
+    
+    orchestrator = AIOrchestrator(args.project_root, remote_state_diff=args.remote_state_diff)
+    
+    def deploy(job: Dict) -> Dict:
+        context = DeploymentContext(
+            tool=job["tool"],
+            environment=job["environment"],
+            project_name=job["project_name"],
+            subscription_id=job["subscription_id"] or DEFAULT_SUBSCRIPTION
+        )
+        recommendation = orchestrator.analyze_context(context, at=datetime.datetime.now())
+        if job["tool"]:
+            # La herramienta pedida explícitamente manda sobre la elegida por entorno
+            recommendation = dataclasses.replace(recommendation, tool_selection=job["tool"])
+        return orchestrator.execute_deployment(context, recommendation)
+    
+    try:
+        queue = JobQueue(Path(args.queue))
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    serve(OrchestratorDaemon(queue, deploy, workers=args.workers),
+          host=args.host, port=args.port, socket_path=args.socket)
+
 def main():
     """Punto de entrada del AI Orchestrator"""
-    import sys
+    import argparse
     
-    if len(sys.argv) < 4:
-        print("Uso: python orchestrator.py <tool> <environment> <project_name>")
-        sys.exit(1)
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        _run_daemon(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(
+        description="AI Orchestrator (usar 'main.py daemon --help' para el modo daemon)")
+    parser.add_argument("tool", help="terraform | tofu | terragrunt")
+    parser.add_argument("environment")
+    parser.add_argument("project_name")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="Desplegar sin pedir confirmación")
+    parser.add_argument("--project-root", default=DEFAULT_PROJECT_ROOT)
+    parser.add_argument("--remote-state-diff", action="store_true",
+                        help="Leer el state remoto antes/después de apply para listar los cambios")
+    args = parser.parse_args()
     
-    tool = sys.argv[1]
-    environment = sys.argv[2] 
-    project_name = sys.argv[3]
-    subscription_id = "617fad55-504d-42d2-ba0e-267e8472a399"
+    tool = args.tool
+    environment = args.environment
+    project_name = args.project_name
+    subscription_id = DEFAULT_SUBSCRIPTION
     
     # Crear contexto
     context = DeploymentContext(
@@ -183,7 +500,7 @@ def main():
     )
     
     # Inicializar AI Orchestrator
-    orchestrator = AIOrchestrator("/home/giovanemere/edtech/azure-aks-iac")
+    orchestrator = AIOrchestrator(args.project_root, remote_state_diff=args.remote_state_diff)
     
     # Análisis IA
     print("🤖 AI Orchestrator - Analizando contexto...")
@@ -197,10 +514,11 @@ def main():
     print(f"   Confidence: {recommendation.confidence:.0%}")
     
     # Confirmar despliegue
-    confirm = input("\n¿Proceder con despliegue IA? (y/N): ")
-    if confirm.lower() != 'y':
-        print("❌ Despliegue cancelado")
-        return
+    if not args.yes:
+        confirm = input("\n¿Proceder con despliegue IA? (y/N): ")
+        if confirm.lower() != 'y':
+            print("❌ Despliegue cancelado")
+            return
     
     # Ejecutar despliegue
     print("🚀 Ejecutando despliegue con IA...")
@@ -210,6 +528,8 @@ def main():
     print(f"   Status: {result['status']}")
     print(f"   Tool usado: {result['tool_used']}")
     print(f"   Costo estimado: ${result['estimated_cost']}/month")
+    if result.get("deduplicated"):
+        print(f"   ♻️  Resultado compartido con la ejecución en curso #{result['deployment_id']}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Pricing Catalog - Catálogo indexado de precios de VM de Azure
+
+Carga un export de precios (CSV de la Azure Retail Prices API o de un
+price sheet de EA/MCA) en una matriz densa SKU × región × tier respaldada
+por ``array('d')``. La primera carga escribe un snapshot binario junto al
+cache; las siguientes lo abren con ``mmap`` sin volver a parsear el CSV,
+y el snapshot se regenera solo cuando el CSV cambia.
+
+Sin price sheet se usa el catálogo mínimo histórico (tres SKUs y $30 por
+defecto), así que los agentes funcionan igual que antes.
+"""
+
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+HOURS_PER_MONTH = 730.0
+DEFAULT_REGION = "eastus"
+DEFAULT_TIER = "payg"
+FALLBACK_MONTHLY = 30.0
+
+# Por debajo de este tamaño de lote no compensa importar numpy (~100ms en frío)
+NUMPY_MIN_BATCH = 256
+
+_numpy_module = None
+_numpy_checked = False
+
+
+def optional_numpy():
+    """numpy si está instalado, importado la primera vez que se pide (None si no)"""
+    global _numpy_module, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+        except ImportError:  # numpy es opcional: hay fallback en Python puro
+            numpy = None
+        _numpy_module, _numpy_checked = numpy, True
+    return _numpy_module
+
+# Catálogo mínimo (USD/mes por nodo) usado cuando no hay price sheet
+BUILTIN_MONTHLY = {
+    "Standard_B1s": 15.0,
+    "Standard_B2s": 30.0,
+    "Standard_D2_v2": 70.0,
+}
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("AKS_IAC_CACHE_DIR",
+                                        Path.home() / ".cache" / "aks-iac"))
+DEFAULT_PRICE_SHEET = os.environ.get("AKS_IAC_PRICE_SHEET",
+                                     str(DEFAULT_CACHE_DIR / "pricing" / "price-sheet.csv"))
+
+_MAGIC = b"AKSPRC01"
+_HEADER = struct.Struct("<8sQ")  # magic, longitud del índice JSON
+
+# Alias de columnas entre los distintos formatos de export
+_COLUMNS = {
+    "sku": ("armSkuName", "ArmSkuName", "sku", "vm_size"),
+    "region": ("armRegionName", "ArmRegionName", "region", "location"),
+    "price": ("unitPrice", "UnitPrice", "retailPrice", "price"),
+    "unit": ("unitOfMeasure", "UnitOfMeasure", "unit"),
+    "price_type": ("type", "priceType", "PriceType", "tier"),
+    "term": ("reservationTerm", "ReservationTerm", "term"),
+    "sku_name": ("skuName", "SkuName", "meterName"),
+    "product": ("productName", "ProductName"),
+}
+
+
+def normalize_region(region: str) -> str:
+    """"East US" / "east-us" / "eastus" -> "eastus" """
+    return "".join(ch for ch in region.lower() if ch.isalnum())
+
+
+def _tier(row: Dict[str, str]) -> str:
+    sku_name = row.get("sku_name", "")
+    if "Spot" in sku_name:
+        return "spot"
+    if "Low Priority" in sku_name:
+        return "low_priority"
+    price_type = row.get("price_type", "").lower()
+    if price_type == "reservation":
+        term = row.get("term", "").split()[0] if row.get("term") else ""
+        return f"reserved_{term}y" if term else "reserved"
+    if price_type.startswith("devtest"):
+        return "devtest"
+    return price_type if price_type and price_type != "consumption" else DEFAULT_TIER
+
+
+def _monthly(price: float, unit: str, tier: str, term: str) -> float:
+    unit = unit.lower()
+    if tier.startswith("reserved"):
+        # Las reservas se publican como precio total del plazo
+        years = float(term.split()[0]) if term else 1.0
+        return price / (12 * years)
+    if "hour" in unit:
+        hours = float(unit.split()[0]) if unit.split()[0].isdigit() else 1.0
+        return price / hours * HOURS_PER_MONTH
+    if "month" in unit:
+        return price
+    if "day" in unit:
+        return price * HOURS_PER_MONTH / 24
+    return price * HOURS_PER_MONTH
+
+
+class PricingCatalog:
+    """Matriz densa de precios mensuales (USD por nodo) con lookups O(1)"""
+
+    def __init__(self, skus: Sequence[str], regions: Sequence[str], tiers: Sequence[str],
+                 prices, source: str = "builtin", default: float = FALLBACK_MONTHLY,
+                 any_region: bool = False):
+        self.skus = list(skus)
+        self.regions = list(regions)
+        self.tiers = list(tiers)
+        self.sku_index = {name: i for i, name in enumerate(self.skus)}
+        self.region_index = {name: i for i, name in enumerate(self.regions)}
+        self.tier_index = {name: i for i, name in enumerate(self.tiers)}
+        self.prices = prices  # array('d') o memoryview('d'); NaN = sin precio
+        self.source = source
+        self.default = default
+        self.any_region = any_region  # catálogo integrado: mismo precio en toda región/tier
+        self._stride_sku = len(self.regions) * len(self.tiers)
+        self._stride_region = len(self.tiers)
+        self._np_prices = None
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    def _offset(self, sku: str, region: str, tier: str) -> Optional[int]:
+        s = self.sku_index.get(sku)
+        r = self.region_index.get(normalize_region(region))
+        t = self.tier_index.get(tier)
+        if self.any_region:
+            r, t = 0, 0
+        if s is None or r is None or t is None:
+            return None
+        return s * self._stride_sku + r * self._stride_region + t
+
+    def price(self, sku: str, region: str = DEFAULT_REGION, tier: str = DEFAULT_TIER) -> Optional[float]:
+        """Precio mensual por nodo, o None si el catálogo no lo tiene"""
+        offset = self._offset(sku, region, tier)
+        if offset is None:
+            return None
+        value = self.prices[offset]
+        return None if value != value else value  # NaN -> None
+
+    def monthly_cost(self, sku: str, node_count: int = 1,
+                     region: str = DEFAULT_REGION, tier: str = DEFAULT_TIER) -> float:
+        price = self.price(sku, region, tier)
+        return (self.default if price is None else price) * node_count
+
+    def monthly_costs(self, skus: Sequence[str], node_counts: Sequence[float],
+                      regions=DEFAULT_REGION, tiers=DEFAULT_TIER) -> List[float]:
+        """Coste mensual de muchas combinaciones SKU/nodos en una sola llamada
+
+        ``regions`` y ``tiers`` pueden ser un valor único o una secuencia
+        alineada con ``skus``. Las combinaciones sin precio usan ``default``.
+        """
+        n = len(skus)
+        regions = [regions] * n if isinstance(regions, str) else regions
+        tiers = [tiers] * n if isinstance(tiers, str) else tiers
+
+        # Interning: cada SKU/región/tier distinto se resuelve una sola vez
+        offsets = []
+        memo: Dict[Tuple[str, str, str], int] = {}
+        for key in zip(skus, regions, tiers):
+            offset = memo.get(key)
+            if offset is None:
+                found = self._offset(*key)
+                offset = memo[key] = -1 if found is None else found
+            offsets.append(offset)
+
+        np = optional_numpy() if n >= NUMPY_MIN_BATCH else None
+        if np is not None:
+            if self._np_prices is None:
+                self._np_prices = np.append(np.frombuffer(self.prices, dtype=np.float64), np.nan)
+            unit = self._np_prices[np.asarray(offsets, dtype=np.int64)]  # -1 -> NaN final
+            unit = np.where(np.isnan(unit), self.default, unit)
+            return (unit * np.asarray(node_counts, dtype=np.float64)).tolist()
+
+        prices, default = self.prices, self.default
+        costs = []
+        for offset, count in zip(offsets, node_counts):
+            value = prices[offset] if offset >= 0 else default
+            costs.append((default if value != value else value) * count)
+        return costs
+
+    def cheapest(self, skus: Iterable[str], region: str = DEFAULT_REGION,
+                 tier: str = DEFAULT_TIER) -> Optional[Tuple[str, float]]:
+        priced = [(sku, self.price(sku, region, tier)) for sku in skus]
+        priced = [(sku, price) for sku, price in priced if price is not None]
+        return min(priced, key=lambda item: item[1]) if priced else None
+
+    # --- construcción -------------------------------------------------
+
+    @classmethod
+    def builtin(cls) -> "PricingCatalog":
+        skus = list(BUILTIN_MONTHLY)
+        return cls(skus, [DEFAULT_REGION], [DEFAULT_TIER],
+                   array("d", (BUILTIN_MONTHLY[sku] for sku in skus)), any_region=True)
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "PricingCatalog":
+        """Parsea un export de precios (solo VMs Linux; Windows se ignora)"""
+        rows: Dict[Tuple[str, str, str], float] = {}
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames or []
+            columns = {key: next((c for c in aliases if c in fields), None)
+                       for key, aliases in _COLUMNS.items()}
+            if not (columns["sku"] and columns["price"]):
+                raise ValueError(f"{path}: faltan columnas de SKU o precio ({', '.join(fields)})")
+
+            for raw in reader:
+                row = {key: raw.get(column) or "" for key, column in columns.items() if column}
+                if "Windows" in row.get("product", "") or not row["sku"]:
+                    continue
+                try:
+                    price = float(row["price"])
+                except ValueError:
+                    continue
+                tier = _tier(row)
+                region = normalize_region(row.get("region") or DEFAULT_REGION)
+                monthly = _monthly(price, row.get("unit", "1 Hour"), tier, row.get("term", ""))
+                key = (row["sku"], region, tier)
+                # Con varios meters para la misma clave nos quedamos con el más barato
+                if key not in rows or monthly < rows[key]:
+                    rows[key] = monthly
+
+        skus = sorted({key[0] for key in rows})
+        regions = sorted({key[1] for key in rows})
+        tiers = sorted({key[2] for key in rows})
+        catalog = cls(skus, regions, tiers,
+                      array("d", [float("nan")]) * (len(skus) * len(regions) * len(tiers)),
+                      source=str(path))
+        for key, monthly in rows.items():
+            catalog.prices[catalog._offset(*key)] = monthly
+        return catalog
+
+    # --- snapshot binario ---------------------------------------------
+
+    def write_snapshot(self, path: Path, fingerprint: Dict):
+        index = json.dumps({"fingerprint": fingerprint, "source": self.source,
+                            "skus": self.skus, "regions": self.regions,
+                            "tiers": self.tiers}).encode()
+        padding = (-(_HEADER.size + len(index))) % 8  # floats alineados a 8 bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(index) + padding))
+            f.write(index + b" " * padding)
+            prices = self.prices if isinstance(self.prices, array) else array("d", self.prices)
+            if sys.byteorder != "little":
+                prices = array("d", prices)
+                prices.byteswap()
+            f.write(prices.tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def open_snapshot(cls, path: Path, fingerprint: Dict) -> Optional["PricingCatalog"]:
+        """Abre el snapshot con mmap si corresponde al CSV actual (None si no)"""
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            magic, index_size = _HEADER.unpack_from(mapped, 0)
+            if magic != _MAGIC:
+                raise ValueError("magic")
+            index = json.loads(bytes(mapped[_HEADER.size:_HEADER.size + index_size]))
+            if index["fingerprint"] != fingerprint:
+                raise ValueError("stale")
+            start = _HEADER.size + index_size
+            prices = memoryview(mapped)[start:].cast("d")
+            if len(prices) != len(index["skus"]) * len(index["regions"]) * len(index["tiers"]):
+                raise ValueError("size")
+        except (ValueError, KeyError, struct.error):
+            mapped.close()
+            return None
+        if sys.byteorder != "little":
+            prices = array("d", prices)
+            prices.byteswap()
+        return cls(index["skus"], index["regions"], index["tiers"], prices, source=index["source"])
+
+
+def _fingerprint(price_sheet: Path) -> Dict:
+    stat = price_sheet.stat()
+    return {"path": str(price_sheet.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+_loaded: Dict[str, PricingCatalog] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_catalog(price_sheet: Optional[str] = None,
+                 cache_dir: Optional[str] = None) -> PricingCatalog:
+    """Catálogo del price sheet (snapshot mmap si está vigente) o el mínimo integrado
+
+    El resultado se memoiza por proceso; si el CSV cambia en disco se
+    vuelve a cargar y se regenera el snapshot.
+    """
+    sheet = Path(price_sheet or DEFAULT_PRICE_SHEET)
+    if not sheet.exists():
+        return _loaded.setdefault("builtin", PricingCatalog.builtin())
+
+    fingerprint = _fingerprint(sheet)
+    memo_key = json.dumps(fingerprint, sort_keys=True)
+    with _loaded_lock:
+        catalog = _loaded.get(memo_key)
+        if catalog is not None:
+            return catalog
+
+        snapshot = Path(cache_dir or DEFAULT_CACHE_DIR) / "pricing" / f"{sheet.stem}.catalog"
+        catalog = PricingCatalog.open_snapshot(snapshot, fingerprint)
+        if catalog is None:
+            catalog = PricingCatalog.from_csv(sheet)
+            catalog.write_snapshot(snapshot, fingerprint)
+        _loaded[memo_key] = catalog
+        return catalog
+
+
+def main():
+    """Consultar el catálogo de precios"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consulta de precios mensuales de VM")
+    parser.add_argument("skus", nargs="*", help="SKUs a consultar (Standard_D4s_v5 ...)")
+    parser.add_argument("--price-sheet", help="CSV exportado de precios (AKS_IAC_PRICE_SHEET)")
+    parser.add_argument("--region", default=DEFAULT_REGION)
+    parser.add_argument("--tier", default=DEFAULT_TIER,
+                        help="payg | spot | low_priority | reserved_1y | reserved_3y | devtest")
+    parser.add_argument("--nodes", type=int, default=1)
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.price_sheet)
+    print(f"💲 Catálogo: {catalog.source} ({len(catalog.skus)} SKUs, "
+          f"{len(catalog.regions)} regiones, tiers: {', '.join(catalog.tiers)})")
+    costs = catalog.monthly_costs(args.skus, [args.nodes] * len(args.skus), args.region, args.tier)
+    for sku, cost in zip(args.skus, costs):
+        known = "" if catalog.price(sku, args.region, args.tier) is not None else " (precio por defecto)"
+        print(f"   {sku:24s} x{args.nodes}: ${cost:,.2f}/mes{known}")
+
+
+if __name__ == "__main__":
+    main()
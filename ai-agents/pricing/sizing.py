@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Sizing - Búsqueda del node pool más barato que cumple unos requisitos
+
+Dado un workload (vCPU, memoria, pods y mínimo de nodos para HA) evalúa
+todo el espacio SKU × número de nodos con la capacidad *allocatable* de
+cada nodo (descontando lo que reserva AKS) y el precio del catálogo. El
+resultado es la opción más barata y el frente de Pareto coste/holgura.
+
+El mínimo de nodos de cada SKU se obtiene en forma cerrada, así que el
+coste no depende de max_nodes. Con tablas grandes (un export de ``az vm
+list-skus``, NUMPY_MIN_BATCH SKUs o más) se vectoriza con numpy si está
+instalado; la tabla integrada (~30 SKUs) va en Python puro porque
+importar numpy costaría más que el cálculo.
+"""
+
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pricing_catalog import (DEFAULT_REGION, DEFAULT_TIER, NUMPY_MIN_BATCH, PricingCatalog,
+                             load_catalog, optional_numpy)
+
+DEFAULT_MAX_PODS = 30  # max-pods por defecto de AKS con kubenet/Azure CNI
+
+# Por debajo de este número de SKUs con precio la búsqueda apenas compara nada
+# (el catálogo integrado solo tiene tres)
+MIN_PRICED_SKUS = 10
+
+# SKUs habituales en node pools de AKS: (vCPU, memoria GiB)
+BUILTIN_SKUS: Dict[str, Tuple[int, float]] = {
+    "Standard_B1s": (1, 1), "Standard_B1ms": (1, 2), "Standard_B2s": (2, 4),
+    "Standard_B2ms": (2, 8), "Standard_B4ms": (4, 16), "Standard_B8ms": (8, 32),
+    "Standard_D2_v2": (2, 7), "Standard_D3_v2": (4, 14), "Standard_D4_v2": (8, 28),
+    "Standard_D2s_v3": (2, 8), "Standard_D4s_v3": (4, 16), "Standard_D8s_v3": (8, 32),
+    "Standard_D16s_v3": (16, 64), "Standard_D2s_v5": (2, 8), "Standard_D4s_v5": (4, 16),
+    "Standard_D8s_v5": (8, 32), "Standard_D16s_v5": (16, 64), "Standard_D32s_v5": (32, 128),
+    "Standard_D2as_v5": (2, 8), "Standard_D4as_v5": (4, 16), "Standard_D8as_v5": (8, 32),
+    "Standard_D16as_v5": (16, 64), "Standard_E2s_v5": (2, 16), "Standard_E4s_v5": (4, 32),
+    "Standard_E8s_v5": (8, 64), "Standard_E16s_v5": (16, 128), "Standard_E32s_v5": (32, 256),
+    "Standard_F2s_v2": (2, 4), "Standard_F4s_v2": (4, 8), "Standard_F8s_v2": (8, 16),
+    "Standard_F16s_v2": (16, 32),
+}
+
+
+@dataclass(frozen=True)
+class WorkloadRequirements:
+    vcpu: float                  # núcleos que piden los pods (requests)
+    memory_gib: float
+    pods: int = 0
+    min_nodes: int = 1           # mínimo para alta disponibilidad
+    max_nodes: int = 100
+    max_pods_per_node: int = DEFAULT_MAX_PODS
+
+
+@dataclass(frozen=True)
+class SizingOption:
+    vm_size: str
+    node_count: int
+    monthly_cost: float
+    headroom: float              # fracción libre en la dimensión más ajustada (0..1)
+
+
+@dataclass
+class SizingResult:
+    best: Optional[SizingOption]
+    pareto: List[SizingOption]   # ordenado por coste; cada punto tiene más holgura que el anterior
+    evaluated: int               # pares (SKU, nodos) puntuados de verdad
+
+
+def _tiered(amount: float, tiers: Sequence[Tuple[float, float]]) -> float:
+    total, remaining = 0.0, amount
+    for size, rate in tiers:
+        take = min(size, remaining)
+        total += take * rate
+        remaining -= take
+        if remaining <= 0:
+            break
+    return total
+
+
+# Reservas de AKS por nodo: CPU en millicores por núcleo y fracción de memoria por tramo de GiB
+_CPU_RESERVED_M = ((1, 60), (1, 40), (2, 20), (math.inf, 10))
+_MEMORY_RESERVED = ((4, 0.25), (4, 0.20), (8, 0.10), (112, 0.06), (math.inf, 0.02))
+_EVICTION_GIB = 0.1
+
+
+def allocatable(vcpu: float, memory_gib: float) -> Tuple[float, float]:
+    """Capacidad que queda para pods tras kube-reserved y el umbral de eviction"""
+    return (vcpu - _tiered(vcpu, _CPU_RESERVED_M) / 1000,
+            memory_gib - _tiered(memory_gib, _MEMORY_RESERVED) - _EVICTION_GIB)
+
+
+def load_sku_specs(path: Optional[str] = None, region: str = DEFAULT_REGION) -> Dict[str, Tuple[int, float]]:
+    """Especificaciones de SKU desde ``az vm list-skus -o json`` (o la tabla integrada)"""
+    if not path or not Path(path).exists():
+        return dict(BUILTIN_SKUS)
+    specs = {}
+    for sku in json.loads(Path(path).read_text()):
+        if sku.get("resourceType") != "virtualMachines":
+            continue
+        locations = [location.lower() for location in sku.get("locations", [])]
+        if locations and region.lower() not in locations:
+            continue
+        if any(r.get("reasonCode") == "NotAvailableForSubscription" for r in sku.get("restrictions", [])):
+            continue
+        capabilities = {c["name"]: c["value"] for c in sku.get("capabilities", [])}
+        try:
+            specs[sku["name"]] = (int(float(capabilities["vCPUs"])), float(capabilities["MemoryGB"]))
+        except (KeyError, ValueError):
+            continue
+    return specs
+
+
+class SizingEngine:
+    def __init__(self, catalog: Optional[PricingCatalog] = None,
+                 specs: Optional[Dict[str, Tuple[int, float]]] = None,
+                 region: str = DEFAULT_REGION, tier: str = DEFAULT_TIER):
+        self.catalog = catalog or load_catalog()
+        specs = specs if specs is not None else dict(BUILTIN_SKUS)
+        # Solo SKUs con precio conocido: el precio por defecto no sirve para comparar
+        self.skus = sorted(name for name in specs
+                           if self.catalog.price(name, region, tier) is not None)
+        self.specs = {name: specs[name] for name in self.skus}
+        table = [allocatable(*self.specs[name]) for name in self.skus]
+        self.cpu = [cpu for cpu, _ in table]
+        self.memory = [memory for _, memory in table]
+        self.prices = [self.catalog.price(name, region, tier) for name in self.skus]
+        if len(self.skus) < min(len(specs), MIN_PRICED_SKUS):
+            print(f"⚠️  Solo {len(self.skus)} de {len(specs)} SKUs tienen precio en {region}: "
+                  f"el sizing se limita a ellas (usa un price sheet para comparar el resto)")
+
+    def minimum_nodes(self, requirements: WorkloadRequirements) -> List[int]:
+        """Mínimo de nodos por SKU en forma cerrada (0 si la SKU no es viable)
+
+        n = max(min_nodes, ⌈vCPU/cpu⌉, ⌈mem/mem⌉, ⌈pods/max_pods⌉), con
+        numpy para todas las SKUs a la vez a partir de NUMPY_MIN_BATCH SKUs.
+        """
+        req = requirements
+        pods_nodes = math.ceil(req.pods / req.max_pods_per_node) if req.pods else 0
+        np = optional_numpy() if len(self.skus) >= NUMPY_MIN_BATCH else None
+        if np is not None:
+            cpu, memory = np.asarray(self.cpu), np.asarray(self.memory)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                n = np.maximum.reduce([np.full(len(cpu), float(max(req.min_nodes, pods_nodes))),
+                                       np.ceil(req.vcpu / cpu), np.ceil(req.memory_gib / memory)])
+            viable = (cpu > 0) & (memory > 0) & (n <= req.max_nodes)
+            return np.where(viable, n, 0).astype(int).tolist()
+
+        counts = []
+        for cpu, memory in zip(self.cpu, self.memory):
+            if cpu <= 0 or memory <= 0:
+                counts.append(0)
+                continue
+            n = max(req.min_nodes, pods_nodes,
+                    math.ceil(req.vcpu / cpu), math.ceil(req.memory_gib / memory))
+            counts.append(n if n <= req.max_nodes else 0)
+        return counts
+
+    def search(self, requirements: WorkloadRequirements, extra_nodes: int = 0) -> SizingResult:
+        """Opción más barata y frente de Pareto coste/holgura
+
+        Cada SKU se evalúa con su mínimo de nodos (y hasta ``extra_nodes``
+        nodos más): con más nodos de la misma SKU solo sube el coste, así
+        que el frente compara familias y tamaños de VM, no escalados.
+        """
+        req = requirements
+        options = []
+        for sku, cpu, memory, price, first in zip(self.skus, self.cpu, self.memory, self.prices,
+                                                  self.minimum_nodes(req)):
+            if not first:
+                continue
+            for n in range(first, min(first + extra_nodes, req.max_nodes) + 1):
+                headroom = min(1 - req.vcpu / (cpu * n), 1 - req.memory_gib / (memory * n))
+                if req.pods:
+                    headroom = min(headroom, 1 - req.pods / (req.max_pods_per_node * n))
+                options.append(SizingOption(sku, n, price * n, headroom))
+        pareto = _pareto(options)
+        return SizingResult(best=pareto[0] if pareto else None, pareto=pareto,
+                            evaluated=len(options))
+
+
+def _pareto(options: Sequence[SizingOption]) -> List[SizingOption]:
+    """Opciones no dominadas: ninguna otra es más barata con igual o más holgura"""
+    front = []
+    best_headroom = -math.inf
+    for option in sorted(options, key=lambda o: (o.monthly_cost, -o.headroom)):
+        if option.headroom > best_headroom:
+            front.append(option)
+            best_headroom = option.headroom
+    return front
+
+
+def main():
+    """Buscar el node pool más barato para unos requisitos"""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Sizing de node pools AKS por coste")
+    parser.add_argument("--vcpu", type=float, required=True)
+    parser.add_argument("--memory", type=float, required=True, help="GiB")
+    parser.add_argument("--pods", type=int, default=0)
+    parser.add_argument("--min-nodes", type=int, default=1)
+    parser.add_argument("--max-nodes", type=int, default=100)
+    parser.add_argument("--price-sheet", help="CSV exportado de precios (AKS_IAC_PRICE_SHEET)")
+    parser.add_argument("--skus", help="Export de 'az vm list-skus -o json'")
+    parser.add_argument("--region", default=DEFAULT_REGION)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = SizingEngine(load_catalog(args.price_sheet), load_sku_specs(args.skus, args.region),
+                         region=args.region)
+    result = engine.search(WorkloadRequirements(args.vcpu, args.memory, args.pods,
+                                                args.min_nodes, args.max_nodes))
+    elapsed = time.perf_counter() - started
+
+    print(f"📐 {len(engine.skus)} SKUs con precio, {result.evaluated} combinaciones evaluadas en {elapsed * 1000:.1f}ms")
+    if result.best is None:
+        print("❌ Ninguna combinación cumple los requisitos")
+        return
+    print("\n💡 Frente de Pareto (coste vs holgura):")
+    for option in result.pareto:
+        print(f"   {option.vm_size:22s} x{option.node_count:<3d} ${option.monthly_cost:9,.2f}/mes  "
+              f"holgura {option.headroom:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,6 @@ import sys
 import json
 import subprocess
 from datetime import datetime, time
-import schedule
 import time as time_module
 import logging
 
@@ -211,6 +210,8 @@ EOF"""
     
     def schedule_operations(self):
         """Programar operaciones automáticas"""
+        import schedule  # solo el modo scheduler lo necesita
+        
         logger.info("📅 Configurando horarios automáticos...")
         
         # Programar parada a las 2:45 PM
@@ -225,6 +226,8 @@ EOF"""
     
     def run_scheduler(self):
         """Ejecutar scheduler principal"""
+        import schedule
+        
         logger.info("🤖 AI Schedule Manager iniciado")
         self.schedule_operations()
         
@@ -235,15 +238,9 @@ EOF"""
 def main():
     if len(sys.argv) > 1:
         action = sys.argv[1]
-        manager = AKSScheduleManager()
         
-        if action == "stop":
-            manager.execute_stop_sequence()
-        elif action == "start":
-            manager.execute_start_sequence()
-        elif action == "schedule":
-            manager.run_scheduler()
-        elif action == "status":
+        # status solo lee el fichero de estado: no hace falta el manager
+        if action == "status":
             if os.path.exists('/tmp/aks-stop-info.json'):
                 with open('/tmp/aks-stop-info.json', 'r') as f:
                     info = json.load(f)
@@ -252,6 +249,16 @@ def main():
                 print(f"🚀 Reinicio programado: {info['restart_time']}")
             else:
                 print("✅ Servicios en funcionamiento normal")
+            return
+        
+        manager = AKSScheduleManager()
+        
+        if action == "stop":
+            manager.execute_stop_sequence()
+        elif action == "start":
+            manager.execute_start_sequence()
+        elif action == "schedule":
+            manager.run_scheduler()
         else:
             print("Uso: python3 aks_schedule_manager.py [stop|start|schedule|status]")
     else:
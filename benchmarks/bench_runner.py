@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Benchmark del Multi-Tool Runner con binarios IaC simulados
+
+Pone fake_iac.py en PATH como terraform/tofu/terragrunt y mide:
+  - overhead propio del runner (tiempo fuera de los procesos de la herramienta)
+  - coste y memoria en función del volumen de output (buffered, stream, json);
+    en stream y json la memoria es O(recursos): no se guarda el output, pero
+    sí una entrada por recurso para ``resources_created``
+  - escalado de execute_many con N entornos
+
+Todas las métricas son "menor es mejor" y se comparan contra baseline.json;
+una regresión por encima de la tolerancia hace fallar el benchmark.
+Funciona offline en cualquier Linux con Python 3.
+
+Uso:
+  python3 benchmarks/bench_runner.py                    # comparar con baseline
+  python3 benchmarks/bench_runner.py --update-baseline  # registrar nuevos valores
+  python3 benchmarks/bench_runner.py --quick            # menos repeticiones
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+RUNNER_PATH = REPO_ROOT / "orchestration" / "multi-tool-runner.py"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+TOOLS = ("terraform", "tofu", "terragrunt")
+
+# Holgura absoluta por unidad para no fallar por ruido en valores pequeños
+ABSOLUTE_SLACK = {"_ms": 5.0, "_mib": 1.0, "_ratio": 0.10}
+
+
+def load_runner_module():
+    spec = importlib.util.spec_from_file_location("multi_tool_runner", RUNNER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Sandbox:
+    """Proyecto temporal con entornos vacíos y binarios falsos en PATH"""
+
+    def __init__(self, environments: int):
+        self.root = Path(tempfile.mkdtemp(prefix="iac-bench-"))
+        self.bin_dir = self.root / "bin"
+        self.project = self.root / "project"
+        self.cache_dir = self.root / "cache"
+        self.bin_dir.mkdir()
+        for tool in TOOLS:
+            target = self.bin_dir / tool
+            shutil.copy(BENCH_DIR / "fake_iac.py", target)
+            target.chmod(0o755)
+        self.environments = [f"env-{i:02d}" for i in range(environments)]
+        for environment in self.environments:
+            env_dir = self.project / "environments" / environment
+            env_dir.mkdir(parents=True)
+            (env_dir / "main.tf").write_text(
+                'terraform {\n  required_version = ">= 1.0"\n}\n')
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+@contextmanager
+def fake_environment(sandbox: Sandbox, **settings):
+    saved = dict(os.environ)
+    os.environ["PATH"] = f"{sandbox.bin_dir}{os.pathsep}{saved.get('PATH', '')}"
+    for key, value in settings.items():
+        os.environ[f"FAKE_IAC_{key.upper()}"] = str(value)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+def peak_python_mib(fn: Callable) -> float:
+    """Pico de memoria Python asignada por el runner durante ``fn``"""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def bench_overhead(module, repeats: int) -> Dict[str, float]:
+    sandbox = Sandbox(environments=1)
+    try:
+        runner = module.MultiToolRunner(str(sandbox.project), cache_dir=str(sandbox.cache_dir))
+        environment = sandbox.environments[0]
+        with fake_environment(sandbox, latency=0.2, init_latency=0.02, resources=10):
+            runner.execute_with_tool("terraform", environment, {}, "plan")  # calentar init cache
+            overheads, spawns = [], []
+            for _ in range(repeats):
+                result = runner.execute_with_tool("terraform", environment, {"project_name": "bench"}, "plan")
+                assert result.success, result.error
+                overheads.append(result.execution_time - sum(result.metrics.phases.values()))
+                spawns.append(result.metrics.total_spawn_overhead)
+
+            probe_times = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                runner.check_tool_availability()
+                probe_times.append(time.perf_counter() - started)
+        return {
+            "overhead.runner_ms": statistics.median(overheads) * 1000,
+            "overhead.spawn_ms": statistics.median(spawns) * 1000,
+            "overhead.tool_probe_cached_ms": statistics.median(probe_times) * 1000,
+        }
+    finally:
+        sandbox.cleanup()
+
+
+def bench_output(module, sizes) -> Dict[str, float]:
+    sandbox = Sandbox(environments=1)
+    results = {}
+    try:
+        runner = module.MultiToolRunner(str(sandbox.project), cache_dir=str(sandbox.cache_dir))
+        environment = sandbox.environments[0]
+        state_file = sandbox.project / "environments" / environment / "terraform.tfstate"
+        modes = {
+            "buffered": {},
+            "stream": {"stream": True},
+            "json": {"stream": True, "json_output": True},
+        }
+        for resources in sizes:
+            # Sin state: solo el coste de procesar el output (recursos del escaneo o de -json)
+            with fake_environment(sandbox, latency=0, init_latency=0, resources=resources):
+                for mode, options in modes.items():
+                    def run():
+                        result = runner.execute_with_tool("terraform", environment, {}, "apply", **options)
+                        assert result.success, result.error
+                        assert len(result.resources_created) >= resources, mode
+                        return result
+
+                    result = run()
+                    apply_seconds = result.metrics.phases["apply"]
+                    per_k = apply_seconds * 1000 / (resources / 1000)
+                    results[f"output.{mode}.{resources}.ms_per_1k_resources_ms"] = per_k
+                    results[f"output.{mode}.{resources}.python_peak_mib"] = peak_python_mib(run)
+
+            # Con state: lo que cuesta en el runner el diff antes/después (la escritura
+            # del state la hace el fake dentro de la fase apply y no se cuenta)
+            with fake_environment(sandbox, latency=0, init_latency=0, resources=resources, state=1):
+                def run_with_state():
+                    state_file.unlink(missing_ok=True)  # desde cero: el diff lista todos los recursos
+                    result = runner.execute_with_tool("terraform", environment, {}, "apply", stream=True)
+                    assert result.success, result.error
+                    assert result.state_changes is not None
+                    assert len(result.resources_created) >= resources, "state"
+                    return result
+
+                result = run_with_state()
+                tracking_seconds = result.execution_time - sum(result.metrics.phases.values())
+                per_k = tracking_seconds * 1000 / (resources / 1000)
+                results[f"output.state.{resources}.tracking_ms_per_1k_resources_ms"] = per_k
+                results[f"output.state.{resources}.python_peak_mib"] = peak_python_mib(run_with_state)
+            state_file.unlink(missing_ok=True)
+        return results
+    finally:
+        sandbox.cleanup()
+
+
+def bench_parallel(module, counts, latency: float) -> Dict[str, float]:
+    sandbox = Sandbox(environments=max(counts))
+    results = {}
+    try:
+        runner = module.MultiToolRunner(str(sandbox.project), cache_dir=str(sandbox.cache_dir),
+                                        max_workers=max(counts))
+        with fake_environment(sandbox, latency=latency, init_latency=0.02, resources=50):
+            runner.execute_many("terraform", sandbox.environments, {}, "plan")  # calentar
+            baseline = None
+            for count in counts:
+                started = time.perf_counter()
+                outcome = runner.execute_many("terraform", sandbox.environments[:count], {}, "plan")
+                elapsed = time.perf_counter() - started
+                assert all(r.success for r in outcome.values())
+                baseline = baseline or elapsed
+                # 1.0 = ideal: N entornos tardan lo mismo que uno
+                results[f"parallel.{count}_envs.slowdown_ratio"] = elapsed / baseline
+        return results
+    finally:
+        sandbox.cleanup()
+
+
+def compare(measured: Dict[str, float], baseline: Dict[str, float], tolerance: float):
+    regressions = []
+    for name, value in sorted(measured.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            status = "nuevo"
+        else:
+            slack = next((s for suffix, s in ABSOLUTE_SLACK.items() if name.endswith(suffix)), 0.0)
+            limit = max(reference * (1 + tolerance), reference + slack)
+            status = "ok" if value <= limit else "REGRESIÓN"
+            if value > limit:
+                regressions.append(f"{name}: {value:.3f} > {limit:.3f} (baseline {reference:.3f})")
+        ref_text = f"{reference:10.3f}" if reference is not None else " " * 10
+        print(f"   {name:55s} {value:10.3f} {ref_text}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del Multi-Tool Runner")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Guardar los valores medidos como nueva baseline")
+    parser.add_argument("--quick", action="store_true", help="Menos repeticiones y tamaños")
+    parser.add_argument("--tolerance", type=float, default=0.30,
+                        help="Regresión relativa permitida (0.30 = 30%%)")
+    args = parser.parse_args()
+
+    module = load_runner_module()
+
+    repeats = 3 if args.quick else 10
+    sizes = (2000,) if args.quick else (2000, 20000)
+    counts = (1, 2, 4) if args.quick else (1, 2, 4, 8)
+
+    print("⏱️  Benchmark Multi-Tool Runner")
+    measured = {}
+    measured.update(bench_overhead(module, repeats))
+    measured.update(bench_output(module, sizes))
+    measured.update(bench_parallel(module, counts, latency=0.5))
+
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text()).get("metrics", {})
+
+    print(f"\n   {'métrica':55s} {'medido':>10s} {'baseline':>10s}")
+    regressions = compare(measured, baseline, args.tolerance)
+
+    if args.update_baseline:
+        merged = {**baseline, **measured}
+        BASELINE_PATH.write_text(json.dumps({
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+            "metrics": {name: round(value, 4) for name, value in sorted(merged.items())},
+        }, indent=2) + "\n")
+        print(f"\n💾 Baseline actualizada: {BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print("\n❌ Regresiones de rendimiento detectadas:")
+        for regression in regressions:
+            print(f"   • {regression}")
+        return 1
+
+    print("\n✅ Sin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Fake IaC - Sustituto de terraform/tofu/terragrunt para benchmarks
+
+Imita el output de init/validate/plan/apply/show con volumen y latencia
+configurables por variables de entorno:
+
+  FAKE_IAC_LATENCY        segundos de espera de plan/apply/destroy (0.2)
+  FAKE_IAC_INIT_LATENCY   segundos de espera de init/validate (0.05)
+  FAKE_IAC_RESOURCES      recursos en el plan (10)
+  FAKE_IAC_ATTRIBUTES     líneas de atributos por recurso en el plan (8)
+  FAKE_IAC_EXIT           código de salida de plan/apply (0)
+  FAKE_IAC_STATE          si es 1, apply/destroy escriben terraform.tfstate (0)
+"""
+
+import json
+import os
+import sys
+import time
+
+TOOL = os.path.basename(sys.argv[0])
+ARGS = sys.argv[1:]
+LATENCY = float(os.environ.get("FAKE_IAC_LATENCY", "0.2"))
+INIT_LATENCY = float(os.environ.get("FAKE_IAC_INIT_LATENCY", "0.05"))
+RESOURCES = int(os.environ.get("FAKE_IAC_RESOURCES", "10"))
+ATTRIBUTES = int(os.environ.get("FAKE_IAC_ATTRIBUTES", "8"))
+EXIT_CODE = int(os.environ.get("FAKE_IAC_EXIT", "0"))
+WRITE_STATE = os.environ.get("FAKE_IAC_STATE", "0") == "1"
+
+out = sys.stdout
+
+
+def resource(i):
+    return {
+        "addr": f"module.aks.azurerm_managed_disk.disk_{i}",
+        "module": "module.aks",
+        "resource": f"azurerm_managed_disk.disk_{i}",
+        "resource_type": "azurerm_managed_disk",
+        "resource_name": f"disk_{i}",
+        "resource_key": None,
+    }
+
+
+def message(kind, text, **fields):
+    fields.update({"@level": "info", "@message": text, "@module": TOOL,
+                   "@timestamp": "2026-01-01T00:00:00.000000Z", "type": kind})
+    out.write(json.dumps(fields) + "\n")
+
+
+def plan_text(apply):
+    for i in range(RESOURCES):
+        out.write(f"  # module.aks.azurerm_managed_disk.disk_{i} will be created\n")
+        out.write(f'  + resource "azurerm_managed_disk" "disk_{i}" {{\n')
+        for a in range(ATTRIBUTES):
+            out.write(f'      + attribute_{a} = "value-{i}-{a}-(known after apply)"\n')
+        out.write("    }\n\n")
+    out.write(f"Plan: {RESOURCES} to add, 0 to change, 0 to destroy.\n")
+    if apply:
+        for i in range(RESOURCES):
+            address = f"module.aks.azurerm_managed_disk.disk_{i}"
+            out.write(f"{address}: Creating...\n")
+            out.write(f"{address}: Creation complete after 3s "
+                      f"[id=/subscriptions/0000/resourceGroups/rg/providers/Microsoft.Compute/disks/disk-{i}]\n")
+        out.write(f"\nApply complete! Resources: {RESOURCES} added, 0 changed, 0 destroyed.\n")
+
+
+def plan_json(apply):
+    message("version", f"{TOOL} 1.6.0", terraform="1.6.0", ui="1.2")
+    for i in range(RESOURCES):
+        message("planned_change", f"{resource(i)['addr']}: Plan to create",
+                change={"resource": resource(i), "action": "create"})
+    message("change_summary", f"Plan: {RESOURCES} to add, 0 to change, 0 to destroy.",
+            changes={"add": RESOURCES, "change": 0, "remove": 0, "operation": "apply" if apply else "plan"})
+    if apply:
+        for i in range(RESOURCES):
+            message("apply_start", f"{resource(i)['addr']}: Creating...",
+                    hook={"resource": resource(i), "action": "create"})
+            message("apply_complete", f"{resource(i)['addr']}: Creation complete after 3s",
+                    hook={"resource": resource(i), "action": "create", "id_key": "id",
+                          "id_value": f"disk-{i}", "elapsed_seconds": 3})
+
+
+def show_json():
+    changes = [{"address": resource(i)["addr"], "module_address": "module.aks",
+                "mode": "managed", "type": "azurerm_managed_disk", "name": f"disk_{i}",
+                "change": {"actions": ["create"], "before": None,
+                           "after": {f"attribute_{a}": f"value-{i}-{a}" for a in range(ATTRIBUTES)}}}
+               for i in range(RESOURCES)]
+    out.write(json.dumps({"format_version": "1.2", "resource_changes": changes}) + "\n")
+
+
+def disk_attributes(i):
+    return {"id": f"/subscriptions/0000/resourceGroups/rg/providers/Microsoft.Compute/disks/disk-{i}",
+            **{f"attribute_{a}": f"value-{i}-{a}" for a in range(ATTRIBUTES)}}
+
+
+def show_state_json():
+    """``show -json`` sin plan: el contenido de terraform.tfstate (vacío si no existe)"""
+    try:
+        with open("terraform.tfstate") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        out.write(json.dumps({"format_version": "1.0"}) + "\n")
+        return
+    resources = [{"address": f"{item['module']}.{item['type']}.{item['name']}", "mode": item["mode"],
+                  "type": item["type"], "name": item["name"],
+                  "provider_name": "registry.terraform.io/hashicorp/azurerm",
+                  "values": instance["attributes"]}
+                 for item in state.get("resources", []) for instance in item["instances"]]
+    out.write(json.dumps({"format_version": "1.0", "values": {"root_module": {
+        "child_modules": [{"address": "module.aks", "resources": resources}]}}}) + "\n")
+
+
+def write_state(destroy):
+    try:
+        with open("terraform.tfstate") as f:
+            serial = json.load(f).get("serial", 0)
+    except (OSError, ValueError):
+        serial = 0
+    resources = [] if destroy else [
+        {"module": "module.aks", "mode": "managed", "type": "azurerm_managed_disk", "name": f"disk_{i}",
+         "provider": 'provider["registry.terraform.io/hashicorp/azurerm"]',
+         "instances": [{"schema_version": 0, "attributes": disk_attributes(i)}]}
+        for i in range(RESOURCES)]
+    with open("terraform.tfstate", "w") as f:
+        f.write(json.dumps({"version": 4, "terraform_version": "1.6.0", "serial": serial + 1,
+                            "lineage": "fake-lineage", "outputs": {}, "resources": resources}))
+
+
+def main():
+    command = ARGS[0] if ARGS else ""
+
+    if command in ("--version", "version"):
+        out.write(f"{TOOL} v1.6.0\non linux_amd64\n")
+        return 0
+
+    if command == "init":
+        time.sleep(INIT_LATENCY)
+        os.makedirs(".terraform", exist_ok=True)
+        out.write("Initializing the backend...\nInitializing provider plugins...\n\n"
+                  f"{TOOL} has been successfully initialized!\n")
+        return 0
+
+    if command == "validate":
+        time.sleep(INIT_LATENCY)
+        out.write("Success! The configuration is valid.\n")
+        return 0
+
+    if command == "show":
+        if len([arg for arg in ARGS[1:] if not arg.startswith("-")]):
+            show_json()
+        else:
+            show_state_json()
+        return 0
+
+    if command in ("plan", "apply", "destroy"):
+        time.sleep(LATENCY)
+        if "-json" in ARGS:
+            plan_json(apply=command != "plan")
+        else:
+            plan_text(apply=command != "plan")
+        if EXIT_CODE:
+            sys.stderr.write("Error: simulated failure\n")
+            return EXIT_CODE
+        for arg in ARGS:
+            if arg.startswith("-out="):
+                with open(arg[len("-out="):], "w") as plan_file:
+                    plan_file.write(f"fake plan with {RESOURCES} resources\n")
+        if command == "plan" and "-detailed-exitcode" in ARGS and RESOURCES:
+            return 2
+        if command != "plan" and WRITE_STATE:
+            write_state(destroy=command == "destroy")
+        return 0
+
+    sys.stderr.write(f"fake {TOOL}: unsupported command {ARGS}\n")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Presupuesto de arranque de los agentes CLI
+
+Los agentes se lanzan desde cron y desde los scripts de shell
+(``scripts/ai-orchestrator.sh``, ``scripts/ai-schedule-manager.sh``) varias
+veces por hora, así que el coste de arrancar importa tanto como el trabajo.
+Para cada entry point se mide, en procesos nuevos, la mediana de varias
+repeticiones (un arranque lento suelto no cambia el resultado):
+
+  - import propio: tiempo de ``python -X importtime`` de los módulos que no
+    son de la stdlib (los del repo y dependencias como numpy o schedule)
+  - comando: un comando barato completo (status, informe, --help) menos el
+    arranque del intérprete y el import del módulo, es decir, el trabajo
+    que el comando hace al arrancar
+
+La stdlib se excluye porque su coste depende de la máquina y no del
+código; lo que el presupuesto vigila son imports pesados nuevos y trabajo
+en el arranque. Superar un presupuesto hace fallar el benchmark. Funciona
+offline: ningún comando medido llama a Azure ni a kubectl.
+
+Uso:
+  python3 benchmarks/import_budget.py            # comprobar presupuestos
+  python3 benchmarks/import_budget.py --runs 31  # más repeticiones
+  python3 benchmarks/import_budget.py --importtime orchestrator  # desglose por módulo
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class EntryPoint(NamedTuple):
+    name: str
+    script: str
+    command: Sequence[str]   # argumentos del comando barato ([] = solo import)
+    import_budget_ms: float
+    command_budget_ms: float
+
+
+# El comando incluye costes fijos de ejecutar un script (compilar el
+# __main__, que nunca usa .pyc, y el cierre del intérprete): ~5-10ms. Los
+# presupuestos dejan más del doble de lo medido: un import pesado nuevo
+# (numpy, azure-*, kubernetes) cuesta cientos de ms y sigue saltando
+ENTRY_POINTS: List[EntryPoint] = [
+    EntryPoint("orchestrator", "ai-agents/orchestrator/main.py", ["--help"], 25, 80),
+    EntryPoint("schedule-manager", "ai-agents/schedule-manager/aks_schedule_manager.py",
+               ["status"], 15, 60),
+    EntryPoint("cost-optimizer", "ai-agents/cost-optimizer/analyzer.py", ["dev"], 25, 80),
+    EntryPoint("backup-analyzer", "ai-agents/backup-analyzer/main.py", ["--help"], 25, 80),
+    EntryPoint("sizing", "ai-agents/pricing/sizing.py",
+               ["--vcpu", "8", "--memory", "32"], 25, 80),
+]
+
+# Carga el script como módulo (sin __main__) y mide solo la ejecución del import
+_IMPORT_PROBE = """
+import importlib.util, os, sys, time
+sys.path.insert(0, os.path.dirname(sys.argv[1]))  # como al ejecutar el script
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("entry_point", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print((time.perf_counter() - started) * 1000)
+"""
+
+_STDLIB = set(sys.stdlib_module_names)
+
+
+def _isolated_env(scratch: Path) -> Dict[str, str]:
+    """Entorno sin caches del usuario: los comandos no leen ni escriben fuera de ``scratch``"""
+    env = dict(os.environ)
+    env["AKS_IAC_CACHE_DIR"] = str(scratch / "cache")
+    env.pop("AKS_IAC_PRICE_SHEET", None)
+    return env
+
+
+def _wall_ms(cmd: List[str], env: Dict[str, str], cwd: Path) -> float:
+    started = time.perf_counter()
+    subprocess.run(cmd, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def _is_stdlib(module: str) -> bool:
+    return module.strip().split(".")[0] in _STDLIB
+
+
+def _import_probe(script: str, env: Dict[str, str], cwd: Path,
+                  importtime: bool = False) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """(ms del import, filas (propio µs, acumulado µs, módulo) de -X importtime)"""
+    flags = ["-X", "importtime"] if importtime else []
+    probe = subprocess.run([sys.executable, *flags, "-c", _IMPORT_PROBE, script],
+                           env=env, cwd=cwd, capture_output=True, text=True)
+    if probe.returncode != 0:
+        errors = [line for line in probe.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError("el import falló\n   " + "\n   ".join(errors[-3:]))
+    rows = []
+    for line in probe.stderr.splitlines():
+        parts = line[len("import time:"):].split("|")
+        if len(parts) == 3 and parts[0].strip().isdigit():
+            rows.append((int(parts[0]), int(parts[1]), parts[2].rstrip()))
+    return float(probe.stdout.strip().splitlines()[-1]), rows
+
+
+def measure(entry: EntryPoint, runs: int, env: Dict[str, str], cwd: Path) -> Dict[str, float]:
+    script = str(REPO_ROOT / entry.script)
+    # Un primer arranque para que los .pyc y el cache de disco estén calientes
+    _import_probe(script, env, cwd)
+
+    own = []
+    for _ in range(runs):
+        _, rows = _import_probe(script, env, cwd, importtime=True)
+        own.append(sum(self_us for self_us, _, module in rows if not _is_stdlib(module)) / 1000)
+    # Sin -X importtime: su propio overhead inflaría el total
+    imports = statistics.median(_import_probe(script, env, cwd)[0] for _ in range(runs))
+    result = {"import_ms": statistics.median(own), "import_total_ms": imports}
+
+    if entry.command:
+        # Intérprete y comando alternados: una racha de ruido afecta a los dos por igual
+        interpreter, command = [], []
+        for _ in range(runs):
+            interpreter.append(_wall_ms([sys.executable, "-c", "pass"], env, cwd))
+            command.append(_wall_ms([sys.executable, script, *entry.command], env, cwd))
+        result["command_ms"] = max(0.0, statistics.median(command)
+                                   - statistics.median(interpreter) - imports)
+    return result
+
+
+def print_importtime(entry: EntryPoint, env: Dict[str, str], cwd: Path, top: int = 20):
+    """Módulos más caros según ``python -X importtime``"""
+    _, rows = _import_probe(str(REPO_ROOT / entry.script), env, cwd, importtime=True)
+    print(f"\n🔬 {entry.name}: módulos con más tiempo acumulado (µs)")
+    print(f"   {'acumulado':>9s} {'propio':>8s}  módulo")
+    for self_us, cumulative, module in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+        print(f"   {cumulative:9d} {self_us:8d}  {module}{'' if _is_stdlib(module) else '  ◀'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de arranque de los agentes CLI")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--importtime", metavar="ENTRY_POINT",
+                        help="Mostrar el desglose de imports de un entry point")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import-budget-") as scratch:
+        scratch = Path(scratch)
+        env = _isolated_env(scratch)
+
+        if args.importtime:
+            entries = {entry.name: entry for entry in ENTRY_POINTS}
+            if args.importtime not in entries:
+                parser.error(f"entry point desconocido: {args.importtime} ({', '.join(entries)})")
+            print_importtime(entries[args.importtime], env, scratch)
+            return 0
+
+        print("⏱️  Presupuesto de arranque (mediana de procesos nuevos, sin stdlib ni intérprete)")
+        print(f"\n   {'entry point':20s} {'medición':10s} {'medido':>9s} {'presupuesto':>12s}")
+        failures = []
+        for entry in ENTRY_POINTS:
+            try:
+                measured = measure(entry, args.runs, env, scratch)
+            except RuntimeError as e:
+                failures.append(f"{entry.name}: {e}")
+                print(f"   {entry.name:20s} {'import_ms':10s} {'error':>9s}")
+                continue
+            for metric, budget in (("import_ms", entry.import_budget_ms),
+                                   ("command_ms", entry.command_budget_ms)):
+                if metric not in measured:
+                    continue
+                value = measured[metric]
+                status = "ok" if value <= budget else "EXCEDIDO"
+                if value > budget:
+                    failures.append(f"{entry.name} {metric}: {value:.1f}ms > {budget:.0f}ms")
+                print(f"   {entry.name:20s} {metric:10s} {value:8.1f}ms {budget:10.0f}ms  {status}")
+
+    if failures:
+        print("\n❌ Presupuestos de arranque excedidos:")
+        for failure in failures:
+            print(f"   • {failure}")
+        return 1
+
+    print("\n✅ Todos los entry points dentro de presupuesto")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
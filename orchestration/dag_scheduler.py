@@ -0,0 +1,221 @@
+"""
+DAG Scheduler - Ejecución de stacks en orden de dependencias
+
+Descubre los stacks del proyecto (``environments/*`` y ``modules/*``),
+construye el grafo de dependencias a partir de las fuentes de módulos
+locales y de los bloques ``dependency``/``dependencies`` de Terragrunt, y
+ejecuta en paralelo todos los nodos cuyas dependencias ya terminaron.
+"""
+
+import re
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from stack_fingerprint import TF_SUFFIXES, block_body, local_module_dirs
+
+STACK_ROOTS = {"environments": "environment", "modules": "module"}
+TERRAGRUNT_FILE = "terragrunt.hcl"
+
+_DEPENDENCY_BLOCK = re.compile(r'^\s*(dependency\s+"[^"]*"|dependencies)\s*\{', re.MULTILINE)
+_CONFIG_PATH = re.compile(r'config_path\s*=\s*"([^"]+)"')
+_PATHS = re.compile(r'paths\s*=\s*\[([^\]]*)\]', re.DOTALL)
+_STRING = re.compile(r'"([^"]+)"')
+
+
+@dataclass
+class Stack:
+    name: str                 # ruta relativa al proyecto: environments/dev, modules/aks
+    path: Path
+    kind: str                 # environment | module
+    terragrunt: bool = False
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DagResult:
+    waves: List[List[str]]
+    results: Dict[str, Any] = field(default_factory=dict)  # stack -> ToolResult
+    skipped: Dict[str, str] = field(default_factory=dict)  # stack -> motivo
+
+    @property
+    def failed(self) -> List[str]:
+        return [name for name, result in self.results.items() if not result.success]
+
+    @property
+    def success(self) -> bool:
+        return not self.failed and not self.skipped
+
+
+def _is_stack_dir(directory: Path) -> bool:
+    return any(p.is_file() and (p.name.endswith(TF_SUFFIXES) or p.name == TERRAGRUNT_FILE)
+               for p in directory.iterdir())
+
+
+def _terragrunt_dependencies(stack_dir: Path) -> List[Path]:
+    """Rutas de ``dependency { config_path }`` y ``dependencies { paths }``"""
+    config = stack_dir / TERRAGRUNT_FILE
+    if not config.exists():
+        return []
+    text = config.read_text(errors="replace")
+    paths = []
+    for match in _DEPENDENCY_BLOCK.finditer(text):
+        body = block_body(text, match.start())
+        if match.group(1) == "dependencies":
+            for listing in _PATHS.findall(body):
+                paths.extend(_STRING.findall(listing))
+        else:
+            paths.extend(_CONFIG_PATH.findall(body))
+    return [(stack_dir / path).resolve() for path in paths]
+
+
+def discover_stacks(project_root: Path) -> Dict[str, Stack]:
+    """Stacks bajo environments/ y modules/ con sus dependencias resueltas"""
+    project_root = Path(project_root).resolve()
+    stacks: Dict[str, Stack] = {}
+    by_path: Dict[Path, str] = {}
+
+    for root_name, kind in STACK_ROOTS.items():
+        root = project_root / root_name
+        if not root.is_dir():
+            continue
+        pending = deque(sorted(p for p in root.iterdir() if p.is_dir()))
+        while pending:
+            directory = pending.popleft()
+            if directory.name.startswith("."):
+                continue
+            if _is_stack_dir(directory):
+                name = directory.relative_to(project_root).as_posix()
+                stacks[name] = Stack(name, directory, kind,
+                                     terragrunt=(directory / TERRAGRUNT_FILE).exists())
+                by_path[directory] = name
+            else:
+                # Layouts anidados: environments/<region>/<env>
+                pending.extend(sorted(p for p in directory.iterdir() if p.is_dir()))
+
+    for stack in stacks.values():
+        for dependency in local_module_dirs(stack.path) + _terragrunt_dependencies(stack.path):
+            name = by_path.get(dependency)
+            if name and name != stack.name and name not in stack.depends_on:
+                stack.depends_on.append(name)
+
+    return stacks
+
+
+def select(stacks: Dict[str, Stack], targets: Iterable[str]) -> Dict[str, Stack]:
+    """Subgrafo con los stacks pedidos y todas sus dependencias transitivas"""
+    selected: Dict[str, Stack] = {}
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        if name not in stacks:
+            raise KeyError(f"Stack desconocido: {name}")
+        selected[name] = stacks[name]
+        pending.extend(stacks[name].depends_on)
+    return selected
+
+
+def _edges(stacks: Dict[str, Stack], reverse: bool) -> Dict[str, Set[str]]:
+    """Prerrequisitos de cada nodo (invertidos para destroy)"""
+    requires: Dict[str, Set[str]] = {name: set() for name in stacks}
+    for stack in stacks.values():
+        for dependency in stack.depends_on:
+            if dependency not in stacks:
+                continue
+            if reverse:
+                requires[dependency].add(stack.name)
+            else:
+                requires[stack.name].add(dependency)
+    return requires
+
+
+def topological_waves(stacks: Dict[str, Stack], reverse: bool = False) -> List[List[str]]:
+    """Niveles del grafo: cada ola solo depende de olas anteriores"""
+    requires = _edges(stacks, reverse)
+    waves = []
+    done: Set[str] = set()
+    while len(done) < len(requires):
+        wave = sorted(name for name, deps in requires.items()
+                      if name not in done and deps <= done)
+        if not wave:
+            cycle = sorted(name for name in requires if name not in done)
+            raise ValueError(f"Ciclo de dependencias entre: {', '.join(cycle)}")
+        waves.append(wave)
+        done.update(wave)
+    return waves
+
+
+class DagScheduler:
+    """Ejecuta un grafo de stacks con un pool de workers acotado
+
+    Un nodo arranca en cuanto terminan todas sus dependencias (no espera a
+    que acabe la ola completa). Con ``fail_fast`` el primer fallo detiene
+    el lanzamiento de nodos nuevos; sin él solo se omiten los nodos que
+    dependen (directa o indirectamente) del que falló.
+    """
+
+    def __init__(self, stacks: Dict[str, Stack], workers: int = 4,
+                 fail_fast: bool = True, reverse: bool = False):
+        self.stacks = stacks
+        self.workers = max(1, workers)
+        self.fail_fast = fail_fast
+        self.reverse = reverse
+        self.waves = topological_waves(stacks, reverse)  # valida que no hay ciclos
+
+    def run(self, execute: Callable[[Stack], Any],
+            on_complete: Optional[Callable[[str, Any], None]] = None) -> DagResult:
+        requires = _edges(self.stacks, self.reverse)
+        dependents: Dict[str, List[str]] = {name: [] for name in requires}
+        for name, deps in requires.items():
+            for dependency in deps:
+                dependents[dependency].append(name)
+
+        outcome = DagResult(waves=self.waves)
+        remaining = {name: len(deps) for name, deps in requires.items()}
+        ready = deque(name for wave in self.waves for name in wave if remaining[name] == 0)
+        running: Dict[Future, str] = {}
+        stopped = False
+
+        def skip_dependents(name: str, reason: str):
+            pending = list(dependents[name])
+            while pending:
+                dependent = pending.pop()
+                if dependent not in outcome.skipped:
+                    outcome.skipped[dependent] = reason
+                    pending.extend(dependents[dependent])
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="iac-dag") as pool:
+            while ready or running:
+                while ready and not stopped and len(running) < self.workers:
+                    name = ready.popleft()
+                    if name not in outcome.skipped:
+                        running[pool.submit(execute, self.stacks[name])] = name
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    result = future.result()
+                    outcome.results[name] = result
+                    if on_complete is not None:
+                        on_complete(name, result)
+
+                    if not result.success:
+                        skip_dependents(name, f"dependencia fallida: {name}")
+                        stopped = stopped or self.fail_fast
+                        continue
+                    for dependent in dependents[name]:
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            ready.append(dependent)
+
+        for name in requires:
+            if name not in outcome.results and name not in outcome.skipped:
+                outcome.skipped[name] = "fail-fast: ejecución detenida"
+        return outcome
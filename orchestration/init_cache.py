@@ -0,0 +1,70 @@
+"""
+Init Cache - Evita ``terraform init`` / ``tofu init`` redundantes
+
+Un init se considera vigente si el directorio ``.terraform`` del stack
+contiene un marcador con el mismo digest de inputs (versión de la
+herramienta, lock file, módulos, backend) que el calculado ahora. Un init
+con ``-backend=false`` (validate) queda marcado como tal y no sirve para
+plan/apply, que necesitan el backend inicializado; un init completo sí
+sirve para validar. Además ofrece un directorio de plugins compartido
+entre todos los entornos (``TF_PLUGIN_CACHE_DIR``).
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict
+
+from stack_fingerprint import init_inputs_digest
+
+MARKER_NAME = "ai-runner-init.json"
+
+
+class InitCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.plugin_cache_dir = self.cache_dir / "plugins"
+
+    def tool_env(self) -> Dict[str, str]:
+        """Variables de entorno para que todos los entornos reutilicen los providers"""
+        self.plugin_cache_dir.mkdir(parents=True, exist_ok=True)
+        env = dict(os.environ)
+        env.setdefault("TF_PLUGIN_CACHE_DIR", str(self.plugin_cache_dir))
+        return env
+
+    def _marker(self, stack_dir: Path) -> Path:
+        return Path(stack_dir) / ".terraform" / MARKER_NAME
+
+    def is_fresh(self, tool: str, stack_dir: Path, backend: bool = True,
+                 version: str = "") -> bool:
+        """True si el último init del stack sigue siendo válido
+
+        Con ``backend`` (plan/apply) solo vale un init que inicializó el
+        backend; los marcadores sin ese dato se tratan como ``-backend=false``.
+        ``version`` es la salida de ``<tool> --version``: tras actualizar la
+        herramienta hay que volver a hacer init.
+        """
+        marker = self._marker(stack_dir)
+        try:
+            recorded = json.loads(marker.read_text())
+        except (OSError, ValueError):
+            return False
+        return (recorded.get("tool") == tool
+                and (recorded.get("backend", False) or not backend)
+                and recorded.get("key") == init_inputs_digest(tool, stack_dir, (version,)))
+
+    def record(self, tool: str, stack_dir: Path, backend: bool = True, version: str = ""):
+        """Registra un init exitoso (se recalcula: init puede crear el lock file)"""
+        marker = self._marker(stack_dir)
+        if not marker.parent.is_dir():
+            return
+        tmp = marker.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"tool": tool, "version": version, "backend": backend,
+                                   "key": init_inputs_digest(tool, stack_dir, (version,))}))
+        os.replace(tmp, marker)
+
+    def invalidate(self, stack_dir: Path):
+        try:
+            self._marker(stack_dir).unlink()
+        except FileNotFoundError:
+            pass
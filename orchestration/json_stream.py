@@ -0,0 +1,77 @@
+"""
+JSON Stream - Lectura incremental de arrays dentro de documentos JSON grandes
+
+Permite recorrer los elementos de ``resource_changes`` (``show -json``) o de
+``resources`` (tfstate) sin cargar el documento completo: en memoria solo
+queda el elemento que se está decodificando.
+"""
+
+import json
+import re
+from typing import Any, Iterator, TextIO
+
+_WHITESPACE_AND_COMMAS = " \t\r\n,"
+
+
+def iter_array_items(stream: TextIO, key: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Genera los elementos de cada array ``"key": [...]`` del documento, a cualquier profundidad"""
+    decoder = json.JSONDecoder()
+    pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    lookbehind = len(key) + 16
+
+    buf = ""
+    pos = 0
+    eof = False
+    in_array = False
+
+    def fill(minimum: int):
+        nonlocal buf, pos, eof
+        chunk = stream.read(max(chunk_size, minimum))
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        if not in_array:
+            match = pattern.search(buf, pos)
+            if match:
+                pos = match.end()
+                in_array = True
+                continue
+            if eof:
+                return
+            # Conservar la cola por si la clave queda partida entre dos lecturas
+            pos = max(pos, len(buf) - lookbehind)
+            fill(0)
+            continue
+
+        while pos < len(buf) and buf[pos] in _WHITESPACE_AND_COMMAS:
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            fill(0)
+            continue
+
+        if buf[pos] == "]":
+            pos += 1
+            in_array = False
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Elemento incompleto: leer al menos otro tanto (crecimiento geométrico)
+            fill(len(buf) - pos)
+            continue
+
+        if end == len(buf) and not eof:
+            # Un escalar al final del buffer podría estar truncado
+            fill(0)
+            continue
+
+        pos = end
+        yield item
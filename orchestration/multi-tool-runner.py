@@ -3,12 +3,38 @@
 Multi-Tool Runner - Ejecutor unificado para Terraform, OpenTofu, Terragrunt
 """
 
+import asyncio
+import os
+import signal
 import subprocess
 import json
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, Generator, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
 
+# Los módulos auxiliares viven junto a este script (el nombre con guiones no es importable)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from dag_scheduler import DagResult, DagScheduler, Stack, discover_stacks, select
+from init_cache import InitCache
+from plan_artifacts import PlanArtifactStore, state_serial
+from plan_changes import ChangeIndex
+from rate_limit import THROTTLE_RETRIES, Permit, RateLimitPool, shared_pool, with_parallelism
+from run_metrics import RunMetrics, append_jsonl, metrics_record, write_prometheus_textfile
+from state_inventory import StateDiff, StateTracker
+from tool_probe import ToolProbeCache
+from var_files import var_file
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("AKS_IAC_CACHE_DIR",
+                                        Path.home() / ".cache" / "aks-iac"))
+
 @dataclass
 class ToolResult:
     tool: str
@@ -17,147 +43,954 @@ class ToolResult:
     error: str
     resources_created: List[str]
     execution_time: float
+    init_cache: Optional[str] = None  # "hit" | "miss" | None si no aplica
+    changes: Optional[ChangeIndex] = None  # solo en modo json_output
+    environment: str = ""
+    metrics: Optional[RunMetrics] = None   # tiempos por fase, RSS y bytes de output
+    plan_cache: Optional[str] = None       # "hit" | "miss" en modo saved_plan
+    plan_artifact: Optional[str] = None    # ruta del plan guardado usado/creado
+    state_changes: Optional[StateDiff] = None  # diff del state antes/después de apply/destroy
+    throttle_retries: int = 0              # fases repetidas por throttling de ARM
+
+@dataclass
+class ProgressEvent:
+    """Evento emitido durante una ejecución en modo streaming"""
+    environment: str
+    tool: str
+    phase: str         # init, validate, plan, apply, destroy...
+    kind: str          # start | stdout | stderr | resource | throttle | retry | exit | done
+    line: str = ""
+    action: str = ""   # created | modified | destroyed (solo kind=resource)
+    address: str = ""  # dirección del recurso (solo kind=resource)
+    returncode: Optional[int] = None
+    result: Optional[ToolResult] = None  # solo kind=done (astream)
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+# Pipeline de una ejecución: genera (fase, comando), recibe el resultado del
+# proceso y devuelve el resultado final. Lo consumen _drive (síncrono) y
+# _adrive (asyncio), así ambos APIs comparten init cache, planes guardados, etc.
+_Steps = Generator[Tuple[str, List[str]], subprocess.CompletedProcess, subprocess.CompletedProcess]
+
+# Máximo de bytes por línea al leer de un proceso asyncio
+_ASYNC_LINE_LIMIT = 1 << 24
+
+# Fases cuyo output describe cambios en recursos
+CHANGE_PHASES = ("plan", "apply", "destroy")
+# Fases que hablan con ARM: pasan por el pool de rate limit
+ARM_PHASES = CHANGE_PHASES
+
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+# Líneas de progreso de plan/apply que identifican la acción sobre un recurso
+_RESOURCE_PATTERNS = [
+    (re.compile(r"^(?P<address>\S*azurerm_\S+): Creation complete"), "created"),
+    (re.compile(r"^(?P<address>\S*azurerm_\S+): Modifications complete"), "modified"),
+    (re.compile(r"^(?P<address>\S*azurerm_\S+): Destruction complete"), "destroyed"),
+    (re.compile(r"^# (?P<address>\S*azurerm_\S+) will be created"), "created"),
+    (re.compile(r"^# (?P<address>\S*azurerm_\S+) will be updated in-place"), "modified"),
+    (re.compile(r"^# (?P<address>\S*azurerm_\S+) (?:will be destroyed|must be replaced)"), "destroyed"),
+]
+
+def _parse_resource_line(line: str) -> Optional[Tuple[str, str, str]]:
+    """Devuelve (línea, acción, dirección) si la línea describe un recurso azurerm_"""
+    if "azurerm_" not in line:
+        return None
+    text = _ANSI_ESCAPE.sub("", line).strip()
+    for pattern, action in _RESOURCE_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return text, action, match.group("address")
+    for keyword in ("created", "modified", "destroyed"):
+        if keyword in text:
+            return text, keyword, ""
+    return None
+
+class _Execution:
+    """Estado de una ejecución: cwd, modo streaming y recursos detectados.
+    
+    En modo streaming stdout/stderr se leen línea a línea y solo se conservan
+    las últimas ``tail_lines`` líneas, así que la memoria no crece con el
+    tamaño del output de la herramienta: lo único que crece es una entrada
+    por recurso distinto (su dirección y la última acción vista), es decir,
+    O(recursos) y no O(output). Con ``json_output`` las fases de plan/apply
+    se ejecutan con ``-json`` y alimentan un ChangeIndex.
+    
+    Con ``limiter`` las fases de ARM esperan un permiso del pool para
+    ``scope`` (suscripción, región) y su output se vigila en busca de
+    throttling.
+    """
+    
+    def __init__(self, tool: str, environment: str, cwd: Path,
+                 stream: bool = False, on_progress: Optional[ProgressCallback] = None,
+                 tail_lines: int = 200, env: Optional[Dict[str, str]] = None,
+                 json_output: bool = False, saved_plan: bool = False,
+                 event_queue: Optional["asyncio.Queue"] = None,
+                 limiter: Optional[RateLimitPool] = None, scope: Tuple[str, str] = ("", "")):
+        self.tool = tool
+        self.environment = environment
+        self.cwd = cwd
+        self.env = env
+        self.init_cache: Optional[str] = None
+        self.stream = stream or on_progress is not None or event_queue is not None
+        self.event_queue = event_queue
+        self.on_progress = on_progress
+        self.tail_lines = tail_lines
+        self.json_output = json_output
+        self.saved_plan = saved_plan
+        self.plan_cache: Optional[str] = None
+        self.plan_artifact: Optional[str] = None
+        self.changes: Optional[ChangeIndex] = ChangeIndex() if json_output else None
+        self.state_changes: Optional[StateDiff] = None
+        # Dirección (o la línea, si no la hay) -> última acción: plan y apply
+        # del mismo recurso cuentan una sola vez
+        self._resources: Dict[str, str] = {}
+        self.metrics = RunMetrics()
+        self._emit_lock = threading.Lock()
+        self.limiter = limiter
+        self.scope = scope
+        self.permit: Optional[Permit] = None
+        self.throttle_retries = 0
+    
+    @property
+    def resources(self) -> List[str]:
+        if self.state_changes is not None:
+            return self.state_changes.addresses()
+        if self.changes is not None:
+            return [record.address for record in self.changes.changed()]
+        return list(self._resources)
+    
+    def call(self, phase: str, cmd: List[str]) -> subprocess.CompletedProcess:
+        """Ejecuta un comando de la fase indicada en el directorio del entorno
+        
+        Registra en ``metrics`` la duración de la fase, el coste de arranque
+        del proceso, su pico de RSS y los bytes de output.
+        """
+        if self.stream:
+            self._emit(self._event(phase, "start", line=" ".join(cmd)))
+        
+        started = time.perf_counter()
+        process = subprocess.Popen(cmd, cwd=self.cwd, env=self.env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        spawned = time.perf_counter()
+        
+        # En modo streaming solo se conserva la cola del output
+        limit = self.tail_lines if self.stream else None
+        stdout_lines: deque = deque(maxlen=limit)
+        stderr_lines: deque = deque(maxlen=limit)
+        stderr_bytes = 0
+        stdout_bytes = 0
+        
+        def pump_stderr():
+            nonlocal stderr_bytes
+            for raw in process.stderr:
+                stderr_bytes += len(raw)
+                line = raw.decode(errors="replace")
+                stderr_lines.append(line)
+                self._emit(self._event(phase, "stderr", line=line.rstrip("\n")))
+                self._watch_throttle(phase, line)
+        
+        stderr_reader = threading.Thread(target=pump_stderr, daemon=True)
+        stderr_reader.start()
+        
+        try:
+            for raw in process.stdout:
+                stdout_bytes += len(raw)
+                line = raw.decode(errors="replace")
+                stdout_lines.append(line)
+                self._emit(self._event(phase, "stdout", line=line.rstrip("\n")))
+                self._watch_throttle(phase, line)
+                resource_event = self._handle_line(phase, line)
+                if resource_event is not None:
+                    self._emit(resource_event)
+            stderr_reader.join()
+            returncode, rss_kb = _wait_with_rusage(process)
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            stderr_reader.join()
+            process.stdout.close()
+            process.stderr.close()
+        
+        self.metrics.record_process(phase, time.perf_counter() - started, spawned - started,
+                                    rss_kb, stdout_bytes, stderr_bytes)
+        self._emit(self._event(phase, "exit", returncode=returncode))
+        return subprocess.CompletedProcess(cmd, returncode,
+                                           "".join(stdout_lines), "".join(stderr_lines))
+    
+    async def acall(self, phase: str, cmd: List[str],
+                    cancel_grace: float = 10.0) -> subprocess.CompletedProcess:
+        """Versión asyncio de call(): mismo tratamiento de output y métricas
+        
+        Si la tarea se cancela (o vence un timeout) el proceso recibe SIGINT
+        para que la herramienta libere el lock del state, y SIGKILL si no
+        termina en ``cancel_grace`` segundos. El pico de RSS no está
+        disponible: al hijo lo recoge el event loop.
+        """
+        if self.stream:
+            await self._aemit(self._event(phase, "start", line=" ".join(cmd)))
+        
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *cmd, cwd=self.cwd, env=self.env, limit=_ASYNC_LINE_LIMIT,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        spawned = time.perf_counter()
+        
+        limit = self.tail_lines if self.stream else None
+        lines = {"stdout": deque(maxlen=limit), "stderr": deque(maxlen=limit)}
+        sizes = {"stdout": 0, "stderr": 0}
+        
+        async def pump(reader: asyncio.StreamReader, name: str):
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    return
+                sizes[name] += len(raw)
+                line = raw.decode(errors="replace")
+                lines[name].append(line)
+                await self._aemit(self._event(phase, name, line=line.rstrip("\n")))
+                if self.permit is not None and self.permit.observe(line):
+                    await self._aemit(self._event(phase, "throttle", line=line.strip()))
+                if name == "stdout":
+                    resource_event = self._handle_line(phase, line)
+                    if resource_event is not None:
+                        await self._aemit(resource_event)
+        
+        try:
+            await asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"))
+            returncode = await process.wait()
+        except BaseException:
+            await _terminate_async(process, cancel_grace)
+            raise
+        
+        self.metrics.record_process(phase, time.perf_counter() - started, spawned - started,
+                                    None, sizes["stdout"], sizes["stderr"])
+        await self._aemit(self._event(phase, "exit", returncode=returncode))
+        return subprocess.CompletedProcess(cmd, returncode, "".join(lines["stdout"]),
+                                           "".join(lines["stderr"]))
+    
+    def gated_call(self, phase: str, cmd: List[str]) -> subprocess.CompletedProcess:
+        """call() con permiso del pool de rate limit y reintento si hubo throttling"""
+        if not self._gated(phase):
+            return self.call(phase, cmd)
+        while True:
+            self.permit = self.limiter.acquire(self.environment, *self.scope)
+            try:
+                result = self.call(phase, with_parallelism(cmd, self.limiter.parallelism(*self.scope)))
+            finally:
+                permit, self.permit = self.permit, None
+                permit.release()
+            if not self._retry_throttled(phase, cmd, result, permit):
+                return result
+            self._emit(self._event(phase, "retry", line=" ".join(cmd)))
+
+    async def agated_call(self, phase: str, cmd: List[str]) -> subprocess.CompletedProcess:
+        """Versión asyncio de gated_call()"""
+        if not self._gated(phase):
+            return await self.acall(phase, cmd)
+        while True:
+            self.permit = await self.limiter.aacquire(self.environment, *self.scope)
+            try:
+                result = await self.acall(
+                    phase, with_parallelism(cmd, self.limiter.parallelism(*self.scope)))
+            finally:
+                permit, self.permit = self.permit, None
+                permit.release()
+            if not self._retry_throttled(phase, cmd, result, permit):
+                return result
+            await self._aemit(self._event(phase, "retry", line=" ".join(cmd)))
+
+    def _gated(self, phase: str) -> bool:
+        return self.limiter is not None and bool(self.scope[0]) and phase in ARM_PHASES
+
+    def _retry_throttled(self, phase: str, cmd: List[str], result: subprocess.CompletedProcess,
+                         permit: Permit) -> bool:
+        """¿Repetir la fase? Solo si falló con throttling y quedan reintentos
+
+        El apply de un plan guardado no se repite: tras un apply parcial el
+        plan queda obsoleto.
+        """
+        if result.returncode == 0 or not permit.throttled:
+            return False
+        if self.throttle_retries >= THROTTLE_RETRIES:
+            return False
+        if self.plan_artifact and self.plan_artifact in cmd:
+            return False
+        self.throttle_retries += 1
+        return True
+
+    def _watch_throttle(self, phase: str, line: str):
+        if self.permit is not None and self.permit.observe(line):
+            self._emit(self._event(phase, "throttle", line=line.strip()))
+
+    def _handle_line(self, phase: str, line: str) -> Optional[ProgressEvent]:
+        """Detecta cambios de recursos en una línea de stdout (devuelve el evento)"""
+        if self.changes is not None and phase in CHANGE_PHASES:
+            record = self.changes.feed_line(line)
+            if record is not None and record.action not in ("no-op", "read"):
+                return self._event(phase, "resource", line=line.strip(),
+                                   action=record.action, address=record.address)
+            return None
+        
+        parsed = _parse_resource_line(line)
+        if parsed:
+            text, action, address = parsed
+            self._resources[address or text] = action
+            return self._event(phase, "resource", line=text, action=action, address=address)
+        return None
+    
+    def _emit(self, event: ProgressEvent):
+        if self.on_progress is None:
+            return
+        with self._emit_lock:
+            self.on_progress(event)
+    
+    async def _aemit(self, event: ProgressEvent):
+        if self.event_queue is not None:
+            # Cola acotada: si el consumidor va lento, la lectura del proceso espera
+            await self.event_queue.put(event)
+        else:
+            self._emit(event)
+    
+    def _event(self, phase: str, kind: str, **fields) -> ProgressEvent:
+        return ProgressEvent(environment=self.environment, tool=self.tool,
+                             phase=phase, kind=kind, **fields)
+
+async def _terminate_async(process: "asyncio.subprocess.Process", grace: float):
+    if process.returncode is not None:
+        return
+    try:
+        process.send_signal(signal.SIGINT)
+        await asyncio.wait_for(process.wait(), grace)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+def _advance(steps: _Steps, value: Optional[subprocess.CompletedProcess]):
+    """Avanza el pipeline: (False, (fase, cmd)) o (True, resultado final)"""
+    try:
+        return False, steps.send(value)
+    except StopIteration as finished:
+        return True, finished.value
+
+def _drive(steps: _Steps, run: "_Execution") -> subprocess.CompletedProcess:
+    """Ejecuta el pipeline con procesos bloqueantes"""
+    try:
+        done, payload = _advance(steps, None)
+        while not done:
+            phase, cmd = payload
+            done, payload = _advance(steps, run.gated_call(phase, cmd))
+        return payload
+    finally:
+        steps.close()
+
+async def _adrive(steps: _Steps, run: "_Execution") -> subprocess.CompletedProcess:
+    """Ejecuta el pipeline con procesos asyncio
+    
+    El código entre procesos (hash de inputs, lectura del serial del state...)
+    se avanza en un hilo para no bloquear el event loop; los procesos de la
+    herramienta no ocupan ningún hilo mientras corren.
+    """
+    try:
+        done, payload = await _aadvance(steps, None)
+        while not done:
+            phase, cmd = payload
+            result = await run.agated_call(phase, cmd)
+            done, payload = await _aadvance(steps, result)
+        return payload
+    finally:
+        steps.close()
+
+async def _aadvance(steps: _Steps, value: Optional[subprocess.CompletedProcess]):
+    """_advance en un hilo; si la tarea se cancela, espera a que el hilo suelte el generador
+    
+    Cerrar el generador mientras el hilo sigue dentro lanzaría ``ValueError:
+    generator already executing`` y taparía el ``CancelledError``.
+    """
+    advancing = asyncio.ensure_future(asyncio.to_thread(_advance, steps, value))
+    try:
+        return await asyncio.shield(advancing)
+    except asyncio.CancelledError:
+        while not advancing.done():
+            try:
+                await asyncio.wait({advancing})
+            except asyncio.CancelledError:
+                pass
+        if not advancing.cancelled():
+            advancing.exception()  # ya no interesa: se propaga la cancelación
+        raise
+
+async def _acquire_in_thread(lock: threading.Lock):
+    """Toma un threading.Lock sin bloquear el event loop ni sondear"""
+    if lock.acquire(blocking=False):
+        return
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # El hilo acabará tomando el lock: se suelta en cuanto lo consiga
+        acquiring.add_done_callback(lambda _: lock.release())
+        raise
+
+def _wait_with_rusage(process: subprocess.Popen) -> Tuple[int, Optional[int]]:
+    """Espera al proceso y devuelve (returncode, pico de RSS en KB) del propio hijo"""
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    _, status, usage = os.wait4(process.pid, 0)
+    # Marcar el Popen como terminado para que no intente recoger el pid de nuevo
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage.ru_maxrss
+
+def _arm_scope(variables: Dict) -> Tuple[str, str]:
+    """(suscripción, región) a las que apunta una ejecución, para el rate limit"""
+    subscription = variables.get("subscription_id") or os.environ.get("ARM_SUBSCRIPTION_ID", "")
+    region = variables.get("location") or variables.get("region") or ""
+    return str(subscription), str(region)
+
+def _extract_resource_lines(output: str) -> List[str]:
+    """Recursos del output completo, una entrada por dirección (igual que en streaming)"""
+    resources: Dict[str, str] = {}
+    for line in output.split('\n'):
+        parsed = _parse_resource_line(line)
+        if parsed:
+            text, action, address = parsed
+            resources[address or text] = action
+    return list(resources)
 
 class MultiToolRunner:
-    def __init__(self, project_root: str):
+    def __init__(self, project_root: str, max_workers: int = 4,
+                 cache_dir: Optional[str] = None, use_init_cache: bool = True,
+                 probe_ttl: float = 3600.0,
+                 rate_limiter: Optional[RateLimitPool] = None, use_rate_limit: bool = True,
+                 remote_state_diff: bool = False):
         self.project_root = Path(project_root)
         self.supported_tools = ["terraform", "tofu", "terragrunt"]
+        self.max_workers = max_workers
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.init_cache = InitCache(self.cache_dir) if use_init_cache else None
+        self.tool_probe = ToolProbeCache(self.cache_dir / "tool-probe.json", ttl=probe_ttl)
+        self.plan_artifacts = PlanArtifactStore(self.cache_dir)
+        # Pool compartido por defecto: todos los runners del proceso reparten los mismos buckets
+        self.rate_limiter = (rate_limiter or shared_pool()) if use_rate_limit else None
+        # Con backend remoto el diff del state cuesta dos ``show -json`` por apply
+        self.remote_state_diff = remote_state_diff
+        self._env_locks: Dict[str, threading.Lock] = {}  # ruta del stack -> lock
+        self._env_locks_guard = threading.Lock()
+        self._async_slots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._async_env_locks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
     
-    def check_tool_availability(self) -> Dict[str, bool]:
-        """Verifica qué herramientas están disponibles"""
-        availability = {}
-        
-        for tool in self.supported_tools:
-            try:
-                result = subprocess.run([tool, "--version"], 
-                                      capture_output=True, text=True, timeout=10)
-                availability[tool] = result.returncode == 0
-            except (subprocess.TimeoutExpired, FileNotFoundError):
-                availability[tool] = False
+    def _env_lock(self, stack_dir: Path) -> threading.Lock:
+        """Lock por stack: dos ejecuciones sobre el mismo state nunca se solapan"""
+        key = str(Path(stack_dir).resolve())
+        with self._env_locks_guard:
+            lock = self._env_locks.get(key)
+            if lock is None:
+                lock = self._env_locks[key] = threading.Lock()
+            return lock
+    
+    def check_tool_availability(self, refresh: bool = False) -> Dict[str, bool]:
+        """Verifica qué herramientas están disponibles
         
-        return availability
+        Usa el cache de probes (memoria + disco, con TTL); ``refresh=True``
+        fuerza a volver a ejecutar ``<tool> --version``.
+        """
+        return self.tool_probe.availability(self.supported_tools, refresh=refresh)
     
     def execute_with_tool(self, tool: str, environment: str, 
-                         variables: Dict, action: str = "apply") -> ToolResult:
-        """Ejecuta acción con herramienta específica"""
+                         variables: Dict, action: str = "apply",
+                         stream: bool = False,
+                         on_progress: Optional[ProgressCallback] = None,
+                         json_output: bool = False,
+                         saved_plan: bool = False) -> ToolResult:
+        """Ejecuta acción con herramienta específica
         
-        import time
-        start_time = time.time()
+        Con ``stream=True`` (implícito si se pasa ``on_progress``) el output se
+        procesa línea a línea: los recursos se detectan a medida que aparecen,
+        ``on_progress`` recibe un ProgressEvent por línea/recurso y
+        ``output``/``error`` contienen solo las últimas líneas.
+        
+        Con ``json_output=True`` plan/apply usan ``-json``: ``changes`` recibe
+        un ChangeIndex tipado y ``resources_created`` las direcciones cambiadas.
+        
+        Con ``saved_plan=True`` plan escribe un artefacto ``-out`` reutilizable
+        y apply aplica ese artefacto en lugar de recalcular el plan.
+        """
         
         env_dir = self.project_root / "environments" / environment
         
         if not env_dir.exists():
-            return ToolResult(
-                tool=tool,
-                success=False,
-                output="",
-                error=f"Environment directory {env_dir} not found",
-                resources_created=[],
-                execution_time=0
-            )
+            return self._failed(tool, environment, f"Environment directory {env_dir} not found", 0)
+        
+        return self._execute_in(tool, environment, env_dir, variables, action, stream,
+                                on_progress, json_output, saved_plan)
+    
+    def execute_stack(self, tool: str, stack: Stack, variables: Dict, action: str = "apply",
+                      stream: bool = False,
+                      on_progress: Optional[ProgressCallback] = None,
+                      json_output: bool = False,
+                      saved_plan: bool = False) -> ToolResult:
+        """Ejecuta la acción sobre un stack descubierto (entorno o módulo)"""
+        return self._execute_in(tool, stack.name, stack.path, variables, action, stream,
+                                on_progress, json_output, saved_plan)
+    
+    def _execute_in(self, tool: str, name: str, stack_dir: Path, variables: Dict,
+                    action: str, stream: bool, on_progress: Optional[ProgressCallback],
+                    json_output: bool, saved_plan: bool) -> ToolResult:
+        start_time = time.time()
         
         try:
-            # Cambiar al directorio del entorno
-            original_cwd = Path.cwd()
-            import os
-            os.chdir(env_dir)
-            
-            # Ejecutar según herramienta
-            if tool == "terraform":
-                result = self._run_terraform(action, variables)
-            elif tool == "tofu":
-                result = self._run_opentofu(action, variables)
-            elif tool == "terragrunt":
-                result = self._run_terragrunt(action, variables)
-            else:
-                raise ValueError(f"Unsupported tool: {tool}")
-            
-            execution_time = time.time() - start_time
+            # Cada subproceso recibe su propio cwd: no se toca el cwd del proceso,
+            # así que es seguro ejecutar varios entornos desde hilos distintos
+            run = self._new_execution(tool, name, stack_dir, variables, stream, on_progress,
+                                      json_output, saved_plan)
+            with self._env_lock(stack_dir):
+                result = _drive(self._pipeline(tool, action, variables, run), run)
             
-            return ToolResult(
-                tool=tool,
-                success=result.returncode == 0,
-                output=result.stdout,
-                error=result.stderr,
-                resources_created=self._extract_resources(result.stdout),
-                execution_time=execution_time
-            )
+            return self._tool_result(run, result, time.time() - start_time)
             
         except Exception as e:
-            return ToolResult(
-                tool=tool,
-                success=False,
-                output="",
-                error=str(e),
-                resources_created=[],
-                execution_time=time.time() - start_time
-            )
+            return self._failed(tool, name, str(e), time.time() - start_time)
+    
+    async def aexecute(self, tool: str, environment: str,
+                       variables: Dict, action: str = "apply",
+                       timeout: Optional[float] = None,
+                       stream: bool = False,
+                       on_progress: Optional[ProgressCallback] = None,
+                       json_output: bool = False,
+                       saved_plan: bool = False,
+                       _event_queue: Optional["asyncio.Queue"] = None) -> ToolResult:
+        """Versión asyncio de execute_with_tool
+        
+        Los procesos corren con ``asyncio.create_subprocess_exec``: cientos de
+        ejecuciones pueden estar en vuelo sin un hilo por proceso. La
+        concurrencia se limita con ``max_workers`` (por event loop) y el lock
+        por entorno es el mismo que el del API síncrono.
+        
+        Si vence ``timeout`` el proceso en curso recibe SIGINT (y SIGKILL tras
+        un periodo de gracia) y se devuelve un ToolResult fallido. Cancelar la
+        tarea hace lo mismo y propaga ``CancelledError``.
+        """
+        
+        start_time = time.time()
+        env_dir = self.project_root / "environments" / environment
+        if not env_dir.exists():
+            return self._failed(tool, environment, f"Environment directory {env_dir} not found", 0)
+        
+        async def execute() -> ToolResult:
+            run = self._new_execution(tool, environment, env_dir, variables, stream, on_progress,
+                                      json_output, saved_plan, _event_queue)
+            # Primero el lock asyncio del entorno (las corrutinas en espera no ocupan
+            # slot ni sondean) y después el de hilos, compartido con el API síncrono
+            async with self._async_env_lock(env_dir), self._async_slot():
+                lock = self._env_lock(env_dir)
+                await _acquire_in_thread(lock)
+                try:
+                    result = await _adrive(self._pipeline(tool, action, variables, run), run)
+                finally:
+                    lock.release()
+            return self._tool_result(run, result, time.time() - start_time)
+        
+        try:
+            return await asyncio.wait_for(execute(), timeout)
+        except asyncio.TimeoutError:
+            return self._failed(tool, environment, f"Timeout after {timeout}s",
+                                time.time() - start_time)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self._failed(tool, environment, str(e), time.time() - start_time)
+    
+    async def aexecute_many(self, tool: Optional[str], environments: Sequence[str],
+                            variables: Dict, action: str = "apply",
+                            timeout: Optional[float] = None,
+                            on_progress: Optional[ProgressCallback] = None,
+                            json_output: bool = False,
+                            saved_plan: bool = False) -> Dict[str, ToolResult]:
+        """Versión asyncio de execute_many (``timeout`` se aplica por entorno)"""
+        
+        environments = list(dict.fromkeys(environments))
+        if not environments:
+            return {}
+        
+        async def run(environment: str) -> ToolResult:
+            selected = tool or await asyncio.to_thread(
+                self.get_tool_recommendation, environment, "simple")
+            return await self.aexecute(selected, environment, variables, action, timeout=timeout,
+                                       on_progress=on_progress, json_output=json_output,
+                                       saved_plan=saved_plan)
+        
+        results = await asyncio.gather(*(run(env) for env in environments))
+        return dict(zip(environments, results))
+    
+    async def astream(self, tool: str, environment: str,
+                      variables: Dict, action: str = "apply",
+                      timeout: Optional[float] = None,
+                      json_output: bool = False,
+                      saved_plan: bool = False,
+                      max_pending: int = 1000) -> AsyncIterator[ProgressEvent]:
+        """Ejecuta la acción y produce sus ProgressEvent a medida que llegan
+        
+        El último evento es ``kind="done"`` con el ToolResult en ``result``.
+        La cola es acotada (``max_pending``): un consumidor lento frena la
+        lectura del proceso en lugar de acumular output en memoria. Cerrar el
+        generador antes de tiempo cancela la ejecución.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        task = asyncio.ensure_future(self.aexecute(
+            tool, environment, variables, action, timeout=timeout,
+            json_output=json_output, saved_plan=saved_plan, _event_queue=queue))
+        
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                while not queue.empty():
+                    yield queue.get_nowait()
+                result = task.result()
+                yield ProgressEvent(environment, tool, action, "done",
+                                    returncode=0 if result.success else 1, result=result)
+                return
         finally:
-            os.chdir(original_cwd)
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+    
+    def _async_slot(self) -> asyncio.Semaphore:
+        """Semáforo de ``max_workers`` del event loop actual"""
+        loop = asyncio.get_running_loop()
+        with self._env_locks_guard:
+            slot = self._async_slots.get(loop)
+            if slot is None:
+                slot = self._async_slots[loop] = asyncio.Semaphore(self.max_workers)
+            return slot
+    
+    def _async_env_lock(self, stack_dir: Path) -> asyncio.Lock:
+        """asyncio.Lock por stack en el event loop actual"""
+        loop = asyncio.get_running_loop()
+        key = str(Path(stack_dir).resolve())
+        with self._env_locks_guard:
+            locks = self._async_env_locks.setdefault(loop, {})
+            lock = locks.get(key)
+            if lock is None:
+                lock = locks[key] = asyncio.Lock()
+            return lock
+    
+    def _new_execution(self, tool: str, environment: str, env_dir: Path, variables: Dict,
+                       stream: bool, on_progress: Optional[ProgressCallback], json_output: bool,
+                       saved_plan: bool, event_queue: Optional["asyncio.Queue"] = None) -> _Execution:
+        return _Execution(tool, environment, env_dir, stream, on_progress,
+                          env=self.init_cache.tool_env() if self.init_cache else None,
+                          json_output=json_output, saved_plan=saved_plan,
+                          event_queue=event_queue, limiter=self.rate_limiter,
+                          scope=_arm_scope(variables))
+    
+    @staticmethod
+    def _tool_result(run: _Execution, result: subprocess.CompletedProcess,
+                     execution_time: float) -> ToolResult:
+        return ToolResult(
+            tool=run.tool,
+            success=result.returncode == 0,
+            output=result.stdout,
+            error=result.stderr,
+            resources_created=run.resources,
+            execution_time=execution_time,
+            init_cache=run.init_cache,
+            changes=run.changes,
+            environment=run.environment,
+            metrics=run.metrics,
+            plan_cache=run.plan_cache,
+            plan_artifact=run.plan_artifact,
+            state_changes=run.state_changes,
+            throttle_retries=run.throttle_retries
+        )
+    
+    @staticmethod
+    def _failed(tool: str, environment: str, error: str, execution_time: float) -> ToolResult:
+        return ToolResult(
+            tool=tool,
+            success=False,
+            output="",
+            error=error,
+            resources_created=[],
+            execution_time=execution_time,
+            environment=environment
+        )
+    
+    def execute_many(self, tool: Optional[str], environments: Sequence[str],
+                     variables: Dict, action: str = "apply",
+                     max_workers: Optional[int] = None,
+                     on_progress: Optional[ProgressCallback] = None,
+                     json_output: bool = False,
+                     saved_plan: bool = False) -> Dict[str, ToolResult]:
+        """Ejecuta la acción en varios entornos a la vez con un pool acotado.
+        
+        Si ``tool`` es None se usa la herramienta recomendada para cada entorno.
+        El tiempo total se aproxima al del entorno más lento, no a la suma.
+        """
+        
+        environments = list(dict.fromkeys(environments))
+        if not environments:
+            return {}
+        
+        workers = min(max_workers or self.max_workers, len(environments))
+        
+        def run(environment: str) -> ToolResult:
+            selected = tool or self.get_tool_recommendation(environment, "simple")
+            return self.execute_with_tool(selected, environment, variables, action,
+                                          on_progress=on_progress, json_output=json_output,
+                                          saved_plan=saved_plan)
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="iac-env") as pool:
+            futures = {env: pool.submit(run, env) for env in environments}
+            results = {}
+            for env, future in futures.items():
+                try:
+                    results[env] = future.result()
+                except Exception as e:
+                    results[env] = self._failed(tool or "", env, str(e), 0)
+        
+        return results
     
-    def _run_terraform(self, action: str, variables: Dict) -> subprocess.CompletedProcess:
+    def run_dag(self, tool: Optional[str], action: str, variables: Dict,
+                targets: Optional[Sequence[str]] = None,
+                workers: Optional[int] = None,
+                fail_fast: bool = True,
+                module_action: str = "validate",
+                on_progress: Optional[ProgressCallback] = None,
+                on_complete: Optional[Callable[[str, ToolResult], None]] = None,
+                json_output: bool = False) -> DagResult:
+        """Ejecuta la acción sobre todos los stacks en orden de dependencias
+        
+        Los stacks se descubren bajo ``environments/`` y ``modules/``; los
+        entornos ejecutan ``action`` y los módulos ``module_action``
+        (``validate`` por defecto: init sin backend + validate). ``targets``
+        limita la ejecución a esos stacks y sus dependencias. En ``destroy``
+        el grafo se recorre al revés: primero los dependientes.
+        """
+        stacks = discover_stacks(self.project_root)
+        if targets:
+            stacks = select(stacks, targets)
+        scheduler = DagScheduler(stacks, workers=workers or self.max_workers,
+                                 fail_fast=fail_fast, reverse=action == "destroy")
+        
+        def execute(stack: Stack) -> ToolResult:
+            # Un error al elegir herramienta cuenta como fallo del nodo: el
+            # scheduler omite sus dependientes (o detiene el resto con fail_fast)
+            start_time = time.time()
+            try:
+                if stack.kind == "module":
+                    return self.execute_stack(self._module_tool(tool), stack, {}, module_action,
+                                              on_progress=on_progress)
+                selected = tool or self.get_tool_recommendation(stack.path.name, "simple")
+                return self.execute_stack(selected, stack, variables, action,
+                                          on_progress=on_progress, json_output=json_output)
+            except Exception as e:
+                return self._failed(tool or "", stack.name, str(e), time.time() - start_time)
+        
+        return scheduler.run(execute, on_complete=on_complete)
+    
+    def _module_tool(self, tool: Optional[str]) -> str:
+        """Herramienta para validar un módulo (Terragrunt necesita terragrunt.hcl)"""
+        if tool in ("terraform", "tofu"):
+            return tool
+        availability = self.check_tool_availability()
+        for candidate in ("terraform", "tofu"):
+            if availability.get(candidate, False):
+                return candidate
+        raise RuntimeError("No IaC tools available")
+    
+    def _pipeline(self, tool: str, action: str, variables: Dict, run: _Execution) -> _Steps:
+        """Pasos (fase, comando) de la acción según la herramienta"""
+        if tool not in self.supported_tools:
+            raise ValueError(f"Unsupported tool: {tool}")
+        if action == "validate":
+            return self._run_validate(run)
+        if tool == "terraform":
+            return self._run_terraform(action, variables, run)
+        if tool == "tofu":
+            return self._run_opentofu(action, variables, run)
+        return self._run_terragrunt(action, variables, run)
+    
+    def _cached_init(self, run: _Execution, cmd: List[str]) -> _Steps:
+        """Ejecuta init salvo que el cache lo dé por vigente (devuelve None en ese caso)"""
+        if self.init_cache is None:
+            return (yield ("init", cmd))
+        
+        # Un init sin backend (validate) no deja el stack listo para plan/apply
+        backend = "-backend=false" not in cmd
+        tool_version = self.tool_probe.probe([run.tool])[run.tool].get("version", "")
+        if self.init_cache.is_fresh(run.tool, run.cwd, backend, tool_version):
+            run.init_cache = "hit"
+            return None
+        
+        run.init_cache = "miss"
+        result = yield ("init", cmd)
+        if result.returncode == 0:
+            self.init_cache.record(run.tool, run.cwd, backend, tool_version)
+        return result
+    
+    def _run_terraform(self, action: str, variables: Dict, run: _Execution) -> _Steps:
         """Ejecuta comandos Terraform"""
         
-        # Init
-        init_result = subprocess.run(["terraform", "init"], 
-                                   capture_output=True, text=True)
-        if init_result.returncode != 0:
+        # Init (se omite si el cache indica que sigue vigente)
+        init_result = yield from self._cached_init(run, ["terraform", "init"])
+        if init_result is not None and init_result.returncode != 0:
             return init_result
         
         # Validate
-        validate_result = subprocess.run(["terraform", "validate"], 
-                                       capture_output=True, text=True)
+        validate_result = yield ("validate", ["terraform", "validate"])
         if validate_result.returncode != 0:
             return validate_result
         
         # Plan/Apply
-        cmd = ["terraform", action]
-        if action == "apply":
-            cmd.append("-auto-approve")
-        
-        # Agregar variables
-        for key, value in variables.items():
-            cmd.extend(["-var", f"{key}={value}"])
-        
-        return subprocess.run(cmd, capture_output=True, text=True)
+        return (yield from self._run_action(action, variables, run))
     
-    def _run_opentofu(self, action: str, variables: Dict) -> subprocess.CompletedProcess:
+    def _run_opentofu(self, action: str, variables: Dict, run: _Execution) -> _Steps:
         """Ejecuta comandos OpenTofu"""
         
-        # Init
-        init_result = subprocess.run(["tofu", "init"], 
-                                   capture_output=True, text=True)
-        if init_result.returncode != 0:
+        # Init (se omite si el cache indica que sigue vigente)
+        init_result = yield from self._cached_init(run, ["tofu", "init"])
+        if init_result is not None and init_result.returncode != 0:
             return init_result
         
         # Apply/Plan
-        cmd = ["tofu", action]
-        if action == "apply":
-            cmd.append("-auto-approve")
+        return (yield from self._run_action(action, variables, run))
+    
+    def _run_terragrunt(self, action: str, variables: Dict, run: _Execution) -> _Steps:
+        """Ejecuta comandos Terragrunt (reenvía las variables a terraform)"""
+        
+        return (yield from self._run_action(action, variables, run))
+    
+    def _run_validate(self, run: _Execution) -> _Steps:
+        """Valida un stack sin tocar el backend (módulos y checks previos)"""
         
-        # Agregar variables
-        for key, value in variables.items():
-            cmd.extend(["-var", f"{key}={value}"])
+        if run.tool != "terragrunt":
+            init_result = yield from self._cached_init(run, [run.tool, "init", "-backend=false"])
+            if init_result is not None and init_result.returncode != 0:
+                return init_result
         
-        return subprocess.run(cmd, capture_output=True, text=True)
+        return (yield ("validate", [run.tool, "validate"]))
     
-    def _run_terragrunt(self, action: str, variables: Dict) -> subprocess.CompletedProcess:
-        """Ejecuta comandos Terragrunt"""
+    def _run_action(self, action: str, variables: Dict, run: _Execution) -> _Steps:
+        """Ejecuta plan/apply/destroy (vía plan guardado si la ejecución lo pide)
+        
+        Las variables van en ``ai-runner.auto.tfvars.json`` (JSON tipado), no
+        como argumentos ``-var``; el fichero se elimina al terminar la acción.
+        """
         
-        cmd = ["terragrunt", action]
-        if action == "apply":
-            cmd.append("-auto-approve")
+        with var_file(run.cwd, variables):
+            if run.saved_plan and action in ("plan", "apply"):
+                return (yield from self._run_saved_plan(action, variables, run))
+            
+            cmd = [run.tool, action]
+            if action == "apply":
+                cmd.append("-auto-approve")
+            if run.json_output:
+                cmd.append("-json")
+            
+            if action in ("apply", "destroy"):
+                return (yield from self._tracked_apply(action, cmd, run))
+            return (yield (action, cmd))
+    
+    def _tracked_apply(self, phase: str, cmd: List[str], run: _Execution,
+                       serial: Optional[str] = None) -> _Steps:
+        """Ejecuta apply/destroy y deja en ``run.state_changes`` el diff del state
         
-        return subprocess.run(cmd, capture_output=True, text=True)
+        Los recursos del resultado salen así del state real y no del texto
+        de la consola; si el state no se puede leer (o el backend es remoto
+        y no se pidió ``remote_state_diff``) se mantiene el escaneo.
+        ``serial`` es el del state ya leído para la clave del plan.
+        """
+        tracker = StateTracker(run.tool, run.cwd, run.env, remote=self.remote_state_diff)
+        tracker.begin(serial)
+        result = yield (phase, cmd)
+        if result.returncode == 0:
+            run.state_changes = tracker.finish()
+        return result
+    
+    def _run_saved_plan(self, action: str, variables: Dict, run: _Execution) -> _Steps:
+        """Plan una vez, apply del artefacto guardado
+        
+        ``plan`` con la misma clave (variables, configuración y serial del
+        state) se sirve desde el cache; ``apply`` aplica el artefacto sin
+        volver a calcular el plan y después lo descarta, porque el serial
+        del state cambia.
+        """
+        tool_version = self.tool_probe.probe([run.tool])[run.tool].get("version", "")
+        serial = state_serial(run.tool, run.cwd, run.env)
+        key = self.plan_artifacts.key(run.tool, tool_version, run.cwd, variables, serial)
+        artifact = self.plan_artifacts.lookup(run.environment, key)
+        
+        if artifact is not None:
+            run.plan_cache = "hit"
+            plan_result = subprocess.CompletedProcess([run.tool, "plan"], 0,
+                                                      f"Saved plan reused: {artifact}\n", "")
+            if run.json_output:
+                run.changes = self._show_plan(run.tool, run.cwd, artifact)
+        else:
+            run.plan_cache = "miss"
+            artifact = self.plan_artifacts.reserve(run.environment, key)
+            cmd = [run.tool, "plan", f"-out={artifact}"]
+            if run.json_output:
+                cmd.append("-json")
+            
+            plan_result = yield ("plan", cmd)
+            if plan_result.returncode != 0:
+                self.plan_artifacts.discard(artifact)
+                return plan_result
+        
+        run.plan_artifact = str(artifact)
+        if action == "plan":
+            return plan_result
+        
+        # Un plan guardado ya lleva variables y aprobación implícita
+        cmd = [run.tool, "apply"]
+        if run.json_output:
+            cmd.append("-json")
+        cmd.append(str(artifact))
+        try:
+            return (yield from self._tracked_apply("apply", cmd, run, serial))
+        finally:
+            self.plan_artifacts.discard(artifact)
+    
+    def show_plan(self, tool: str, environment: str, plan_file: str) -> ChangeIndex:
+        """Indexa un plan guardado leyendo ``<tool> show -json`` de forma incremental"""
+        return self._show_plan(tool, self.project_root / "environments" / environment, plan_file)
+    
+    def _show_plan(self, tool: str, env_dir: Path, plan_file) -> ChangeIndex:
+        import tempfile
+        
+        with tempfile.TemporaryFile(mode="w+") as stderr:
+            process = subprocess.Popen([tool, "show", "-json", str(plan_file)],
+                                       cwd=env_dir, text=True,
+                                       stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                index = ChangeIndex.from_plan_json(process.stdout)
+                process.stdout.read()  # drenar por si quedó output tras el array
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+            
+            if returncode != 0:
+                stderr.seek(0)
+                raise RuntimeError(f"{tool} show -json falló: {stderr.read().strip()}")
+        
+        return index
     
     def _extract_resources(self, output: str) -> List[str]:
         """Extrae recursos creados del output"""
-        resources = []
-        for line in output.split('\n'):
-            if any(keyword in line for keyword in ['created', 'modified', 'destroyed']):
-                if 'azurerm_' in line:
-                    resources.append(line.strip())
-        return resources
+        return _extract_resource_lines(output)
     
     def get_tool_recommendation(self, environment: str, complexity: str) -> str:
         """IA recomienda mejor herramienta según contexto"""
@@ -193,18 +1026,130 @@ class MultiToolRunner:
         
         raise RuntimeError("No IaC tools available")
 
+def _print_result(result: ToolResult, environment: str = ""):
+    label = f" [{environment}]" if environment else ""
+    print(f"\n📊 Resultado{label}:")
+    print(f"   Tool: {result.tool}")
+    print(f"   Success: {'✅' if result.success else '❌'}")
+    print(f"   Execution time: {result.execution_time:.2f}s")
+    print(f"   Resources: {len(result.resources_created)}")
+    if result.init_cache:
+        print(f"   Init cache: {result.init_cache}")
+    if result.plan_cache:
+        print(f"   Saved plan: {result.plan_cache} ({result.plan_artifact})")
+    if result.metrics is not None and result.metrics.phases:
+        phases = ", ".join(f"{phase}={seconds:.2f}s" for phase, seconds in result.metrics.phases.items())
+        print(f"   Phases: {phases} (spawn {result.metrics.total_spawn_overhead * 1000:.1f}ms)")
+        if result.metrics.peak_rss_kb is not None:
+            print(f"   Peak RSS: {result.metrics.peak_rss_kb / 1024:.1f} MiB")
+    if result.throttle_retries:
+        print(f"   Throttling retries: {result.throttle_retries}")
+    if result.changes is not None:
+        counts = ", ".join(f"{action}={n}" for action, n in sorted(result.changes.counts().items()))
+        print(f"   Changes: {counts or 'ninguno'}")
+    
+    if not result.success:
+        print(f"   Error: {result.error}")
+
+def _export_metrics(args, results):
+    records = [metrics_record(result) for result in results]
+    if args.metrics_jsonl:
+        append_jsonl(args.metrics_jsonl, records)
+    if args.metrics_prom:
+        write_prometheus_textfile(args.metrics_prom, records)
+
+def _print_progress(event: ProgressEvent):
+    if event.kind == "start":
+        print(f"   ▶️  [{event.environment}] {event.phase}: {event.line}", flush=True)
+    elif event.kind == "resource":
+        print(f"   📦 [{event.environment}] {event.action}: {event.address or event.line}", flush=True)
+    elif event.kind == "throttle":
+        print(f"   🐢 [{event.environment}] throttling de ARM en {event.phase}: {event.line}", flush=True)
+    elif event.kind == "retry":
+        print(f"   🔁 [{event.environment}] reintentando {event.phase} tras el backoff", flush=True)
+    elif event.kind == "exit" and event.returncode != 0:
+        print(f"   ❌ [{event.environment}] {event.phase} terminó con código {event.returncode}", flush=True)
+
+def _run_dag(runner: MultiToolRunner, args, environments: List[str], variables: Dict,
+             on_progress: Optional[ProgressCallback]) -> int:
+    """Ejecuta los stacks en orden de dependencias; devuelve el código de salida"""
+    targets = None
+    if environments != ["all"]:
+        targets = [env if "/" in env else f"environments/{env}" for env in environments]
+    
+    def on_complete(name: str, result: ToolResult):
+        print(f"   {'✅' if result.success else '❌'} {name} ({result.execution_time:.2f}s)", flush=True)
+    
+    print(f"\n🕸️  Ejecutando {args.action} en orden de dependencias "
+          f"(máx. {args.workers} en paralelo, {'continue-on-error' if args.continue_on_error else 'fail-fast'})...")
+    start_time = time.time()
+    outcome = runner.run_dag(args.tool, args.action, variables, targets=targets,
+                             fail_fast=not args.continue_on_error, on_progress=on_progress,
+                             on_complete=on_complete, json_output=args.json)
+    for number, wave in enumerate(outcome.waves, 1):
+        print(f"   Ola {number}: {', '.join(wave)}")
+    
+    for name, result in outcome.results.items():
+        _print_result(result, name)
+    _export_metrics(args, outcome.results.values())
+    
+    print(f"\n⏱️  Tiempo total: {time.time() - start_time:.2f}s "
+          f"(suma secuencial: {sum(r.execution_time for r in outcome.results.values()):.2f}s)")
+    if outcome.failed:
+        print(f"❌ Fallaron: {', '.join(outcome.failed)}")
+    for name, reason in outcome.skipped.items():
+        print(f"⏭️  Omitido {name}: {reason}")
+    return 0 if outcome.success else 1
+
 def main():
     """Ejecutar multi-tool runner"""
-    import sys
+    import argparse
     
-    if len(sys.argv) < 3:
-        print("Uso: python multi-tool-runner.py <environment> <action>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Ejecuta Terraform/OpenTofu/Terragrunt sobre uno o varios entornos")
+    parser.add_argument("environment",
+                        help="Entorno o lista separada por comas (dev,staging,prod-eastus)")
+    parser.add_argument("action", help="plan | apply | destroy")
+    parser.add_argument("--tool", choices=["terraform", "tofu", "terragrunt"],
+                        help="Forzar herramienta (por defecto: recomendación IA por entorno)")
+    parser.add_argument("--project-root",
+                        default=os.environ.get("AKS_IAC_PROJECT_ROOT",
+                                               "/home/giovanemere/edtech/azure-aks-iac"),
+                        help="Raíz del proyecto (contiene environments/ y modules/)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Entornos ejecutados en paralelo como máximo")
+    parser.add_argument("--no-init-cache", action="store_true",
+                        help="Ejecutar siempre init aunque los inputs no hayan cambiado")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="No limitar plan/apply por suscripción y región de Azure")
+    parser.add_argument("--saved-plan", action="store_true",
+                        help="plan -out reutilizable; apply aplica el plan guardado")
+    parser.add_argument("--json", action="store_true",
+                        help="Usar la salida -json de plan/apply para detectar cambios")
+    parser.add_argument("--metrics-jsonl", metavar="PATH",
+                        help="Añadir las métricas por fase como JSON lines")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="Escribir métricas para el textfile collector de Prometheus")
+    parser.add_argument("--stream", action="store_true",
+                        help="Mostrar fases y recursos a medida que la herramienta los reporta")
+    parser.add_argument("--dag", action="store_true",
+                        help="Ejecutar en orden de dependencias entre stacks "
+                             "(environment 'all' = todo el proyecto)")
+    parser.add_argument("--continue-on-error", action="store_true",
+                        help="Con --dag: seguir con las ramas que no dependen del fallo")
+    parser.add_argument("--remote-state-diff", action="store_true",
+                        help="Leer el state remoto antes/después de apply para listar los cambios")
+    args = parser.parse_args()
     
-    environment = sys.argv[1]
-    action = sys.argv[2]
+    on_progress = _print_progress if args.stream else None
     
-    runner = MultiToolRunner("/home/giovanemere/edtech/azure-aks-iac")
+    environments = [env.strip() for env in args.environment.split(",") if env.strip()]
+    action = args.action
+    
+    runner = MultiToolRunner(args.project_root, max_workers=args.workers,
+                             use_init_cache=not args.no_init_cache,
+                             use_rate_limit=not args.no_rate_limit,
+                             remote_state_diff=args.remote_state_diff)
     
     # Verificar herramientas disponibles
     availability = runner.check_tool_availability()
@@ -213,28 +1158,49 @@ def main():
         status = "✅" if available else "❌"
         print(f"   {status} {tool}")
     
-    # Obtener recomendación IA
-    recommended_tool = runner.get_tool_recommendation(environment, "simple")
-    print(f"\n🤖 IA recomienda: {recommended_tool}")
-    
     # Variables de ejemplo
     variables = {
         "subscription_id": "617fad55-504d-42d2-ba0e-267e8472a399",
         "project_name": "aks-demo"
     }
     
-    # Ejecutar
-    print(f"\n🚀 Ejecutando {action} con {recommended_tool}...")
-    result = runner.execute_with_tool(recommended_tool, environment, variables, action)
+    if args.dag:
+        sys.exit(_run_dag(runner, args, environments, variables, on_progress))
     
-    print(f"\n📊 Resultado:")
-    print(f"   Tool: {result.tool}")
-    print(f"   Success: {'✅' if result.success else '❌'}")
-    print(f"   Execution time: {result.execution_time:.2f}s")
-    print(f"   Resources: {len(result.resources_created)}")
+    if len(environments) == 1:
+        environment = environments[0]
+        
+        # Obtener recomendación IA
+        recommended_tool = args.tool or runner.get_tool_recommendation(environment, "simple")
+        print(f"\n🤖 IA recomienda: {recommended_tool}")
+        
+        # Ejecutar
+        print(f"\n🚀 Ejecutando {action} con {recommended_tool}...")
+        result = runner.execute_with_tool(recommended_tool, environment, variables, action,
+                                          on_progress=on_progress, json_output=args.json,
+                                          saved_plan=args.saved_plan)
+        _print_result(result)
+        _export_metrics(args, [result])
+        sys.exit(0 if result.success else 1)
     
-    if not result.success:
-        print(f"   Error: {result.error}")
+    # Modo paralelo: todos los entornos a la vez
+    print(f"\n🚀 Ejecutando {action} en {len(environments)} entornos "
+          f"(máx. {args.workers} en paralelo)...")
+    start_time = time.time()
+    results = runner.execute_many(args.tool, environments, variables, action,
+                                  on_progress=on_progress, json_output=args.json,
+                                  saved_plan=args.saved_plan)
+    
+    for environment, result in results.items():
+        _print_result(result, environment)
+    _export_metrics(args, results.values())
+    
+    failed = [env for env, result in results.items() if not result.success]
+    print(f"\n⏱️  Tiempo total: {time.time() - start_time:.2f}s "
+          f"(suma secuencial: {sum(r.execution_time for r in results.values()):.2f}s)")
+    if failed:
+        print(f"❌ Fallaron: {', '.join(failed)}")
+    sys.exit(1 if failed else 0)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,131 @@
+"""
+Plan Artifacts - Planes guardados (``plan -out``) reutilizables por apply
+
+Cada artefacto se guarda bajo una clave que combina herramienta y versión,
+variables, configuración del stack (módulos, tfvars, lock file) y el
+lineage/serial del state. Mientras la clave no cambie, un ``plan`` repetido
+se sirve desde el cache y un ``apply`` aplica el artefacto directamente,
+sin repetir el ciclo de refresh y diff.
+
+La misma clave sirve para recordar veredictos "sin cambios": si un plan
+no produjo diferencias, una ejecución posterior con la misma clave puede
+omitir plan y apply mientras el veredicto no caduque.
+"""
+
+import hashlib
+import json
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from stack_fingerprint import plan_inputs_digest
+
+_SERIAL = re.compile(r'"serial"\s*:\s*(\d+)')
+_LINEAGE = re.compile(r'"lineage"\s*:\s*"([^"]*)"')
+STATE_HEAD_BYTES = 1 << 16
+
+
+def serial_from_head(head: str) -> str:
+    """``lineage:serial`` a partir del principio de un state ("" si no aparece)"""
+    serial = _SERIAL.search(head)
+    lineage = _LINEAGE.search(head)
+    if not serial:
+        return ""
+    return f"{lineage.group(1) if lineage else ''}:{serial.group(1)}"
+
+
+def state_serial(tool: str, stack_dir: Path, env: Optional[Dict[str, str]] = None) -> str:
+    """``lineage:serial`` del state actual ("" si aún no hay state).
+
+    Solo se lee la cabecera del state: ``serial`` y ``lineage`` aparecen al
+    principio tanto en el fichero local como en la salida de ``state pull``.
+    """
+    local_state = Path(stack_dir) / "terraform.tfstate"
+    if local_state.exists():
+        with open(local_state, errors="replace") as f:
+            return serial_from_head(f.read(STATE_HEAD_BYTES))
+
+    process = subprocess.Popen([tool, "state", "pull"], cwd=stack_dir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        head = process.stdout.read(STATE_HEAD_BYTES)
+    finally:
+        process.kill()
+        process.stdout.close()
+        process.wait()
+    return serial_from_head(head)
+
+
+class PlanArtifactStore:
+    def __init__(self, cache_dir: Path, max_age: float = 24 * 3600, keep_per_environment: int = 5,
+                 unchanged_ttl: float = 3600.0):
+        self.root = Path(cache_dir) / "plans"
+        self.max_age = max_age
+        self.keep_per_environment = keep_per_environment
+        # Acota cuánto tiempo se confía en un "sin cambios" sin volver a mirar
+        # Azure (drift hecho fuera de Terraform no cambia el serial del state)
+        self.unchanged_ttl = unchanged_ttl
+
+    @staticmethod
+    def key(tool: str, tool_version: str, stack_dir: Path, variables: Dict, serial: str) -> str:
+        digest = hashlib.sha256()
+        for part in (tool, tool_version, plan_inputs_digest(stack_dir), serial,
+                     json.dumps(variables, sort_keys=True, default=str)):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()[:32]
+
+    def path_for(self, environment: str, key: str) -> Path:
+        return self.root / environment / f"{key}.tfplan"
+
+    def lookup(self, environment: str, key: str) -> Optional[Path]:
+        """Artefacto vigente para la clave, si existe y no ha caducado"""
+        path = self.path_for(environment, key)
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if age > self.max_age:
+            self.discard(path)
+            return None
+        return path
+
+    def reserve(self, environment: str, key: str) -> Path:
+        """Ruta donde ``plan -out`` debe escribir el artefacto de la clave"""
+        path = self.path_for(environment, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._prune(path.parent)
+        return path
+
+    def mark_unchanged(self, environment: str, key: str):
+        """Registra que un plan con esta clave no tenía cambios"""
+        marker = self.root / environment / f"{key}.noop"
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        self._prune(marker.parent, "*.noop")
+        marker.touch()
+
+    def is_unchanged(self, environment: str, key: str) -> bool:
+        """True si hay un veredicto "sin cambios" vigente para la clave"""
+        marker = self.root / environment / f"{key}.noop"
+        try:
+            age = time.time() - marker.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if age > self.unchanged_ttl:
+            self.discard(marker)
+            return False
+        return True
+
+    @staticmethod
+    def discard(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _prune(self, directory: Path, pattern: str = "*.tfplan"):
+        artifacts = sorted(directory.glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True)
+        for stale in artifacts[self.keep_per_environment - 1:]:
+            self.discard(stale)
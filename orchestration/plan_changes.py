@@ -0,0 +1,176 @@
+"""
+Plan Changes - Registros tipados de cambios a partir de la salida ``-json``
+
+Sustituye el escaneo de palabras clave en el output legible: los mensajes
+de ``plan -json`` / ``apply -json`` (uno por línea) y el documento de
+``show -json <planfile>`` se convierten en ChangeRecord indexados por tipo
+de recurso, acción, módulo y dirección.
+"""
+
+import json
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, TextIO
+
+from json_stream import iter_array_items
+
+# Acciones que no modifican infraestructura
+PASSIVE_ACTIONS = ("no-op", "read")
+
+
+@dataclass(frozen=True)
+class ChangeRecord:
+    action: str          # create | update | delete | replace | read | no-op | move | import | forget
+    address: str
+    resource_type: str
+    resource_name: str
+    module_path: str     # "" para el módulo raíz, p.ej. "module.aks"
+    applied: bool = False
+
+
+def _normalize_actions(actions: List[str]) -> str:
+    """Convierte la lista ``change.actions`` de ``show -json`` en una acción"""
+    if len(actions) == 2 and set(actions) == {"create", "delete"}:
+        return "replace"
+    return actions[0] if actions else "no-op"
+
+
+class ChangeIndex:
+    """Cambios de un plan/apply indexados para consultas O(resultado)"""
+
+    def __init__(self):
+        self._records: Dict[str, ChangeRecord] = {}
+        self._by_type: Dict[str, Dict[str, None]] = {}
+        self._by_action: Dict[str, Dict[str, None]] = {}
+        self._by_module: Dict[str, Dict[str, None]] = {}
+        self.summary: Optional[Dict[str, int]] = None
+        self.diagnostics: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def add(self, record: ChangeRecord):
+        previous = self._records.get(record.address)
+        if previous is not None:
+            self._by_action[previous.action].pop(record.address, None)
+        self._records[record.address] = record
+        self._by_type.setdefault(record.resource_type, {})[record.address] = None
+        self._by_action.setdefault(record.action, {})[record.address] = None
+        self._by_module.setdefault(record.module_path, {})[record.address] = None
+
+    def get(self, address: str) -> Optional[ChangeRecord]:
+        return self._records.get(address)
+
+    def query(self, resource_type: Optional[str] = None, action: Optional[str] = None,
+              module_path: Optional[str] = None) -> List[ChangeRecord]:
+        """Cambios que cumplen todos los filtros indicados"""
+        candidates = [index.get(value, {}) for index, value in (
+            (self._by_type, resource_type),
+            (self._by_action, action),
+            (self._by_module, module_path),
+        ) if value is not None]
+        if not candidates:
+            return list(self._records.values())
+
+        candidates.sort(key=len)
+        smallest, rest = candidates[0], candidates[1:]
+        return [self._records[address] for address in smallest
+                if all(address in other for other in rest)]
+
+    def by_type(self, resource_type: str) -> List[ChangeRecord]:
+        return self.query(resource_type=resource_type)
+
+    def by_action(self, action: str) -> List[ChangeRecord]:
+        return self.query(action=action)
+
+    def counts(self) -> Dict[str, int]:
+        return {action: len(addresses) for action, addresses in self._by_action.items() if addresses}
+
+    def counts_by_type(self) -> Dict[str, int]:
+        return dict(Counter(record.resource_type for record in self._records.values()))
+
+    def changed(self) -> List[ChangeRecord]:
+        """Cambios que modifican infraestructura (excluye no-op y read)"""
+        return [record for record in self._records.values()
+                if record.action not in PASSIVE_ACTIONS]
+
+    # --- Ingesta -------------------------------------------------------------
+
+    def feed_message(self, message: Dict) -> Optional[ChangeRecord]:
+        """Procesa un mensaje de ``plan -json``/``apply -json``; devuelve el registro si hubo cambio"""
+        kind = message.get("type")
+
+        if kind == "planned_change":
+            change = message.get("change", {})
+            resource = change.get("resource", {})
+            record = ChangeRecord(
+                action=change.get("action", "no-op"),
+                address=resource.get("addr", ""),
+                resource_type=resource.get("resource_type", ""),
+                resource_name=resource.get("resource_name", ""),
+                module_path=resource.get("module", ""),
+            )
+        elif kind == "apply_complete":
+            hook = message.get("hook", {})
+            resource = hook.get("resource", {})
+            record = ChangeRecord(
+                action=hook.get("action", "no-op"),
+                address=resource.get("addr", ""),
+                resource_type=resource.get("resource_type", ""),
+                resource_name=resource.get("resource_name", ""),
+                module_path=resource.get("module", ""),
+                applied=True,
+            )
+        elif kind == "change_summary":
+            self.summary = message.get("changes")
+            return None
+        elif kind == "diagnostic":
+            self.diagnostics.append(message.get("@message", ""))
+            return None
+        else:
+            return None
+
+        if not record.address:
+            return None
+        self.add(record)
+        return record
+
+    def feed_line(self, line: str) -> Optional[ChangeRecord]:
+        """Procesa una línea de salida ``-json``; las líneas no JSON se ignoran"""
+        line = line.strip()
+        if not line.startswith("{"):
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return None
+        return self.feed_message(message) if isinstance(message, dict) else None
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "ChangeIndex":
+        index = cls()
+        for line in lines:
+            index.feed_line(line)
+        return index
+
+    def feed_resource_change(self, change: Dict):
+        """Procesa un elemento de ``resource_changes`` de ``show -json``"""
+        self.add(ChangeRecord(
+            action=_normalize_actions(change.get("change", {}).get("actions", [])),
+            address=change.get("address", ""),
+            resource_type=change.get("type", ""),
+            resource_name=change.get("name", ""),
+            module_path=change.get("module_address", ""),
+        ))
+
+    @classmethod
+    def from_plan_json(cls, stream: TextIO) -> "ChangeIndex":
+        """Lee ``show -json <planfile>`` de forma incremental"""
+        index = cls()
+        for change in iter_array_items(stream, "resource_changes"):
+            if isinstance(change, dict) and change.get("address"):
+                index.feed_resource_change(change)
+        return index
@@ -0,0 +1,329 @@
+"""
+Rate Limit - Pool compartido que limita las ejecuciones contra Azure Resource Manager
+
+ARM limita las peticiones por suscripción y región: varios apply a la vez
+contra la misma suscripción reciben 429 y se frenan todos. Cada fase que
+habla con ARM (plan/apply/destroy) toma antes un permiso del pool:
+
+  - un token bucket por suscripción y otro por suscripción+región limitan
+    el ritmo de arranque de procesos (con ráfaga inicial)
+  - si el output de la herramienta muestra throttling (429,
+    ``SubscriptionRequestsThrottled``, ``Retry-After``...) el bucket baja su
+    ritmo a la mitad y se bloquea un backoff exponencial con jitter; cada
+    fase sin throttling lo sube un 10% del máximo (AIMD). Los 429 que llegan
+    durante un backoff vienen de peticiones anteriores a él y no reducen más
+  - los permisos se reparten por turnos entre entornos: un entorno con
+    muchas fases en cola no deja sin turno a los demás
+  - ``parallelism()`` traduce el ritmo actual a un ``-parallelism`` menor
+    que el de Terraform, para que el apply en curso también envíe menos
+
+Entre hilos (API síncrono, daemon) y event loops (``aacquire``) se comparte
+el mismo estado; ``shared_pool()`` es el pool del proceso.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# -parallelism por defecto de Terraform/OpenTofu
+DEFAULT_PARALLELISM = 10
+
+# Ritmos por defecto (fases por segundo, ráfaga)
+SUBSCRIPTION_RATE = 0.5
+SUBSCRIPTION_BURST = 8
+REGION_RATE = 0.5
+REGION_BURST = 4
+MIN_RATE = 0.01
+MAX_BACKOFF = 120.0
+BASE_BACKOFF = 2.0
+# Reintentos de una fase que falló por throttling (cada uno espera de nuevo su permiso)
+THROTTLE_RETRIES = 2
+
+# Espera máxima entre comprobaciones cuando el permiso está listo pero es de otro entorno
+_TURN_POLL_INTERVAL = 0.05
+
+_THROTTLE_HINTS = ("429", "hrottl", "TooManyRequests", "ate limit")
+_THROTTLE_PATTERN = re.compile(
+    r"(?:status|code|HTTP)\S{0,12}?[=: \"]*429\b|429 Too Many|TooManyRequests|throttl(?:ed|ing)|rate limit",
+    re.IGNORECASE)
+_RETRY_AFTER_PATTERN = re.compile(r"retry[-_ ]?after\D{0,4}(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+BucketKey = Tuple[str, ...]
+
+
+def detect_throttle(line: str) -> Optional[float]:
+    """Segundos de ``Retry-After`` si la línea indica throttling (0.0 sin pista), None si no"""
+    if not any(hint in line for hint in _THROTTLE_HINTS) or not _THROTTLE_PATTERN.search(line):
+        return None
+    match = _RETRY_AFTER_PATTERN.search(line)
+    return float(match.group(1)) if match else 0.0
+
+
+def with_parallelism(cmd: List[str], parallelism: int) -> List[str]:
+    """``cmd`` con ``-parallelism`` reducido (sin cambios si no hay que reducir)"""
+    if parallelism >= DEFAULT_PARALLELISM or any(arg.startswith("-parallelism") for arg in cmd):
+        return cmd
+    return cmd[:2] + [f"-parallelism={parallelism}"] + cmd[2:]
+
+
+class AdaptiveBucket:
+    """Token bucket con ritmo AIMD y bloqueo por backoff"""
+
+    def __init__(self, rate: float, burst: float, min_rate: float = MIN_RATE,
+                 now: float = 0.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = now
+        self.blocked_until = 0.0
+        self.strikes = 0        # throttlings seguidos (para el backoff exponencial)
+        self.throttles = 0      # total desde el arranque
+        self.granted = 0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Segundos hasta que haya un token (0 si ya lo hay)"""
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        missing = max(0.0, 1.0 - self.tokens) / self.rate
+        return max(blocked, missing)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1.0
+        self.granted += 1
+
+    def succeeded(self):
+        self.strikes = 0
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def throttled(self, now: float, retry_after: float, max_backoff: float = MAX_BACKOFF):
+        self.throttles += 1
+        if now < self.blocked_until:
+            # Respuesta a peticiones lanzadas antes del backoff: solo respetar Retry-After
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            return
+        self.strikes += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+        backoff = min(max_backoff, BASE_BACKOFF * 2 ** (self.strikes - 1))
+        self.blocked_until = now + max(retry_after, random.uniform(backoff / 2, backoff))
+
+
+class Permit:
+    """Permiso para una fase; se devuelve con ``release()`` al terminar el proceso"""
+
+    __slots__ = ("pool", "environment", "keys", "retry_after", "_released")
+
+    def __init__(self, pool: "RateLimitPool", environment: str, keys: List[BucketKey]):
+        self.pool = pool
+        self.environment = environment
+        self.keys = keys
+        self.retry_after: Optional[float] = None  # no None si la fase sufrió throttling
+        self._released = False
+
+    @property
+    def throttled(self) -> bool:
+        return self.retry_after is not None
+
+    def observe(self, line: str) -> bool:
+        """Revisa una línea de output; el primer throttling penaliza al momento"""
+        if self.retry_after is not None:
+            return False
+        retry_after = detect_throttle(line)
+        if retry_after is None:
+            return False
+        self.retry_after = retry_after
+        self.pool._penalize(self.keys, retry_after)
+        return True
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        if self.retry_after is None:
+            self.pool._reward(self.keys)
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class RateLimitPool:
+    """Buckets por suscripción y región con reparto por turnos entre entornos"""
+
+    def __init__(self, subscription_rate: float = SUBSCRIPTION_RATE,
+                 subscription_burst: float = SUBSCRIPTION_BURST,
+                 region_rate: float = REGION_RATE, region_burst: float = REGION_BURST,
+                 max_backoff: float = MAX_BACKOFF,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limits = {"subscription": (subscription_rate, subscription_burst),
+                       "region": (region_rate, region_burst)}
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._buckets: Dict[BucketKey, AdaptiveBucket] = {}
+        # entorno -> tickets en espera (FIFO); el orden del dict es el turno
+        self._waiting: "OrderedDict[str, Deque[Permit]]" = OrderedDict()
+
+    @staticmethod
+    def scope(subscription: str, region: str = "") -> List[BucketKey]:
+        """Buckets que consume una fase (vacío si la suscripción es desconocida)"""
+        if not subscription:
+            return []
+        keys: List[BucketKey] = [("subscription", subscription)]
+        if region:
+            keys.append(("region", subscription, region.lower()))
+        return keys
+
+    def _bucket(self, key: BucketKey) -> AdaptiveBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[key[0]]
+            bucket = self._buckets[key] = AdaptiveBucket(rate, burst, now=self.clock())
+        return bucket
+
+    # --- Turnos --------------------------------------------------------------
+
+    def _enqueue(self, permit: Permit):
+        for key in permit.keys:
+            self._bucket(key)
+        self._waiting.setdefault(permit.environment, deque()).append(permit)
+
+    def _dequeue(self, permit: Permit):
+        queue = self._waiting.get(permit.environment)
+        if queue is not None and permit in queue:
+            queue.remove(permit)
+            if not queue:
+                del self._waiting[permit.environment]
+        self._cond.notify_all()
+
+    def _try_grant(self, permit: Permit, now: float) -> Optional[float]:
+        """None si el permiso se concede; si no, segundos que conviene esperar
+
+        Gana la primera cabeza de cola (en orden de turno) cuyos buckets
+        tienen token: un entorno bloqueado en otra suscripción no retiene a
+        los demás.
+        """
+        for environment, queue in self._waiting.items():
+            head = queue[0]
+            if any(self._buckets[key].wait_time(now) > 0 for key in head.keys):
+                continue
+            if head is not permit:
+                break
+            for key in permit.keys:
+                self._buckets[key].take(now)
+            queue.popleft()
+            # El entorno servido pasa al final del turno
+            del self._waiting[environment]
+            if queue:
+                self._waiting[environment] = queue
+            self._cond.notify_all()
+            return None
+
+        own = max(self._buckets[key].wait_time(now) for key in permit.keys)
+        return own if own > 0 else _TURN_POLL_INTERVAL
+
+    # --- API -----------------------------------------------------------------
+
+    def acquire(self, environment: str, subscription: str, region: str = "") -> Permit:
+        """Bloquea hasta que la fase pueda arrancar"""
+        permit = Permit(self, environment, self.scope(subscription, region))
+        if not permit.keys:
+            return permit
+        with self._cond:
+            self._enqueue(permit)
+            try:
+                while True:
+                    wait = self._try_grant(permit, self.clock())
+                    if wait is None:
+                        return permit
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(permit)
+                raise
+
+    async def aacquire(self, environment: str, subscription: str, region: str = "") -> Permit:
+        """Versión asyncio de acquire (espera con ``asyncio.sleep``, sin ocupar un hilo)"""
+        permit = Permit(self, environment, self.scope(subscription, region))
+        if not permit.keys:
+            return permit
+        with self._cond:
+            self._enqueue(permit)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_grant(permit, self.clock())
+                if wait is None:
+                    return permit
+                await asyncio.sleep(min(wait, 1.0))
+        except BaseException:
+            with self._cond:
+                self._dequeue(permit)
+            raise
+
+    def parallelism(self, subscription: str, region: str = "",
+                    default: int = DEFAULT_PARALLELISM) -> int:
+        """``-parallelism`` proporcional al ritmo actual (``default`` sin throttling)"""
+        keys = self.scope(subscription, region)
+        with self._cond:
+            fractions = [bucket.rate / bucket.max_rate
+                         for bucket in (self._buckets.get(key) for key in keys) if bucket]
+        if not fractions:
+            return default
+        return max(1, round(default * min(fractions)))
+
+    def _penalize(self, keys: List[BucketKey], retry_after: float):
+        with self._cond:
+            now = self.clock()
+            for key in keys:
+                self._bucket(key).throttled(now, retry_after, self.max_backoff)
+            self._cond.notify_all()
+
+    def _reward(self, keys: List[BucketKey]):
+        with self._cond:
+            for key in keys:
+                self._bucket(key).succeeded()
+            self._cond.notify_all()
+
+    def stats(self) -> List[Dict]:
+        """Estado de cada bucket (para métricas y diagnóstico)"""
+        with self._cond:
+            now = self.clock()
+            waiting = [key for queue in self._waiting.values() for permit in queue
+                       for key in permit.keys]
+            return [{
+                "scope": key[0],
+                "key": "/".join(key[1:]),
+                "rate": bucket.rate,
+                "max_rate": bucket.max_rate,
+                "blocked_for": max(0.0, bucket.blocked_until - now),
+                "throttles": bucket.throttles,
+                "granted": bucket.granted,
+                "waiting": waiting.count(key),
+            } for key, bucket in self._buckets.items()]
+
+
+_shared: Optional[RateLimitPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool() -> RateLimitPool:
+    """Pool único del proceso: runner, orquestador y daemon comparten los buckets"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimitPool()
+        return _shared
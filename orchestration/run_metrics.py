@@ -0,0 +1,148 @@
+"""
+Run Metrics - Métricas por fase de cada ejecución del runner
+
+Tiempos de init/validate/plan/apply, overhead de arranque de procesos,
+pico de RSS de los procesos hijos y bytes de output. Se exportan como
+JSON lines o como fichero para el textfile collector de Prometheus
+(node_exporter).
+"""
+
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+METRIC_PREFIX = "iac_runner"
+
+
+@dataclass
+class RunMetrics:
+    phases: Dict[str, float] = field(default_factory=dict)          # segundos por fase
+    spawn_overhead: Dict[str, float] = field(default_factory=dict)  # fork/exec por fase
+    peak_rss_kb: Optional[int] = None   # máximo entre los procesos hijos
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    processes: int = 0
+
+    def record_process(self, phase: str, duration: float, spawn: float,
+                       rss_kb: Optional[int], stdout_bytes: int, stderr_bytes: int):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+        self.spawn_overhead[phase] = self.spawn_overhead.get(phase, 0.0) + spawn
+        if rss_kb is not None:
+            self.peak_rss_kb = max(self.peak_rss_kb or 0, rss_kb)
+        self.stdout_bytes += stdout_bytes
+        self.stderr_bytes += stderr_bytes
+        self.processes += 1
+
+    @property
+    def total_spawn_overhead(self) -> float:
+        return sum(self.spawn_overhead.values())
+
+
+def metrics_record(result, environment: str = "") -> Dict:
+    """Registro plano (serializable a JSON) de un ToolResult con métricas"""
+    metrics = result.metrics or RunMetrics()
+    phase_total = sum(metrics.phases.values())
+    return {
+        "timestamp": time.time(),
+        "environment": environment or getattr(result, "environment", ""),
+        "tool": result.tool,
+        "success": result.success,
+        "execution_time": result.execution_time,
+        "runner_overhead": max(0.0, result.execution_time - phase_total),
+        "init_cache": getattr(result, "init_cache", None),
+        **asdict(metrics),
+        "spawn_overhead_total": metrics.total_spawn_overhead,
+    }
+
+
+def append_jsonl(path: str, records: Iterable[Dict]):
+    """Añade un registro JSON por línea (apto para ingestión incremental)"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+_SAMPLE = re.compile(r'^(?P<name>\w+)(?P<labels>\{.*\})?\s+(?P<value>\S+)')
+_LABEL_PAIR = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+_HELP = {
+    "execution_seconds": "Duración total de la ejecución del runner",
+    "phase_seconds": "Duración de cada fase (init, validate, plan, apply...)",
+    "spawn_overhead_seconds": "Tiempo de arranque (fork/exec) de los procesos de cada fase",
+    "runner_overhead_seconds": "Tiempo del runner fuera de los procesos de la herramienta",
+    "peak_rss_bytes": "Pico de memoria residente de los procesos de la herramienta",
+    "output_bytes": "Bytes de output producidos por la herramienta",
+    "success": "1 si la última ejecución terminó bien",
+    "last_run_timestamp_seconds": "Momento de la última ejecución",
+}
+
+
+def _samples(record: Dict) -> List[tuple]:
+    base = {"environment": record["environment"], "tool": record["tool"]}
+    samples = [
+        ("execution_seconds", base, record["execution_time"]),
+        ("runner_overhead_seconds", base, record["runner_overhead"]),
+        ("success", base, 1 if record["success"] else 0),
+        ("last_run_timestamp_seconds", base, record["timestamp"]),
+        ("output_bytes", {**base, "stream": "stdout"}, record["stdout_bytes"]),
+        ("output_bytes", {**base, "stream": "stderr"}, record["stderr_bytes"]),
+    ]
+    if record["peak_rss_kb"] is not None:
+        samples.append(("peak_rss_bytes", base, record["peak_rss_kb"] * 1024))
+    for phase, seconds in record["phases"].items():
+        samples.append(("phase_seconds", {**base, "phase": phase}, seconds))
+    for phase, seconds in record["spawn_overhead"].items():
+        samples.append(("spawn_overhead_seconds", {**base, "phase": phase}, seconds))
+    return samples
+
+
+def write_prometheus_textfile(path: str, records: Iterable[Dict]):
+    """Escribe (de forma atómica) el fichero para el textfile collector.
+
+    Las series de otros entornos/herramientas ya presentes en el fichero se
+    conservan, así varias invocaciones pueden compartir el mismo fichero.
+    """
+    target = Path(path)
+    records = list(records)
+    replaced = {(r["environment"], r["tool"]) for r in records}
+
+    series: Dict[str, List[str]] = {name: [] for name in _HELP}
+    if target.exists():
+        for line in target.read_text().splitlines():
+            match = _SAMPLE.match(line)
+            if not match or not match.group("name").startswith(METRIC_PREFIX + "_"):
+                continue
+            labels = dict(_LABEL_PAIR.findall(match.group("labels") or ""))
+            name = match.group("name")[len(METRIC_PREFIX) + 1:]
+            if name in series and (labels.get("environment"), labels.get("tool")) not in replaced:
+                series[name].append(line)
+
+    for record in records:
+        for name, labels, value in _samples(record):
+            series[name].append(f"{METRIC_PREFIX}_{name}{_labels(**labels)} {value}")
+
+    lines = []
+    for name, samples in series.items():
+        if not samples:
+            continue
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {_HELP[name]}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        lines.extend(samples)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp.write_text("\n".join(lines) + "\n")
+    os.replace(tmp, target)
@@ -0,0 +1,140 @@
+"""
+Stack Fingerprint - Huellas de contenido de un stack Terraform/OpenTofu
+
+Calcula digests estables de los inputs que determinan el resultado de
+``init`` (lock file, bloques ``terraform {}``, fuentes de módulos) y del
+árbol de módulos locales del que depende un stack.
+"""
+
+import hashlib
+import re
+from pathlib import Path
+from typing import Iterable, List, Set
+
+TF_SUFFIXES = (".tf", ".tf.json")
+BACKEND_FILES = ("backend.hcl", "backend.tfvars")
+
+_MODULE_SOURCE = re.compile(r'^\s*source\s*=\s*"([^"]+)"', re.MULTILINE)
+_MODULE_VERSION = re.compile(r'^\s*version\s*=\s*"([^"]+)"', re.MULTILINE)
+_BLOCK_START = re.compile(r'^(terraform|module\s+"[^"]*")\s*\{', re.MULTILINE)
+
+
+def _tf_files(directory: Path) -> List[Path]:
+    return sorted(p for p in directory.iterdir()
+                  if p.is_file() and p.name.endswith(TF_SUFFIXES))
+
+
+def block_body(text: str, start: int) -> str:
+    """Devuelve el bloque HCL que abre en ``start`` (llaves dentro de strings ignoradas)"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def init_blocks(stack_dir: Path) -> List[str]:
+    """Bloques que afectan a ``init``: ``terraform {}`` (backend, providers) y ``module {}``"""
+    blocks = []
+    for path in _tf_files(stack_dir):
+        text = path.read_text(errors="replace")
+        for match in _BLOCK_START.finditer(text):
+            body = block_body(text, match.start())
+            if match.group(1).startswith("module"):
+                # De un módulo a init solo le importan source/version
+                body = match.group(1) + " ".join(
+                    _MODULE_SOURCE.findall(body) + _MODULE_VERSION.findall(body))
+            blocks.append(f"{path.name}:{body}")
+    return blocks
+
+
+def local_module_dirs(stack_dir: Path) -> List[Path]:
+    """Directorios de los módulos locales (``./`` o ``../``) que usa el stack"""
+    dirs = []
+    for path in _tf_files(stack_dir):
+        for source in _MODULE_SOURCE.findall(path.read_text(errors="replace")):
+            if source.startswith(("./", "../")):
+                module_dir = (stack_dir / source).resolve()
+                if module_dir.is_dir() and module_dir not in dirs:
+                    dirs.append(module_dir)
+    return dirs
+
+
+def _hash_tree(digest, directory: Path, seen: Set[Path]):
+    directory = directory.resolve()
+    if directory in seen:
+        return
+    seen.add(directory)
+    for path in _tf_files(directory):
+        digest.update(path.name.encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    for module_dir in local_module_dirs(directory):
+        digest.update(str(module_dir).encode())
+        _hash_tree(digest, module_dir, seen)
+
+
+def module_tree_digest(stack_dir: Path) -> str:
+    """Digest de los ficheros .tf del stack y de todos sus módulos locales (recursivo)"""
+    digest = hashlib.sha256()
+    _hash_tree(digest, Path(stack_dir), set())
+    return digest.hexdigest()
+
+
+def init_inputs_digest(tool: str, stack_dir: Path, extra: Iterable[str] = ()) -> str:
+    """Digest de todo lo que puede invalidar un ``init`` previo del stack"""
+    stack_dir = Path(stack_dir)
+    digest = hashlib.sha256(tool.encode())
+
+    lock_file = stack_dir / ".terraform.lock.hcl"
+    digest.update(lock_file.read_bytes() if lock_file.exists() else b"<no-lock>")
+
+    for block in init_blocks(stack_dir):
+        digest.update(block.encode())
+
+    for name in BACKEND_FILES:
+        backend_file = stack_dir / name
+        if backend_file.exists():
+            digest.update(name.encode())
+            digest.update(backend_file.read_bytes())
+    for backend_file in sorted(stack_dir.glob("*.tfbackend")):
+        digest.update(backend_file.name.encode())
+        digest.update(backend_file.read_bytes())
+
+    for module_dir in local_module_dirs(stack_dir):
+        digest.update(module_tree_digest(module_dir).encode())
+
+    for item in extra:
+        digest.update(item.encode())
+
+    return digest.hexdigest()
+
+
+def plan_inputs_digest(stack_dir: Path) -> str:
+    """Digest de la configuración que determina un plan: árbol de módulos, tfvars y lock file"""
+    stack_dir = Path(stack_dir)
+    digest = hashlib.sha256(module_tree_digest(stack_dir).encode())
+    lock_file = stack_dir / ".terraform.lock.hcl"
+    if lock_file.exists():
+        digest.update(lock_file.read_bytes())
+    for tfvars in sorted(list(stack_dir.glob("*.tfvars")) + list(stack_dir.glob("*.tfvars.json"))):
+        digest.update(tfvars.name.encode())
+        digest.update(tfvars.read_bytes())
+    return digest.hexdigest()
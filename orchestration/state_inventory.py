@@ -0,0 +1,383 @@
+"""
+State Inventory - Inventario de recursos a partir del state de Terraform
+
+Lee el ``terraform.tfstate`` local o la salida de ``<tool> show -json`` de
+forma incremental (solo un recurso decodificado a la vez) y construye un
+índice por tipo, módulo y dirección. Cada recurso guarda un digest de sus
+atributos, así que comparar dos snapshots (antes/después de un apply)
+devuelve exactamente qué recursos se crearon, cambiaron o eliminaron;
+``StateTracker`` hace esa comparación guardando solo las huellas del
+snapshot anterior.
+"""
+
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO
+
+from json_stream import iter_array_items
+from plan_artifacts import STATE_HEAD_BYTES, serial_from_head, state_serial
+
+LOCAL_STATE = "terraform.tfstate"
+# Config del backend que deja ``init`` (no es el state)
+BACKEND_CONFIG = Path(".terraform") / "terraform.tfstate"
+
+
+class StateResource(NamedTuple):
+    """Recurso del state (tupla: decenas de miles por snapshot sin coste de un dict por objeto)"""
+    address: str
+    mode: str            # managed | data
+    resource_type: str
+    resource_name: str
+    module_path: str     # "" para el módulo raíz, p.ej. "module.aks"
+    provider: str
+    resource_id: str     # atributo ``id`` (vacío si el recurso no lo tiene)
+    digest: str          # huella de los atributos, para detectar cambios
+
+
+@dataclass
+class StateDiff:
+    added: List[StateResource] = field(default_factory=list)
+    changed: List[StateResource] = field(default_factory=list)
+    removed: List[StateResource] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def addresses(self) -> List[str]:
+        return [resource.address for resource in self.added + self.changed + self.removed]
+
+    def counts(self) -> Dict[str, int]:
+        return {"added": len(self.added), "changed": len(self.changed), "removed": len(self.removed)}
+
+
+def _index_suffix(index_key) -> str:
+    if index_key is None:
+        return ""
+    return f"[{json.dumps(index_key)}]"
+
+
+def _digest(attributes) -> str:
+    return hashlib.sha1(json.dumps(attributes, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _state_resources(item: Dict) -> Iterator[StateResource]:
+    """Instancias de un elemento de ``resources`` del tfstate (formato v4)"""
+    mode = sys.intern(item.get("mode", "managed"))
+    module_path = sys.intern(item.get("module", ""))
+    resource_type = sys.intern(item.get("type", ""))
+    provider = sys.intern(item.get("provider", ""))
+    name = item.get("name", "")
+    base = f"{'data.' if mode == 'data' else ''}{resource_type}.{name}"
+    if module_path:
+        base = f"{module_path}.{base}"
+    for instance in item.get("instances", []):
+        attributes = instance.get("attributes") or {}
+        yield StateResource(
+            address=base + _index_suffix(instance.get("index_key")),
+            mode=mode,
+            resource_type=resource_type,
+            resource_name=name,
+            module_path=module_path,
+            provider=provider,
+            resource_id=str(attributes.get("id", "")),
+            digest=_digest(attributes),
+        )
+
+
+def _show_resource(item: Dict) -> StateResource:
+    """Recurso de ``values.*_module.resources`` de ``show -json``"""
+    address = item.get("address", "")
+    mode = sys.intern(item.get("mode", "managed"))
+    resource_type = sys.intern(item.get("type", ""))
+    name = item.get("name", "")
+    local = f"{'data.' if mode == 'data' else ''}{resource_type}.{name}"
+    position = address.rfind(local)
+    values = item.get("values") or {}
+    return StateResource(
+        address=address,
+        mode=mode,
+        resource_type=resource_type,
+        resource_name=name,
+        module_path=sys.intern(address[:position].rstrip(".")) if position > 0 else "",
+        provider=sys.intern(item.get("provider_name", "")),
+        resource_id=str(values.get("id", "")),
+        digest=_digest(values),
+    )
+
+
+def iter_resources(items: Iterable) -> Iterator[StateResource]:
+    """Recursos de los elementos de ``resources`` (tfstate o ``show -json``), uno a uno"""
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if "instances" in item:
+            yield from _state_resources(item)
+        elif item.get("address"):
+            yield _show_resource(item)
+
+
+class StateInventory:
+    """Recursos de un state indexados para consultas O(resultado)"""
+
+    def __init__(self, serial: str = ""):
+        self.serial = serial  # ``lineage:serial`` ("" si la fuente no lo incluye)
+        self._records: Dict[str, StateResource] = {}
+        self._by_type: Dict[str, Dict[str, None]] = {}
+        self._by_module: Dict[str, Dict[str, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._records
+
+    def add(self, resource: StateResource):
+        self._records[resource.address] = resource
+        self._by_type.setdefault(resource.resource_type, {})[resource.address] = None
+        self._by_module.setdefault(resource.module_path, {})[resource.address] = None
+
+    def get(self, address: str) -> Optional[StateResource]:
+        return self._records.get(address)
+
+    def query(self, resource_type: Optional[str] = None, module_path: Optional[str] = None,
+              mode: Optional[str] = None) -> List[StateResource]:
+        """Recursos que cumplen todos los filtros indicados"""
+        candidates = [index.get(value, {}) for index, value in (
+            (self._by_type, resource_type),
+            (self._by_module, module_path),
+        ) if value is not None]
+        if candidates:
+            candidates.sort(key=len)
+            smallest, rest = candidates[0], candidates[1:]
+            resources = [self._records[address] for address in smallest
+                         if all(address in other for other in rest)]
+        else:
+            resources = list(self._records.values())
+        if mode is not None:
+            resources = [resource for resource in resources if resource.mode == mode]
+        return resources
+
+    def by_type(self, resource_type: str) -> List[StateResource]:
+        return self.query(resource_type=resource_type)
+
+    def by_module(self, module_path: str) -> List[StateResource]:
+        return self.query(module_path=module_path)
+
+    def counts_by_type(self) -> Dict[str, int]:
+        return {resource_type: len(addresses) for resource_type, addresses in self._by_type.items()
+                if addresses}
+
+    def modules(self) -> List[str]:
+        return sorted(self._by_module)
+
+    def diff(self, previous: "StateInventory") -> StateDiff:
+        """Cambios respecto a un snapshot anterior del mismo state"""
+        result = StateDiff()
+        for address, resource in self._records.items():
+            before = previous._records.get(address)
+            if before is None:
+                result.added.append(resource)
+            elif before.digest != resource.digest:
+                result.changed.append(resource)
+        result.removed = [resource for address, resource in previous._records.items()
+                          if address not in self._records]
+        return result
+
+    # --- Ingesta -------------------------------------------------------------
+
+    def feed(self, items: Iterable):
+        for resource in iter_resources(items):
+            self.add(resource)
+
+    @classmethod
+    def from_stream(cls, stream: TextIO, serial: str = "") -> "StateInventory":
+        """Lee un tfstate o un ``show -json`` (sin plan) de forma incremental
+
+        Los arrays ``resources`` de módulos hijos (``child_modules``) también
+        se recorren, porque la búsqueda de la clave es a cualquier profundidad.
+        """
+        inventory = cls(serial)
+        inventory.feed(iter_array_items(stream, "resources"))
+        return inventory
+
+    @classmethod
+    def from_file(cls, path: Path) -> "StateInventory":
+        with open(path, errors="replace") as f:
+            serial = serial_from_head(f.read(STATE_HEAD_BYTES))
+            f.seek(0)
+            return cls.from_stream(f, serial)
+
+
+@contextmanager
+def _show_json(tool: str, stack_dir: Path, env: Optional[Dict[str, str]]) -> Iterator[TextIO]:
+    """stdout de ``<tool> show -json``; RuntimeError si el comando falla"""
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        process = subprocess.Popen([tool, "show", "-json"], cwd=stack_dir, env=env, text=True,
+                                   stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            yield process.stdout
+            process.stdout.read()  # drenar por si quedó output tras el último array
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"{tool} show -json falló: {stderr.read().strip()}")
+
+
+def read_state(tool: str, stack_dir: Path, env: Optional[Dict[str, str]] = None) -> StateInventory:
+    """Inventario del state actual del stack
+
+    Usa el ``terraform.tfstate`` local si existe; si no, ``<tool> show -json``
+    (backend remoto, requiere init). Un stack sin state devuelve un
+    inventario vacío.
+    """
+    local_state = Path(stack_dir) / LOCAL_STATE
+    if local_state.exists():
+        return StateInventory.from_file(local_state)
+
+    with _show_json(tool, stack_dir, env) as stream:
+        return StateInventory.from_stream(stream)
+
+
+def remote_backend(stack_dir: Path) -> bool:
+    """True si ``init`` configuró un backend no local (azurerm, s3, remote...)"""
+    try:
+        config = json.loads((Path(stack_dir) / BACKEND_CONFIG).read_text())
+    except (OSError, ValueError):
+        return False
+    backend = config.get("backend") or {}
+    return backend.get("type", "local") not in ("", "local")
+
+
+def _digests(stream: TextIO) -> Dict[str, str]:
+    return {resource.address: resource.digest
+            for resource in iter_resources(iter_array_items(stream, "resources"))}
+
+
+def _diff_stream(stream: TextIO, before: Dict[str, str]) -> StateDiff:
+    """Diff del state de ``stream`` contra ``dirección -> digest`` (consume ``before``)"""
+    result = StateDiff()
+    for resource in iter_resources(iter_array_items(stream, "resources")):
+        digest = before.pop(resource.address, None)
+        if digest is None:
+            result.added.append(resource)
+        elif digest != resource.digest:
+            result.changed.append(resource)
+    # Del state anterior solo se guardó la huella: los eliminados llevan dirección y digest
+    result.removed = [StateResource(address, "", "", "", "", "", "", digest)
+                      for address, digest in before.items()]
+    return result
+
+
+class StateTracker:
+    """Cambios del state alrededor de un apply/destroy con las mínimas lecturas
+
+    Antes del apply solo se guarda ``dirección -> digest`` y el serial; el
+    state posterior se recorre en streaming contra ese mapa, así que nunca
+    hay dos inventarios completos en memoria, y si el serial no cambió no
+    se vuelve a leer. Con backend remoto cada lectura es un ``show -json``
+    completo: solo se hace con ``remote=True``; si no, ``finish`` devuelve
+    None y quien llama usa los registros de ``apply -json`` o el output.
+    """
+
+    def __init__(self, tool: str, stack_dir: Path, env: Optional[Dict[str, str]] = None,
+                 remote: bool = False):
+        self.tool = tool
+        self.stack_dir = Path(stack_dir)
+        self.env = env
+        self.remote = remote_backend(self.stack_dir)
+        self.enabled = remote or not self.remote
+        self.serial = ""
+        self._before: Optional[Dict[str, str]] = None
+
+    def begin(self, serial: Optional[str] = None):
+        """Huella del state antes del apply
+
+        ``serial`` es el ``lineage:serial`` ya leído (p.ej. para la clave del
+        plan); con backend remoto evita un ``state pull`` más.
+        """
+        self._before = None
+        if not self.enabled:
+            return
+        local_state = self.stack_dir / LOCAL_STATE
+        try:
+            if local_state.exists():
+                with open(local_state, errors="replace") as f:
+                    self.serial = serial_from_head(f.read(STATE_HEAD_BYTES))
+                    f.seek(0)
+                    self._before = _digests(f)
+            elif self.remote:
+                self.serial = serial if serial is not None else state_serial(
+                    self.tool, self.stack_dir, self.env)
+                if not self.serial:
+                    self._before = {}  # backend todavía sin state
+                else:
+                    with _show_json(self.tool, self.stack_dir, self.env) as stream:
+                        self._before = _digests(stream)
+            else:
+                self.serial, self._before = "", {}  # backend local sin state: nada que leer
+        except (OSError, RuntimeError, ValueError):
+            self._before = None
+
+    def finish(self) -> Optional[StateDiff]:
+        """Diff contra la huella de ``begin`` (None si no se puede saber)"""
+        before, self._before = self._before, None
+        if before is None:
+            return None
+        local_state = self.stack_dir / LOCAL_STATE
+        try:
+            if local_state.exists():
+                with open(local_state, errors="replace") as f:
+                    if self.serial and serial_from_head(f.read(STATE_HEAD_BYTES)) == self.serial:
+                        return StateDiff()
+                    f.seek(0)
+                    return _diff_stream(f, before)
+            if not self.remote:
+                return None  # el state no quedó en el stack (terragrunt, backend en otra ruta)
+            if self.serial and state_serial(self.tool, self.stack_dir, self.env) == self.serial:
+                return StateDiff()
+            with _show_json(self.tool, self.stack_dir, self.env) as stream:
+                return _diff_stream(stream, before)
+        except (OSError, RuntimeError, ValueError):
+            return None
+
+
+def main():
+    """Mostrar el inventario de un state"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inventario de recursos de un state")
+    parser.add_argument("state", help="terraform.tfstate o salida guardada de 'show -json'")
+    parser.add_argument("--type", dest="resource_type")
+    parser.add_argument("--module", dest="module_path")
+    parser.add_argument("--diff", help="Snapshot anterior con el que comparar")
+    args = parser.parse_args()
+
+    inventory = StateInventory.from_file(Path(args.state))
+    print(f"📦 {len(inventory)} recursos en {len(inventory.modules())} módulos"
+          + (f" (serial {inventory.serial})" if inventory.serial else ""))
+
+    if args.diff:
+        diff = inventory.diff(StateInventory.from_file(Path(args.diff)))
+        for label, resources in (("➕", diff.added), ("✏️ ", diff.changed), ("➖", diff.removed)):
+            for resource in resources:
+                print(f"   {label} {resource.address}")
+        return
+
+    for resource in inventory.query(args.resource_type, args.module_path):
+        print(f"   • {resource.address}" + (f"  ({resource.resource_id})" if resource.resource_id else ""))
+
+
+if __name__ == "__main__":
+    main()
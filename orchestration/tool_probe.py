@@ -0,0 +1,104 @@
+"""
+Tool Probe - Cache con TTL de la disponibilidad de terraform/tofu/terragrunt
+
+El resultado de ``<tool> --version`` se guarda en memoria y en disco. Una
+entrada deja de ser válida cuando vence el TTL o cuando cambia el binario
+resuelto en PATH (ruta, mtime o tamaño). Los probes pendientes se lanzan
+en paralelo.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+
+class ToolProbeCache:
+    def __init__(self, cache_file: Path, ttl: float = 3600.0, timeout: float = 10.0):
+        self.cache_file = Path(cache_file)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.cache_file.read_text())
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self._entries, indent=2))
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            pass  # El cache en disco es opcional
+
+    @staticmethod
+    def _binary_identity(tool: str) -> Optional[Dict]:
+        path = shutil.which(tool)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return {"path": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def _probe(self, path: str) -> Dict:
+        try:
+            result = subprocess.run([path, "--version"],
+                                    capture_output=True, text=True, timeout=self.timeout)
+            first_line = result.stdout.splitlines()[0] if result.stdout else ""
+            return {"available": result.returncode == 0, "version": first_line.strip()}
+        except (subprocess.TimeoutExpired, OSError):
+            return {"available": False, "version": ""}
+
+    def probe(self, tools: Sequence[str], refresh: bool = False) -> Dict[str, Dict]:
+        """Devuelve la entrada de cache de cada herramienta, re-probando solo las vencidas"""
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            identities = {tool: self._binary_identity(tool) for tool in tools}
+
+            stale = []
+            for tool, identity in identities.items():
+                entry = entries.get(tool)
+                if identity is None:
+                    # No está en PATH: no hace falta lanzar ningún proceso
+                    entries[tool] = {"available": False, "version": "", "probed_at": now}
+                elif (refresh or entry is None
+                        or {k: entry.get(k) for k in identity} != identity
+                        or now - entry.get("probed_at", 0) > self.ttl):
+                    stale.append(tool)
+
+            if stale:
+                from concurrent.futures import ThreadPoolExecutor  # solo si hay que ejecutar probes
+
+                with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+                    probes = dict(zip(stale, pool.map(
+                        lambda tool: self._probe(identities[tool]["path"]), stale)))
+                for tool in stale:
+                    entries[tool] = {**identities[tool], **probes[tool], "probed_at": now}
+                self._save()
+
+            return {tool: entries[tool] for tool in tools}
+
+    def availability(self, tools: Sequence[str], refresh: bool = False) -> Dict[str, bool]:
+        return {tool: entry["available"] for tool, entry in self.probe(tools, refresh).items()}
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = {}
+            try:
+                self.cache_file.unlink()
+            except FileNotFoundError:
+                pass
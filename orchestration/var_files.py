@@ -0,0 +1,91 @@
+"""
+Var Files - Variables de Terraform en un ``*.auto.tfvars.json`` del stack
+
+En lugar de un ``-var key=value`` por variable (formateado con ``str()``,
+que rompe mapas y listas y crece sin límite en argv), las variables se
+serializan como JSON tipado en un fichero que Terraform/OpenTofu cargan
+automáticamente. ``var_file()`` lo deja en el stack solo mientras dura la
+ejecución: un ``terraform plan`` manual posterior en ese directorio no
+hereda las variables del runner. Dentro de una ejecución el fichero solo
+se reescribe si su contenido cambia, y los digests de inputs (planes
+guardados, veredictos "sin cambios") dependen del contenido, no del mtime.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+VAR_FILE_NAME = "ai-runner.auto.tfvars.json"
+
+# ruta -> (sha256, mtime_ns, tamaño) del último contenido escrito o leído
+_known: Dict[str, Tuple[str, int, int]] = {}
+_known_lock = threading.Lock()
+
+
+def render_variables(variables: Dict) -> bytes:
+    """JSON canónico (claves ordenadas) de las variables"""
+    return (json.dumps(variables, sort_keys=True, indent=2, default=str) + "\n").encode()
+
+
+def _on_disk_digest(path: Path) -> Optional[str]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    key = str(path)
+    with _known_lock:
+        known = _known.get(key)
+    if known and known[1:] == (stat.st_mtime_ns, stat.st_size):
+        return known[0]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    with _known_lock:
+        _known[key] = (digest, stat.st_mtime_ns, stat.st_size)
+    return digest
+
+
+def write_var_file(stack_dir: Path, variables: Dict) -> Optional[Path]:
+    """Deja las variables en ``<stack>/ai-runner.auto.tfvars.json``
+
+    Devuelve la ruta del fichero, o None si no hay variables (en ese caso
+    se elimina un fichero anterior para que no se apliquen valores viejos).
+    """
+    path = Path(stack_dir) / VAR_FILE_NAME
+    if not variables:
+        remove_var_file(stack_dir)
+        return None
+
+    content = render_variables(variables)
+    digest = hashlib.sha256(content).hexdigest()
+    if _on_disk_digest(path) == digest:
+        return path
+
+    tmp = path.with_name(f".{VAR_FILE_NAME}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+    stat = path.stat()
+    with _known_lock:
+        _known[str(path)] = (digest, stat.st_mtime_ns, stat.st_size)
+    return path
+
+
+def remove_var_file(stack_dir: Path):
+    path = Path(stack_dir) / VAR_FILE_NAME
+    with _known_lock:
+        _known.pop(str(path), None)
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def var_file(stack_dir: Path, variables: Dict) -> Iterator[Optional[Path]]:
+    """``write_var_file`` para la duración del bloque; al salir se elimina el fichero"""
+    try:
+        yield write_var_file(stack_dir, variables)
+    finally:
+        remove_var_file(stack_dir)
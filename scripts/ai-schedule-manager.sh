@@ -44,10 +44,7 @@ ai_stop_services() {
         return 1
     fi
     
-    # Instalar dependencias si es necesario
-    pip3 install schedule > /dev/null 2>&1 || true
-    
-    # Ejecutar agente IA
+    # Ejecutar agente IA (stop/start/status no necesitan dependencias externas)
     python3 "$PROJECT_ROOT/ai-agents/schedule-manager/aks_schedule_manager.py" stop
     
     if [ $? -eq 0 ]; then
@@ -77,6 +74,9 @@ ai_start_services() {
 ai_setup_scheduler() {
     log_ai "Configurando scheduler automático..."
     
+    # Solo el modo 'schedule' usa la librería schedule
+    pip3 install schedule > /dev/null 2>&1 || true
+    
     # Crear servicio systemd para el scheduler
     cat > /tmp/aks-scheduler.service << EOF
 [Unit]